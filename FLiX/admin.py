@@ -15,6 +15,7 @@ from pyrogram.types import (
 from config import Config
 from database import db
 from helper import small_caps, format_size, escape_markdown, format_uptime, human_size, check_owner
+from helper.shaping import CONN_KEYS, RATE_KEYS
 
 logger = logging.getLogger(__name__)
 
@@ -31,7 +32,8 @@ async def show_panel(client: Client, source, panel_type: str):
             f"📡 **{small_caps('bandwidth')}**  : {'🟢 ᴀᴄᴛɪᴠᴇ' if bw_toggle else '🔴 ɪɴᴀᴄᴛɪᴠᴇ'} | `{format_size(max_bw)}`\n"
             f"👥 **{small_caps('sudo users')}** : ᴍᴀɴᴀɢᴇ ᴀᴄᴄᴇꜱꜱ\n"
             f"🤖 **{small_caps('bot mode')}**  : {'🟢 ᴘᴜʙʟɪᴄ' if config.get('public_bot') else '🔴 ᴘʀɪᴠᴀᴛᴇ'}\n"
-            f"📢 **{small_caps('force sub')}** : {'🟢 ᴀᴄᴛɪᴠᴇ' if config.get('fsub_mode') else '🔴 ɪɴᴀᴄᴛɪᴠᴇ'}\n\n"
+            f"📢 **{small_caps('force sub')}** : {'🟢 ᴀᴄᴛɪᴠᴇ' if config.get('fsub_mode') else '🔴 ɪɴᴀᴄᴛɪᴠᴇ'}\n"
+            f"🚦 **{small_caps('traffic')}**   : {'🟢 ꜱʜᴀᴘᴇᴅ' if _shaping_active(config) else '🔴 ᴜɴʟɪᴍɪᴛᴇᴅ'}\n\n"
             "👇 ᴄʜᴏᴏꜱᴇ ᴀ ᴄᴀᴛᴇɢᴏʀʏ ᴛᴏ ᴄᴏɴꜰɪɢᴜʀᴇ."
         )
         buttons = InlineKeyboardMarkup([
@@ -43,6 +45,7 @@ async def show_panel(client: Client, source, panel_type: str):
                 InlineKeyboardButton("🤖 ʙᴏᴛ ᴍᴏᴅᴇ",   callback_data="settings_botmode"),
                 InlineKeyboardButton("📢 ꜰᴏʀᴄᴇ ꜱᴜʙ",  callback_data="settings_fsub"),
             ],
+            [InlineKeyboardButton("🚦 ᴛʀᴀꜰꜰɪᴄ",      callback_data="settings_shaping")],
             [InlineKeyboardButton("❌ ᴄʟᴏꜱᴇ", callback_data="settings_close")],
         ])
 
@@ -125,6 +128,39 @@ async def show_panel(client: Client, source, panel_type: str):
             [InlineKeyboardButton("⬅️ ʙᴀᴄᴋ", callback_data="settings_back")],
         ])
 
+    elif panel_type == "shaping_panel":
+        def _rate(key: str) -> str:
+            value = config.get(key, 0)
+            return f"{format_size(value)}/s" if value else "ᴜɴʟɪᴍɪᴛᴇᴅ"
+
+        def _conns(key: str) -> str:
+            return str(config.get(key, 0) or "ᴜɴʟɪᴍɪᴛᴇᴅ")
+
+        text = (
+            f"💠 **{small_caps('traffic shaping')}** 💠\n\n"
+            f"🌐 **{small_caps('global rate')}**     : `{_rate(RATE_KEYS['global'])}`\n"
+            f"👤 **{small_caps('rate per ip')}**     : `{_rate(RATE_KEYS['ip'])}`\n"
+            f"📁 **{small_caps('rate per file')}**   : `{_rate(RATE_KEYS['file'])}`\n"
+            f"🔌 **{small_caps('rate per conn')}**   : `{_rate(RATE_KEYS['conn'])}`\n"
+            f"👥 **{small_caps('conns per ip')}**    : `{_conns(CONN_KEYS['ip'])}`\n"
+            f"🗂 **{small_caps('conns per file')}**  : `{_conns(CONN_KEYS['file'])}`"
+        )
+        buttons = InlineKeyboardMarkup([
+            [
+                InlineKeyboardButton(f"🌐 {small_caps('global')}", callback_data=f"set_shaping_{RATE_KEYS['global']}"),
+                InlineKeyboardButton(f"👤 {small_caps('per ip')}", callback_data=f"set_shaping_{RATE_KEYS['ip']}"),
+            ],
+            [
+                InlineKeyboardButton(f"📁 {small_caps('per file')}", callback_data=f"set_shaping_{RATE_KEYS['file']}"),
+                InlineKeyboardButton(f"🔌 {small_caps('per conn')}", callback_data=f"set_shaping_{RATE_KEYS['conn']}"),
+            ],
+            [
+                InlineKeyboardButton(f"👥 {small_caps('conns / ip')}",   callback_data=f"set_shaping_{CONN_KEYS['ip']}"),
+                InlineKeyboardButton(f"🗂 {small_caps('conns / file')}", callback_data=f"set_shaping_{CONN_KEYS['file']}"),
+            ],
+            [InlineKeyboardButton("⬅️ ʙᴀᴄᴋ", callback_data="settings_back")],
+        ])
+
     else:
         return
 
@@ -149,6 +185,10 @@ async def show_panel(client: Client, source, panel_type: str):
         )
 
 
+def _shaping_active(config: dict) -> bool:
+    return any(config.get(key, 0) for key in (*RATE_KEYS.values(), *CONN_KEYS.values()))
+
+
 _pending: dict[int, asyncio.Future] = {}
 
 
@@ -212,6 +252,7 @@ async def settings_callback(client: Client, callback: CallbackQuery):
         "settings_sudo":      ("sudo_panel",      f"👥 {small_caps('sudo users')}"),
         "settings_botmode":   ("botmode_panel",   f"🤖 {small_caps('bot mode settings')}"),
         "settings_fsub":      ("fsub_panel",      f"📌 {small_caps('force sub settings')}"),
+        "settings_shaping":   ("shaping_panel",   f"🚦 {small_caps('traffic shaping')}"),
         "settings_back":      ("main_panel",      f"⬅️ {small_caps('back to main menu')}"),
     }
     if data in panel_nav:
@@ -266,6 +307,34 @@ async def settings_callback(client: Client, callback: CallbackQuery):
         await callback.answer(f"✅ {small_caps('limit set to')} {format_size(new_limit)}!", show_alert=True)
         return await show_panel(client, callback, "bandwidth_panel")
 
+    if data.startswith("set_shaping_"):
+        key = data[len("set_shaping_"):]
+        if key in RATE_KEYS.values():
+            prompt = (
+                f"🚦 **{small_caps('send rate limit in bytes per second')}**\n\n"
+                f"{small_caps('examples')}:\n"
+                "`1048576`   — 1 MB/s\n"
+                "`5242880`   — 5 MB/s\n"
+                "`104857600` — 100 MB/s\n\n"
+                f"{small_caps('send')} `0` {small_caps('for unlimited')}."
+            )
+        elif key in CONN_KEYS.values():
+            prompt = (
+                f"🚦 **{small_caps('send max concurrent connections')}**\n\n"
+                f"{small_caps('send')} `0` {small_caps('for unlimited')}."
+            )
+        else:
+            return
+        text = await ask_input(client, callback.from_user.id, prompt)
+        if text is None:
+            return
+        if not text.isdigit():
+            await callback.answer(f"❌ {small_caps('invalid number')}!", show_alert=True)
+            return
+        await Config.update(db.db, {key: int(text)})
+        await callback.answer(f"✅ {small_caps('traffic limit updated')}!", show_alert=True)
+        return await show_panel(client, callback, "shaping_panel")
+
     if data == "reset_bandwidth":
         await callback.answer(f"🔄 {small_caps('resetting bandwidth usage')}…", show_alert=False)
         ok = await db.reset_bandwidth()
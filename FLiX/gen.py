@@ -14,6 +14,7 @@ from pyrogram.types import (
 
 from config import Config
 from helper import Cryptic, format_size, escape_markdown, small_caps, check_fsub, check_owner
+from helper.warmup import predictive_warmer
 from database import db
 
 logger = logging.getLogger(__name__)
@@ -168,7 +169,7 @@ async def file_handler(client: Client, message: Message):
     stream_link   = f"{base_url}/stream/{file_hash}"
     download_link = f"{base_url}/dl/{file_hash}"
 
-    await db.add_file({
+    file_doc = {
         "file_id":          file_hash,
         "message_id":       str(file_info.id),
         "telegram_file_id": tg_file_id,
@@ -178,7 +179,11 @@ async def file_handler(client: Client, message: Message):
         "file_size":        file_size,
         "file_type":        file_type,
         "mime_type":        getattr(file, "mime_type", ""),
-    })
+    }
+    await db.add_file(file_doc)
+
+    # The link is usually opened within seconds — get the file ready now.
+    predictive_warmer.schedule(file_doc)
 
     is_streamable = file_type in STREAMABLE_TYPES
     buttons       = []
@@ -356,6 +361,11 @@ async def _build_user_files_markup(
     if not file_list or (len(file_list) == 1 and file_list[0][0].callback_data == "N/A"):
         file_list = [[InlineKeyboardButton("ᴇᴍᴘᴛʏ", callback_data="N/A")]]
 
+    if 0 < total_files <= Config.ZIP_MAX_FILES:
+        base_url = Config.URL or f"http://localhost:{Config.PORT}"
+        zip_link = f"{base_url}/zip?user={user_id}&sig={Cryptic.hash_user_files(user_id)}"
+        file_list.append([InlineKeyboardButton(f"📦 {small_caps('download all')}", url=zip_link)])
+
     file_list.append([InlineKeyboardButton("ᴄʟᴏsᴇ", callback_data="close")])
 
     markup = InlineKeyboardMarkup(file_list)
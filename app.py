@@ -3,18 +3,30 @@ import logging
 import time
 import asyncio
 from pathlib import Path
+from typing import Sequence
 
 import psutil
 from aiohttp import web
 import aiohttp_jinja2
 import jinja2
+from pyrogram import Client
 
 from bot import Bot
 from config import Config
 from database import Database
-from helper import StreamingService, check_bandwidth_limit, format_size
+from helper import Cryptic, StreamingService, check_bandwidth_limit, format_size
+from helper.buffers import stream_buffers
+from helper.cache import disk_cache, head_tail_cache, memory_cache, pinned_ranges
+from helper.hls import hls_indexes, render_playlist
+from helper.materialize import file_materializer
+from helper.shaping import traffic_shaper
+from helper.prefetch import active_stream_stats
+from helper.readahead import read_ahead
+from helper.supervisor import session_supervisor
+from helper.warmup import predictive_warmer
 from helper.stream import (
     get_active_session_count,
+    recovery_stats,
     _register_session,
     _unregister_session,
     _get_client_ip,
@@ -38,8 +50,10 @@ def _bot_info(bot: Bot) -> dict:
     }
 
 
-def build_app(bot: Bot, database) -> web.Application:
-    streaming_service = StreamingService(bot, database)
+def build_app(bot: Bot, database, workers: Sequence[Client] = ()) -> web.Application:
+    streaming_service = StreamingService(bot, database, workers)
+    predictive_warmer.attach(streaming_service)
+    file_materializer.attach(streaming_service)
 
     @web.middleware
     async def not_found_middleware(request: web.Request, handler):
@@ -83,6 +97,7 @@ def build_app(bot: Bot, database) -> web.Application:
             )
 
     app = web.Application(middlewares=[not_found_middleware])
+    app["streaming_service"] = streaming_service
     aiohttp_jinja2.setup(app, loader=jinja2.FileSystemLoader(str(TEMPLATES_DIR)))
 
     @aiohttp_jinja2.template("home.html")
@@ -107,7 +122,9 @@ def build_app(bot: Bot, database) -> web.Application:
         session_key = f"{file_hash}:{client_ip}"
         await _register_session(session_key)
         try:
-            return await streaming_service.stream_file(request, file_hash, is_download=is_download)
+            return await streaming_service.stream_file(
+                request, file_hash, is_download=is_download, session_key=session_key,
+            )
         finally:
             await _unregister_session(session_key)
 
@@ -127,6 +144,9 @@ def build_app(bot: Bot, database) -> web.Application:
         if not allowed:
             raise web.HTTPServiceUnavailable(reason="bandwidth limit exceeded")
 
+        # The player on this page will ask for the bytes in a moment.
+        predictive_warmer.schedule(file_data)
+
         base      = str(request.url.origin())
         file_type = (
             "video"   if file_data["file_type"] == Config.FILE_TYPE_VIDEO
@@ -151,6 +171,67 @@ def build_app(bot: Bot, database) -> web.Application:
         file_hash = request.match_info["file_hash"]
         return await _tracked_stream(request, file_hash, is_download=True)
 
+    async def zip_files(request: web.Request):
+        """
+        ``/zip?files=<hash>,<hash>,…`` or ``/zip?user=<id>&sig=<signature>``
+        for everything a user has stored (the link is sent by /files).
+        """
+        query = request.query
+        if "user" in query:
+            user_id = query["user"]
+            if not Cryptic.verify_user_files(query.get("sig", ""), user_id):
+                raise web.HTTPForbidden(reason="invalid signature")
+            # One past the cap tells a full archive from a truncated one.
+            docs = await database.get_user_files(user_id, limit=Config.ZIP_MAX_FILES + 1)
+            if len(docs) > Config.ZIP_MAX_FILES:
+                raise web.HTTPBadRequest(reason=f"at most {Config.ZIP_MAX_FILES} files per archive")
+            docs.reverse()  # oldest first
+            archive_name = f"files_{user_id}.zip"
+        else:
+            hashes = list(dict.fromkeys(h for h in query.get("files", "").split(",") if h))
+            if not hashes:
+                raise web.HTTPBadRequest(reason="no files given")
+            if len(hashes) > Config.ZIP_MAX_FILES:
+                raise web.HTTPBadRequest(reason=f"at most {Config.ZIP_MAX_FILES} files per archive")
+            docs = []
+            for file_hash in hashes:
+                file_data = await database.get_file_by_hash(file_hash)
+                if not file_data:
+                    raise web.HTTPNotFound(reason="file not found")
+                docs.append(file_data)
+            archive_name = "files.zip"
+        if not docs:
+            raise web.HTTPNotFound(reason="no files")
+
+        session_key = f"zip:{','.join(d['file_id'] for d in docs)}:{_get_client_ip(request)}"
+        await _register_session(session_key)
+        try:
+            return await streaming_service.stream_zip(request, docs, archive_name)
+        finally:
+            await _unregister_session(session_key)
+
+    async def hls_playlist(request: web.Request):
+        file_hash = request.match_info["file_hash"]
+        try:
+            index = await streaming_service.hls_index(file_hash)
+        except web.HTTPException:
+            raise
+        except Exception as exc:
+            logger.error("hls index failed: hash=%s err=%s", file_hash, exc)
+            raise web.HTTPBadGateway(reason="could not read file from Telegram")
+        if index is None:
+            raise web.HTTPUnsupportedMediaType(reason="HLS is only available for fragmented MP4 files")
+
+        url = f"{request.url.origin()}/stream/{file_hash}"
+        return web.Response(
+            text=render_playlist(index, url, Config.HLS_SEGMENT_DURATION),
+            content_type="application/vnd.apple.mpegurl",
+            headers={
+                "Cache-Control":               "no-cache",
+                "Access-Control-Allow-Origin": "*",
+            },
+        )
+
     async def _collect_panel_data():
         try:
             stats    = await database.get_stats()
@@ -295,12 +376,33 @@ def build_app(bot: Bot, database) -> web.Application:
                 "bot_dc":                  info["bot_dc"],
                 "active_conns":            get_active_session_count(),
                 "active_conns_description": "Live streaming/download sessions currently transferring bytes",
+                "clients":                 streaming_service.client_stats(),
+                "stream_recoveries":       recovery_stats,
+                "memory_cache":            memory_cache.stats(),
+                "stream_buffers":          stream_buffers.stats(),
+                "disk_cache":              disk_cache.stats(),
+                "probe_buffer":            head_tail_cache.stats(),
+                "index_pins":              pinned_ranges.stats(),
+                "hls":                     hls_indexes.stats(),
+                "materialized":            file_materializer.stats(),
+                "shaping":                 traffic_shaper.stats(),
+                "read_ahead":              read_ahead.stats(),
+                "predictive_warmup":       predictive_warmer.stats(),
+                "session_supervisor":      session_supervisor.stats(),
             }
             return web.Response(text=json.dumps(payload), content_type="application/json")
         except Exception as exc:
             logger.error("api_health error: %s", exc)
             return web.json_response({"error": str(exc)}, status=500)
 
+    async def api_streams(request: web.Request):
+        try:
+            payload = {"streams": active_stream_stats()}
+            return web.Response(text=json.dumps(payload), content_type="application/json")
+        except Exception as exc:
+            logger.error("api_streams error: %s", exc)
+            return web.json_response({"error": str(exc)}, status=500)
+
     async def stats_endpoint(request: web.Request):
         if "application/json" in request.headers.get("Accept", ""):
             return await api_stats(request)
@@ -436,10 +538,13 @@ def build_app(bot: Bot, database) -> web.Application:
     app.router.add_get("/",                   home)
     app.router.add_get("/stream/{file_hash}", stream_page)
     app.router.add_get("/dl/{file_hash}",     download_file)
+    app.router.add_get("/hls/{file_hash}/index.m3u8", hls_playlist)
+    app.router.add_get("/zip",                zip_files)
     app.router.add_get("/bot_settings",       bot_settings_page)
     app.router.add_get("/api/stats",          api_stats)
     app.router.add_get("/api/bandwidth",      api_bandwidth)
     app.router.add_get("/api/health",         api_health)
+    app.router.add_get("/api/streams",        api_streams)
     app.router.add_get("/stats",              stats_endpoint)
     app.router.add_get("/bandwidth",          bandwidth_endpoint)
     app.router.add_get("/health",             health_endpoint)
@@ -0,0 +1,120 @@
+"""
+Bytes copied between a fetched Telegram part and response.write, per GB streamed.
+
+Replays a player-like mix of unaligned range requests against
+ByteStreamer.yield_file backed by an in-process fake media session, and
+compares the current memoryview slicing with the previous bytes slicing.
+
+    python benchmarks/copy_bench.py [--gb 1] [--seed 1]
+"""
+import argparse
+import asyncio
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DISK_CACHE_SIZE"] = "0"
+
+from pyrogram import raw  # noqa: E402
+from pyrogram.file_id import FileId, FileType  # noqa: E402
+
+from helper.stream import CHUNK_SIZE, ByteStreamer  # noqa: E402
+
+FILE_SIZE = 4 * 1024 * 1024 * 1024
+PART      = os.urandom(CHUNK_SIZE)
+
+
+class _FakeMediaSession:
+    async def invoke(self, query, *args, **kwargs):
+        return raw.types.upload.File(type=raw.types.storage.FileUnknown(), mtime=0, bytes=PART)
+
+    async def recover(self):
+        return 0
+
+
+class _FakeClient:
+    name           = "bench"
+    media_sessions = {}
+
+
+def _legacy_slice(chunk, idx, count, first_cut, last_cut):
+    if count == 1:
+        return chunk[first_cut:last_cut]
+    if idx == 0:
+        return chunk[first_cut:]
+    if idx == count - 1:
+        return chunk[:last_cut]
+    return chunk
+
+
+def _copied(piece, part) -> int:
+    if piece is part:
+        return 0
+    if isinstance(piece, memoryview) and piece.obj is part:
+        return 0
+    return len(piece)
+
+
+def _ranges(total: int, rng: random.Random):
+    served = 0
+    while served < total:
+        start  = rng.randrange(0, FILE_SIZE - 16 * CHUNK_SIZE)
+        length = rng.randint(64 * 1024, 8 * CHUNK_SIZE)
+        served += length
+        yield start, start + length - 1
+
+
+async def run(gb: float, seed: int) -> None:
+    streamer = ByteStreamer(_FakeClient())
+
+    async def _session(client, file_id):
+        return _FakeMediaSession()
+
+    streamer.generate_media_session = _session
+    file_id = FileId(
+        file_type=FileType.DOCUMENT, dc_id=2, media_id=1, access_hash=1, file_reference=b"",
+    )
+
+    total  = int(gb * 1024 ** 3)
+    before = after = served = requests = 0
+    started = time.perf_counter()
+
+    for media_id, (from_bytes, until_bytes) in enumerate(_ranges(total, random.Random(seed))):
+        # A fresh media_id per request keeps the shared memory cache out of the picture.
+        file_id.media_id = media_id
+        offset         = from_bytes - (from_bytes % CHUNK_SIZE)
+        first_part_cut = from_bytes - offset
+        last_part_cut  = (until_bytes % CHUNK_SIZE) + 1
+        part_count     = math.ceil((until_bytes + 1) / CHUNK_SIZE) - (offset // CHUNK_SIZE)
+
+        for idx in range(part_count):
+            before += _copied(_legacy_slice(PART, idx, part_count, first_part_cut, last_part_cut), PART)
+
+        async for piece in streamer.yield_file(
+            file_id, offset, first_part_cut, last_part_cut, part_count, CHUNK_SIZE,
+        ):
+            after  += _copied(piece, PART)
+            served += len(piece)
+        requests += 1
+
+    per_gb = 1024 ** 3 / served
+    print(f"requests          : {requests}")
+    print(f"bytes streamed    : {served}")
+    print(f"copied / GB before: {int(before * per_gb)}")
+    print(f"copied / GB after : {int(after * per_gb)}")
+    print(f"elapsed           : {time.perf_counter() - started:.2f}s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--gb",   type=float, default=1.0)
+    parser.add_argument("--seed", type=int,   default=1)
+    args = parser.parse_args()
+    asyncio.run(run(args.gb, args.seed))
+
+
+if __name__ == "__main__":
+    main()
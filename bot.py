@@ -1,4 +1,6 @@
 import time
+from typing import List
+
 from pyrogram import Client
 from pyrogram.types import BotCommand, BotCommandScopeChat
 from config import Config
@@ -87,3 +89,42 @@ class Bot(Client):
             logger.error("❌  ꜰᴀɪʟᴇᴅ ᴛᴏ ʀᴇɢɪꜱᴛᴇʀ ᴄᴏᴍᴍᴀɴᴅꜱ: %s", e)
 
 
+class WorkerBot(Client):
+    """Headless extra bot that only fetches file parts for the streaming path."""
+
+    def __init__(self, index: int, bot_token: str):
+        super().__init__(
+            name=f"FileStreamWorker{index}",
+            api_id=Config.API_ID,
+            api_hash=Config.API_HASH,
+            bot_token=bot_token,
+            no_updates=True,
+            sleep_threshold=10,
+        )
+        self.index = index
+
+    async def start(self):
+        await super().start()
+        me = await self.get_me()
+        self.me = me
+        # Warm the peer cache so get_messages on the dump chat resolves.
+        await self.get_chat(Config.FLOG_CHAT_ID)
+        logger.info("⚡  ᴡᴏʀᴋᴇʀ %s: @%s  │  ᴅᴄ: %s", self.index, me.username, me.dc_id)
+        return me
+
+
+async def start_workers() -> List[WorkerBot]:
+    workers = []
+    for index, token in enumerate(Config.MULTI_TOKENS, start=1):
+        worker = WorkerBot(index, token)
+        try:
+            await worker.start()
+        except Exception as exc:
+            logger.warning("⚠️  ᴡᴏʀᴋᴇʀ %s ꜰᴀɪʟᴇᴅ ᴛᴏ ꜱᴛᴀʀᴛ: %s", index, exc)
+            try:
+                await worker.stop()
+            except Exception:
+                pass
+            continue
+        workers.append(worker)
+    return workers
@@ -14,6 +14,17 @@ class Config:
     API_ID    = int(os.environ.get("API_ID", "0"))
     API_HASH  = os.environ.get("API_HASH", "")
 
+    # Extra headless bots (MULTI_TOKEN1, MULTI_TOKEN2, …) that share the
+    # streaming load.  Each must be a member of FLOG_CHAT_ID.
+    MULTI_TOKENS = [
+        os.environ[key]
+        for key in sorted(
+            (k for k in os.environ if k.startswith("MULTI_TOKEN") and k[11:].isdigit()),
+            key=lambda k: int(k[11:]),
+        )
+        if os.environ[key].strip()
+    ]
+
     FILE_TYPE_VIDEO    = "video"
     FILE_TYPE_AUDIO    = "audio"
     FILE_TYPE_IMAGE    = "image"
@@ -44,6 +55,50 @@ class Config:
     PORT         = int(os.environ.get("PORT", 8080))
     URL          = os.environ.get("URL", os.environ.get("BASE_URL", ""))
 
+    CACHE_DIR          = os.environ.get("CACHE_DIR", "cache")
+    DISK_CACHE_SIZE    = int(os.environ.get("DISK_CACHE_SIZE", 2147483648))
+    MEMORY_CACHE_SIZE  = int(os.environ.get("MEMORY_CACHE_SIZE", 268435456))
+    STREAM_BUFFER_SIZE = int(os.environ.get("STREAM_BUFFER_SIZE", 268435456))
+
+    PROBE_BUFFER_SIZE  = int(os.environ.get("PROBE_BUFFER_SIZE", 65536))
+    PROBE_BUFFER_FILES = int(os.environ.get("PROBE_BUFFER_FILES", 256))
+    INDEX_PIN_SIZE     = int(os.environ.get("INDEX_PIN_SIZE", 134217728))
+
+    HLS_SEGMENT_DURATION = float(os.environ.get("HLS_SEGMENT_DURATION", 6))
+
+    MATERIALIZE_SIZE      = int(os.environ.get("MATERIALIZE_SIZE", 5368709120))
+    MATERIALIZE_THRESHOLD = float(os.environ.get("MATERIALIZE_THRESHOLD", 50))
+    MATERIALIZE_HALF_LIFE = float(os.environ.get("MATERIALIZE_HALF_LIFE", 3600))
+
+    ZIP_MAX_FILES = int(os.environ.get("ZIP_MAX_FILES", 100))
+
+    STREAM_FETCH_WINDOW = int(os.environ.get("STREAM_FETCH_WINDOW", 3))
+    DL_FETCH_WINDOW     = int(os.environ.get("DL_FETCH_WINDOW", 8))
+    PREFETCH_MIN_DEPTH  = int(os.environ.get("PREFETCH_MIN_DEPTH", 2))
+    READAHEAD_TTL       = int(os.environ.get("READAHEAD_TTL", 10))
+    FIRST_PART_SIZE     = int(os.environ.get("FIRST_PART_SIZE", 65536))
+
+    MEDIA_SESSIONS_PER_DC  = int(os.environ.get("MEDIA_SESSIONS_PER_DC", 2))
+    GETFILE_CONCURRENCY_PER_DC = int(os.environ.get("GETFILE_CONCURRENCY_PER_DC", 12))
+    STREAM_RECOVERY_BUDGET = int(os.environ.get("STREAM_RECOVERY_BUDGET", 3))
+
+    SESSION_CHECK_INTERVAL = int(os.environ.get("SESSION_CHECK_INTERVAL", 15))
+    SESSION_SLOW_FACTOR    = float(os.environ.get("SESSION_SLOW_FACTOR", 4.0))
+    MEDIA_SESSION_IDLE_TTL = int(os.environ.get("MEDIA_SESSION_IDLE_TTL", 900))
+
+    HEDGE_PERCENTILE = float(os.environ.get("HEDGE_PERCENTILE", 95))
+    HEDGE_BUDGET     = float(os.environ.get("HEDGE_BUDGET", 0.05))
+    HEDGE_MIN_DELAY  = float(os.environ.get("HEDGE_MIN_DELAY", 0.3))
+
+    MAX_RANGES = int(os.environ.get("MAX_RANGES", 16))
+
+    WARMUP_DCS      = os.environ.get("WARMUP_DCS", "auto")
+    WARMUP_SAMPLE   = int(os.environ.get("WARMUP_SAMPLE", 500))
+    WARMUP_INTERVAL = int(os.environ.get("WARMUP_INTERVAL", 300))
+
+    PREDICTIVE_WARMUP_CONCURRENCY = int(os.environ.get("PREDICTIVE_WARMUP_CONCURRENCY", 2))
+    PREDICTIVE_WARMUP_QUEUE       = int(os.environ.get("PREDICTIVE_WARMUP_QUEUE", 32))
+
     @classmethod
     async def load(cls, db):
         doc = await db.config.find_one({"key": "Settings"})
@@ -94,6 +94,40 @@ class Database:
             logger.error("get file by hash error: %s", e)
             return None
 
+    async def set_file_index(self, file_hash: str, index_ranges: List[List[int]]) -> bool:
+        try:
+            result = await self.files.update_one(
+                {"file_id": file_hash},
+                {"$set": {"index_ranges": index_ranges}},
+            )
+            return result.matched_count > 0
+        except Exception as e:
+            logger.error("set file index error: %s", e)
+            return False
+
+    async def set_file_crc(self, file_hash: str, crc32: int) -> bool:
+        try:
+            result = await self.files.update_one(
+                {"file_id": file_hash},
+                {"$set": {"crc32": crc32}},
+            )
+            return result.matched_count > 0
+        except Exception as e:
+            logger.error("set file crc error: %s", e)
+            return False
+
+    async def get_recent_telegram_file_ids(self, limit: int = 500) -> List[str]:
+        try:
+            cursor = (
+                self.files.find({"telegram_file_id": {"$nin": ["", None]}}, {"telegram_file_id": 1})
+                .sort("created_at", -1)
+                .limit(limit)
+            )
+            return [doc["telegram_file_id"] for doc in await cursor.to_list(length=limit)]
+        except Exception as e:
+            logger.error("get recent telegram file ids error: %s", e)
+            return []
+
     async def delete_file(self, message_id: str) -> bool:
         try:
             result = await self.files.delete_one({"message_id": message_id})
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import weakref
+from collections import deque
+from typing import Deque, Optional, Tuple
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Share of the budget read-ahead may fill; the rest is kept for the parts
+# viewers are waiting on right now, so a new stream never queues behind
+# everybody else's prefetch.
+_PREFETCH_SHARE = 0.8
+
+# Longest a fetch waits for room before it is let through over budget.
+# Parts are held until written, so a client that stops reading can pin its
+# share for a while; this keeps everyone else moving.
+_MAX_WAIT = 5.0
+
+
+class _Lease:
+    __slots__ = ("budget", "nbytes")
+
+    def __init__(self, budget: "BufferBudget", nbytes: int):
+        self.budget = budget
+        self.nbytes = nbytes
+
+    def release(self) -> None:
+        if self.nbytes:
+            self.budget._free(self.nbytes)
+            self.nbytes = 0
+
+
+class BufferBudget:
+    """
+    Process-wide byte budget for Telegram parts fetched but not yet written.
+
+    Space is reserved before a part's GetFile is issued and bound to the
+    fetch task; it is given back once the part has been written to the
+    client (``release``), or at the latest when the task is garbage
+    collected — a part parked for read-ahead keeps its share until it is
+    adopted or expires.
+
+    The part a stream needs next waits for room (``reserve``); read-ahead
+    only runs while it fits in ``_PREFETCH_SHARE`` of the budget
+    (``try_reserve``), so under pressure every stream degrades to fetching
+    one part at a time instead of memory growing with the number of streams.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.enabled   = max_bytes > 0
+        self.used      = 0
+        self.peak      = 0
+        self._leases: "weakref.WeakKeyDictionary[asyncio.Task, _Lease]" = weakref.WeakKeyDictionary()
+        self._waiters: Deque[Tuple[int, asyncio.Future]] = deque()
+
+        self.waits           = 0
+        self.overcommits     = 0
+        self.prefetch_denied = 0
+
+    def _charge(self, nbytes: int) -> int:
+        return min(nbytes, self.max_bytes)
+
+    def _take(self, nbytes: int) -> None:
+        self.used += nbytes
+        self.peak  = max(self.peak, self.used)
+
+    def try_reserve(self, nbytes: int) -> bool:
+        """Reserve ``nbytes`` of read-ahead space if it is free right now."""
+        if not self.enabled:
+            return True
+        nbytes = self._charge(nbytes)
+        if self._waiters or self.used + nbytes > self.max_bytes * _PREFETCH_SHARE:
+            self.prefetch_denied += 1
+            return False
+        self._take(nbytes)
+        return True
+
+    async def reserve(self, nbytes: int) -> None:
+        """Reserve ``nbytes``, waiting in line (up to ``_MAX_WAIT``) for room."""
+        if not self.enabled:
+            return
+        nbytes = self._charge(nbytes)
+        if not self._waiters and self.used + nbytes <= self.max_bytes:
+            self._take(nbytes)
+            return
+
+        self.waits += 1
+        waiter = (nbytes, asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter[1]), _MAX_WAIT)
+        except asyncio.TimeoutError:
+            if waiter[1].done():
+                return
+            self._waiters.remove(waiter)
+            waiter[1].cancel()
+            self.overcommits += 1
+            self._take(nbytes)
+            logger.debug("stream buffer budget exhausted — %d bytes let through over budget", nbytes)
+        except asyncio.CancelledError:
+            if waiter[1].done() and not waiter[1].cancelled():
+                self._free(nbytes)
+            else:
+                self._waiters.remove(waiter)
+                waiter[1].cancel()
+            raise
+
+    def bind(self, task: asyncio.Task, nbytes: int) -> None:
+        """Tie ``nbytes`` reserved for ``task`` to it until ``release``."""
+        if not self.enabled:
+            return
+        lease = _Lease(self, self._charge(nbytes))
+        self._leases[task] = lease
+        weakref.finalize(task, lease.release)
+
+    def release(self, task: Optional[asyncio.Task]) -> None:
+        if task is None:
+            return
+        lease = self._leases.pop(task, None)
+        if lease is not None:
+            lease.release()
+
+    def _free(self, nbytes: int) -> None:
+        self.used -= nbytes
+        while self._waiters:
+            size, future = self._waiters[0]
+            if future.done():
+                self._waiters.popleft()
+                continue
+            if self.used + size > self.max_bytes:
+                break
+            self._waiters.popleft()
+            self._take(size)
+            future.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "enabled":         self.enabled,
+            "max_bytes":       self.max_bytes,
+            "used":            self.used,
+            "peak":            self.peak,
+            "parts":           len(self._leases),
+            "waiting":         len(self._waiters),
+            "waits":           self.waits,
+            "overcommits":     self.overcommits,
+            "prefetch_denied": self.prefetch_denied,
+        }
+
+
+stream_buffers = BufferBudget(Config.STREAM_BUFFER_SIZE)
@@ -0,0 +1,451 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config import Config
+
+from .scheduler import SlotTicket
+
+logger = logging.getLogger(__name__)
+
+# (media_id, part_index) — media_id is the same for every client that can
+# see the file, so entries are shared by all viewers and worker clients.
+ChunkKey = Tuple[int, int]
+
+
+class DiskChunkCache:
+    """
+    Persistent LRU cache of Telegram file parts, keyed by (media_id, part_index).
+
+    Every part is stored in its own file under ``<root>/<media_id>/<part>.part``.
+    Parts are written to a temp file, fsync'd and atomically renamed into
+    place, so a crash can never leave a truncated part that would later be
+    served to a viewer.  The LRU order is flushed to ``index.json`` the same
+    way and reconciled against the directory on startup.
+    """
+
+    INDEX_FILE     = "index.json"
+    FLUSH_INTERVAL = 30  # seconds
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root      = root
+        self.max_bytes = max_bytes
+        self.enabled   = max_bytes > 0
+
+        # name ("<media_id>/<part>") → size, least recently used first
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._size   = 0
+        self._dirty  = False
+        self._lock   = asyncio.Lock()
+        self._loaded = False
+        self._flush_task: Optional[asyncio.Task] = None
+
+        self.hits   = 0
+        self.misses = 0
+
+    # ── Paths ─────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _name(media_id: int, part: int) -> str:
+        return f"{media_id}/{part}"
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, f"{name}.part")
+
+    # ── Index persistence ─────────────────────────────────────────────────────
+
+    def _load_index(self) -> None:
+        """Rebuild the in-memory index from index.json plus a directory scan."""
+        os.makedirs(self.root, exist_ok=True)
+
+        saved: List[Tuple[str, int]] = []
+        try:
+            with open(os.path.join(self.root, self.INDEX_FILE), "r", encoding="utf-8") as fh:
+                saved = [tuple(item) for item in json.load(fh)]
+        except FileNotFoundError:
+            pass
+        except (ValueError, TypeError) as exc:
+            logger.warning("disk cache index unreadable, rebuilding: %s", exc)
+
+        on_disk: Dict[str, Tuple[int, float]] = {}
+        for dirpath, _, filenames in os.walk(self.root):
+            for fn in filenames:
+                path = os.path.join(dirpath, fn)
+                if fn.endswith(".tmp"):
+                    # Left behind by a crash mid-write — never valid.
+                    os.remove(path)
+                    continue
+                if not fn.endswith(".part"):
+                    continue
+                name = os.path.relpath(path, self.root)[: -len(".part")].replace(os.sep, "/")
+                st   = os.stat(path)
+                on_disk[name] = (st.st_size, st.st_mtime)
+
+        # Parts written after the last flush are appended in mtime order.
+        for name, size in saved:
+            if name in on_disk and on_disk[name][0] == size:
+                self._index[name] = size
+        for name, (size, _) in sorted(on_disk.items(), key=lambda kv: kv[1][1]):
+            if name not in self._index:
+                self._index[name] = size
+
+        self._size   = sum(self._index.values())
+        self._loaded = True
+        self._remove_parts(self._evict())
+        logger.info(
+            "disk chunk cache ready  root=%s  parts=%d  size=%d/%d",
+            self.root, len(self._index), self._size, self.max_bytes,
+        )
+
+    def _write_index(self, snapshot: List[Tuple[str, int]]) -> None:
+        path = os.path.join(self.root, self.INDEX_FILE)
+        tmp  = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(snapshot, fh)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, path)
+
+    async def flush(self) -> None:
+        if not self.enabled or not self._dirty:
+            return
+        snapshot    = list(self._index.items())
+        self._dirty = False
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._write_index, snapshot)
+        except OSError as exc:
+            self._dirty = True
+            logger.warning("disk cache index flush failed: %s", exc)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.FLUSH_INTERVAL)
+            await self.flush()
+
+    async def _ensure_ready(self) -> None:
+        if self._loaded:
+            return
+        async with self._lock:
+            if not self._loaded:
+                await asyncio.get_running_loop().run_in_executor(None, self._load_index)
+                self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self) -> None:
+        if self._flush_task:
+            self._flush_task.cancel()
+        await self.flush()
+
+    # ── Eviction ──────────────────────────────────────────────────────────────
+
+    def _evict(self) -> List[str]:
+        """Drop least recently used parts from the index; returns their names."""
+        evicted: List[str] = []
+        while self._size > self.max_bytes and self._index:
+            name, size = self._index.popitem(last=False)
+            self._size -= size
+            self._dirty = True
+            evicted.append(name)
+        return evicted
+
+    def _remove_parts(self, names: List[str]) -> None:
+        for name in names:
+            if name in self._index:
+                # Written again since it was evicted — keep the new copy.
+                continue
+            try:
+                os.remove(self._path(name))
+            except FileNotFoundError:
+                pass
+            except OSError as exc:
+                logger.warning("disk cache evict failed for %s: %s", name, exc)
+
+    # ── Public API ────────────────────────────────────────────────────────────
+
+    def has(self, media_id: int, part: int) -> bool:
+        return self.enabled and self._name(media_id, part) in self._index
+
+    async def get(self, media_id: int, part: int) -> Optional[bytes]:
+        if not self.enabled:
+            return None
+        await self._ensure_ready()
+
+        name = self._name(media_id, part)
+        if name not in self._index:
+            self.misses += 1
+            return None
+
+        try:
+            data = await asyncio.get_running_loop().run_in_executor(
+                None, _read_file, self._path(name)
+            )
+        except OSError as exc:
+            logger.warning("disk cache read failed for %s: %s", name, exc)
+            self._size -= self._index.pop(name, 0)
+            self._dirty = True
+            self.misses += 1
+            return None
+
+        if name in self._index:
+            self._index.move_to_end(name)
+            self._dirty = True
+        self.hits += 1
+        return data
+
+    async def put(self, media_id: int, part: int, data: bytes) -> None:
+        if not self.enabled or not data or len(data) > self.max_bytes:
+            return
+        await self._ensure_ready()
+
+        name = self._name(media_id, part)
+        if name in self._index:
+            return
+
+        path = self._path(name)
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, _write_file_atomic, path, data)
+        except OSError as exc:
+            logger.warning("disk cache write failed for %s: %s", name, exc)
+            return
+
+        evicted: List[str] = []
+        async with self._lock:
+            if name not in self._index:
+                self._index[name] = len(data)
+                self._size       += len(data)
+                self._dirty       = True
+                evicted           = self._evict()
+        if evicted:
+            await asyncio.get_running_loop().run_in_executor(None, self._remove_parts, evicted)
+
+    def stats(self) -> dict:
+        return {
+            "enabled":   self.enabled,
+            "parts":     len(self._index),
+            "size":      self._size,
+            "max_bytes": self.max_bytes,
+            "hits":      self.hits,
+            "misses":    self.misses,
+        }
+
+
+class MemoryChunkCache:
+    """
+    Process-wide in-memory part store with single-flight fetching.
+
+    ``get_or_fetch`` returns a cached part, or joins the fetch already in
+    flight for the same key, so N concurrent viewers of a file cost one
+    GetFile per part instead of N.  Entries are evicted LRU once the stored
+    bytes exceed ``max_bytes``.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._store: "OrderedDict[ChunkKey, bytes]" = OrderedDict()
+        self._size = 0
+        self._inflight: Dict[ChunkKey, asyncio.Task] = {}
+
+        self.hits      = 0
+        self.misses    = 0
+        self.coalesced = 0
+
+    def has(self, key: ChunkKey) -> bool:
+        return key in self._store or key in self._inflight
+
+    def get(self, key: ChunkKey) -> Optional[bytes]:
+        data = self._store.get(key)
+        if data is not None:
+            self._store.move_to_end(key)
+        return data
+
+    def put(self, key: ChunkKey, data: bytes) -> None:
+        if not data or len(data) > self.max_bytes:
+            return
+        old = self._store.pop(key, None)
+        if old is not None:
+            self._size -= len(old)
+        self._store[key] = data
+        self._size      += len(data)
+        while self._size > self.max_bytes and self._store:
+            _, evicted = self._store.popitem(last=False)
+            self._size -= len(evicted)
+
+    async def get_or_fetch(
+        self,
+        key: ChunkKey,
+        fetcher: Callable[[], Awaitable[bytes]],
+    ) -> bytes:
+        data = self.get(key)
+        if data is not None:
+            self.hits += 1
+            return data
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.create_task(fetcher())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._on_fetched(key, t))
+        else:
+            self.coalesced += 1
+
+        # Shielded so one viewer disconnecting never cancels the fetch that
+        # other viewers are waiting on.
+        return await asyncio.shield(task)
+
+    def _on_fetched(self, key: ChunkKey, task: asyncio.Task) -> None:
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        self.put(key, task.result())
+
+    def stats(self) -> dict:
+        return {
+            "parts":     len(self._store),
+            "size":      self._size,
+            "max_bytes": self.max_bytes,
+            "inflight":  len(self._inflight),
+            "hits":      self.hits,
+            "misses":    self.misses,
+            "coalesced": self.coalesced,
+        }
+
+
+class HeadTailCache:
+    """
+    Pinned first and last bytes of recently probed files, keyed by file hash.
+
+    Players probe a file with tiny ranges at either end (``bytes=0-1``, the
+    container index at the tail) before playback.  Those are answered from
+    here without the bandwidth aggregation, a FileId lookup or a GetFile.
+    Entries are not subject to part-cache eviction; at most ``max_files``
+    files are kept, least recently probed first out.
+    """
+
+    def __init__(self, max_files: int):
+        self.max_files = max_files
+        # (file_hash, "head" | "tail") → bytes
+        self._store: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+
+        self.hits   = 0
+        self.misses = 0
+
+    def get(self, file_hash: str, edge: str) -> Optional[bytes]:
+        data = self._store.get((file_hash, edge))
+        if data is None:
+            self.misses += 1
+            return None
+        self._store.move_to_end((file_hash, edge))
+        self.hits += 1
+        return data
+
+    def put(self, file_hash: str, edge: str, data: bytes) -> None:
+        if self.max_files <= 0:
+            return
+        self._store[(file_hash, edge)] = data
+        self._store.move_to_end((file_hash, edge))
+        while len(self._store) > self.max_files * 2:
+            self._store.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._store),
+            "size":    sum(len(v) for v in self._store.values()),
+            "hits":    self.hits,
+            "misses":  self.misses,
+        }
+
+
+class PinnedRangeCache:
+    """
+    Container index ranges (MP4 ``moov``, Matroska ``Cues``) held in RAM.
+
+    Players read the index before the first frame and again on seeks; from
+    here those requests skip Telegram entirely.  Files are evicted least
+    recently used once ``max_bytes`` is exceeded, and no single range larger
+    than an eighth of the budget is pinned.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_range = max_bytes // 8
+        # file_hash → [(start, bytes), …]
+        self._store: "OrderedDict[str, List[Tuple[int, bytes]]]" = OrderedDict()
+        self._size = 0
+
+        self.hits = 0
+
+    def has(self, file_hash: str) -> bool:
+        return file_hash in self._store
+
+    def put(self, file_hash: str, ranges: List[Tuple[int, bytes]]) -> None:
+        size = sum(len(data) for _, data in ranges)
+        if not ranges or size > self.max_bytes:
+            return
+        old = self._store.pop(file_hash, None)
+        if old is not None:
+            self._size -= sum(len(data) for _, data in old)
+        self._store[file_hash] = ranges
+        self._size += size
+        while self._size > self.max_bytes and self._store:
+            _, evicted = self._store.popitem(last=False)
+            self._size -= sum(len(data) for _, data in evicted)
+
+    def find(self, file_hash: str, from_bytes: int, until_bytes: int) -> Optional[bytes]:
+        """The requested inclusive range if one pinned range fully covers it."""
+        for start, data in self._store.get(file_hash, ()):
+            if start <= from_bytes and until_bytes < start + len(data):
+                self._store.move_to_end(file_hash)
+                self.hits += 1
+                return data[from_bytes - start: until_bytes - start + 1]
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "files":     len(self._store),
+            "size":      self._size,
+            "max_bytes": self.max_bytes,
+            "hits":      self.hits,
+        }
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as fh:
+        return fh.read()
+
+
+def _write_file_atomic(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{time.monotonic_ns()}.tmp"
+    try:
+        with open(tmp, "wb") as fh:
+            fh.write(data)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+memory_cache = MemoryChunkCache(Config.MEMORY_CACHE_SIZE)
+
+# Scheduler tickets of the fetches in flight in ``memory_cache``.  Kept next to
+# it rather than per client: a viewer on one worker can join a warm-up fetch
+# started by another and still has to raise it to its own priority.
+part_tickets: Dict[ChunkKey, SlotTicket] = {}
+
+head_tail_cache = HeadTailCache(Config.PROBE_BUFFER_FILES)
+
+pinned_ranges = PinnedRangeCache(Config.INDEX_PIN_SIZE)
+
+disk_cache = DiskChunkCache(
+    os.path.join(Config.CACHE_DIR, "chunks"),
+    Config.DISK_CACHE_SIZE,
+)
@@ -0,0 +1,152 @@
+import logging
+from hashlib import sha256
+from typing import Dict
+
+from pyrogram import Client, raw
+from pyrogram.crypto import aes
+from pyrogram.errors import CDNFileHashMismatch
+from pyrogram.session import Auth, Session
+
+from .sessions import dc_lock
+
+logger = logging.getLogger(__name__)
+
+# CDN file hashes cover 128 KB blocks; smaller parts are fetched as the whole
+# block so they can still be verified.
+HASH_BLOCK = 128 * 1024
+
+
+class CdnFetcher:
+    """
+    Serves parts of files that Telegram has moved to a CDN DC.
+
+    After ``upload.FileCdnRedirect`` the bytes come from ``upload.GetCdnFile``
+    on a CDN session, AES-256-CTR encrypted with the redirect's key and an IV
+    whose last 4 bytes are ``offset / 16``.  Every decrypted range is checked
+    against the SHA-256 hashes Telegram hands out on the origin DC
+    (https://core.telegram.org/cdn).  Redirects are remembered per media_id so
+    later parts skip the GetFile round-trip to the origin DC.
+    """
+
+    def __init__(self, client: Client):
+        self.client = client
+        self.redirects: Dict[int, raw.types.upload.FileCdnRedirect] = {}
+        # file_token → {offset: FileHash}
+        self._hashes: Dict[bytes, Dict[int, raw.types.FileHash]] = {}
+
+        self.parts     = 0
+        self.reuploads = 0
+
+    def remember(self, media_id: int, redirect: raw.types.upload.FileCdnRedirect) -> None:
+        self.redirects[media_id] = redirect
+        self._store_hashes(redirect.file_token, redirect.file_hashes)
+
+    def forget(self, media_id: int) -> None:
+        redirect = self.redirects.pop(media_id, None)
+        if redirect is not None:
+            self._hashes.pop(redirect.file_token, None)
+
+    def _store_hashes(self, file_token: bytes, hashes) -> None:
+        known = self._hashes.setdefault(file_token, {})
+        for h in hashes or ():
+            known[h.offset] = h
+
+    async def _get_session(self, dc_id: int) -> Session:
+        # CDN sessions live next to the regular media sessions (CDN DC ids
+        # never collide with the main DCs) so pyrogram stops them on shutdown.
+        client  = self.client
+        session = client.media_sessions.get(dc_id)
+        if session is not None:
+            return session
+
+        async with dc_lock(client, dc_id):
+            session = client.media_sessions.get(dc_id)
+            if session is None:
+                test_mode = await client.storage.test_mode()
+                session   = Session(
+                    client,
+                    dc_id,
+                    await Auth(client, dc_id, test_mode).create(),
+                    test_mode,
+                    is_media=True,
+                    is_cdn=True,
+                )
+                await session.start()
+                client.media_sessions[dc_id] = session
+                logger.debug("Created CDN session for DC %s", dc_id)
+        return session
+
+    async def fetch(
+        self,
+        media_session,
+        redirect: raw.types.upload.FileCdnRedirect,
+        offset: int,
+        limit: int,
+    ) -> bytes:
+        if limit < HASH_BLOCK:
+            base = offset - offset % HASH_BLOCK
+            data = await self.fetch(media_session, redirect, base, HASH_BLOCK)
+            return data[offset - base:offset - base + limit]
+
+        cdn_session = await self._get_session(redirect.dc_id)
+
+        for _ in range(3):
+            r = await cdn_session.invoke(
+                raw.functions.upload.GetCdnFile(
+                    file_token=redirect.file_token,
+                    offset=offset,
+                    limit=limit,
+                )
+            )
+            if not isinstance(r, raw.types.upload.CdnFileReuploadNeeded):
+                break
+
+            # The CDN doesn't hold this range yet — ask the origin DC to push it.
+            self.reuploads += 1
+            hashes = await media_session.invoke(
+                raw.functions.upload.ReuploadCdnFile(
+                    file_token=redirect.file_token,
+                    request_token=r.request_token,
+                )
+            )
+            self._store_hashes(redirect.file_token, hashes)
+        else:
+            raise IOError(f"CDN DC {redirect.dc_id} kept asking for reupload at offset {offset}")
+
+        data = aes.ctr256_decrypt(
+            r.bytes,
+            redirect.encryption_key,
+            bytearray(redirect.encryption_iv[:-4] + (offset // 16).to_bytes(4, "big")),
+        )
+        await self._verify(media_session, redirect.file_token, offset, data)
+        self.parts += 1
+        return data
+
+    async def _verify(self, media_session, file_token: bytes, offset: int, data: bytes) -> None:
+        known = self._hashes.setdefault(file_token, {})
+        view  = memoryview(data)
+        pos   = offset
+        end   = offset + len(data)
+
+        while pos < end:
+            h = known.get(pos)
+            if h is None:
+                hashes = await media_session.invoke(
+                    raw.functions.upload.GetCdnFileHashes(file_token=file_token, offset=pos)
+                )
+                self._store_hashes(file_token, hashes)
+                h = known.get(pos)
+                if h is None:
+                    raise CDNFileHashMismatch(f"no CDN hash covers offset {pos}")
+
+            piece = view[pos - offset: pos - offset + h.limit]
+            if sha256(piece).digest() != h.hash:
+                raise CDNFileHashMismatch()
+            pos += h.limit
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "redirected_files": len(self.redirects),
+            "parts":            self.parts,
+            "reuploads":        self.reuploads,
+        }
@@ -0,0 +1,258 @@
+import logging
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# read(offset, length) → up to ``length`` bytes of the file from ``offset``.
+Reader = Callable[[int, int], Awaitable[bytes]]
+
+# Inclusive (start, end) byte ranges of a container's index.
+IndexRanges = List[Tuple[int, int]]
+
+# (offset, size, duration in seconds) of one fragment of a fragmented MP4.
+Fragment = Tuple[int, int, float]
+
+# Top-level MP4 boxes walked before giving up on finding moov.
+_MP4_MAX_BOXES = 64
+
+# Largest sidx box read; 12 bytes per fragment, so ample for any real file.
+_SIDX_MAX_BYTES = 4 * 1024 * 1024
+
+# Leading bytes searched for the Matroska SeekHead.
+_MKV_HEAD_BYTES = 64 * 1024
+
+_EBML_HEADER = 0x1A45DFA3
+_SEGMENT     = 0x18538067
+_SEEK_HEAD   = 0x114D9B74
+_SEEK        = 0x4DBB
+_SEEK_ID     = 0x53AB
+_SEEK_POS    = 0x53AC
+_CUES        = 0x1C53BB6B
+_CLUSTER     = 0x1F43B675
+
+
+async def locate_index(read: Reader, file_size: int) -> IndexRanges:
+    """
+    Byte ranges holding the seek index of an MP4 (``moov``) or Matroska /
+    WebM (``Cues``) file, or ``[]`` when the container isn't recognised or
+    has no index.  Players fetch these before the first frame and on every
+    seek, so they are worth keeping in memory.
+    """
+    head = await read(0, 16)
+    if len(head) >= 8 and head[4:8] == b"ftyp":
+        return await _locate_mp4(read, file_size)
+    if len(head) >= 4 and int.from_bytes(head[:4], "big") == _EBML_HEADER:
+        return await _locate_mkv(read, file_size)
+    return []
+
+
+# ── MP4 ───────────────────────────────────────────────────────────────────────
+
+async def _mp4_box(read: Reader, offset: int, file_size: int) -> Optional[Tuple[bytes, int, int]]:
+    """(type, size, header length) of the top-level box at ``offset``."""
+    if offset + 8 > file_size:
+        return None
+    header = await read(offset, 16)
+    if len(header) < 8:
+        return None
+    size        = int.from_bytes(header[:4], "big")
+    kind        = bytes(header[4:8])
+    header_size = 8
+    if size == 1:
+        if len(header) < 16:
+            return None
+        size        = int.from_bytes(header[8:16], "big")
+        header_size = 16
+    elif size == 0:
+        size = file_size - offset
+    if size < header_size:
+        return None
+    return kind, size, header_size
+
+
+async def _locate_mp4(read: Reader, file_size: int) -> IndexRanges:
+    """Walk top-level boxes until ``moov``; non-faststart files keep it last."""
+    offset = 0
+    for _ in range(_MP4_MAX_BOXES):
+        box = await _mp4_box(read, offset, file_size)
+        if box is None:
+            break
+        kind, size, _ = box
+        if kind == b"moov":
+            return [(offset, min(offset + size, file_size) - 1)]
+        offset += size
+    return []
+
+
+async def locate_fragments(
+    read: Reader,
+    file_size: int,
+) -> Optional[Tuple[Tuple[int, int], List[Fragment]]]:
+    """
+    Init section (``ftyp`` + ``moov``, inclusive range) and fragments of a
+    fragmented MP4 that carries a segment index (``sidx``) ahead of its first
+    fragment, or ``None`` for anything else.  Only such files can be offered
+    as HLS without repackaging: every fragment is then a playable segment.
+    """
+    head = await read(0, 16)
+    if len(head) < 8 or head[4:8] != b"ftyp":
+        return None
+
+    offset   = 0
+    init_end = None
+    for _ in range(_MP4_MAX_BOXES):
+        box = await _mp4_box(read, offset, file_size)
+        if box is None:
+            return None
+        kind, size, header_size = box
+        if kind == b"moov":
+            init_end = offset + size
+        elif kind == b"sidx":
+            if init_end is None or size > _SIDX_MAX_BYTES:
+                return None
+            fragments = _parse_sidx(await read(offset, size), header_size, offset + size)
+            if not fragments or fragments[-1][0] + fragments[-1][1] > file_size:
+                return None
+            return (0, init_end - 1), fragments
+        elif kind in (b"moof", b"mdat"):
+            return None
+        offset += size
+    return None
+
+
+def _parse_sidx(box: bytes, pos: int, anchor: int) -> List[Fragment]:
+    """Fragments referenced by a sidx box; ``[]`` if it nests further sidx boxes."""
+    try:
+        version   = box[pos]
+        timescale = int.from_bytes(box[pos + 8:pos + 12], "big")
+        if version == 0:
+            first_offset = int.from_bytes(box[pos + 16:pos + 20], "big")
+            pos += 20
+        else:
+            first_offset = int.from_bytes(box[pos + 20:pos + 28], "big")
+            pos += 28
+        count = int.from_bytes(box[pos + 2:pos + 4], "big")
+        pos  += 4
+    except IndexError:
+        return []
+    if not timescale or len(box) < pos + 12 * count:
+        return []
+
+    fragments = []
+    offset    = anchor + first_offset
+    for _ in range(count):
+        word     = int.from_bytes(box[pos:pos + 4], "big")
+        duration = int.from_bytes(box[pos + 4:pos + 8], "big")
+        if word >> 31:
+            return []  # reference to another sidx
+        size = word & 0x7FFFFFFF
+        fragments.append((offset, size, duration / timescale))
+        offset += size
+        pos    += 12
+    return fragments
+
+
+# ── Matroska / WebM ───────────────────────────────────────────────────────────
+
+def _read_id(buf: bytes, pos: int) -> Tuple[int, int]:
+    """EBML element ID (marker bit kept) and its length in bytes."""
+    first = buf[pos]
+    length = 1
+    while length <= 4 and not first & (0x80 >> (length - 1)):
+        length += 1
+    if length > 4 or pos + length > len(buf):
+        raise ValueError("bad EBML id")
+    return int.from_bytes(buf[pos:pos + length], "big"), length
+
+
+def _read_size(buf: bytes, pos: int) -> Tuple[Optional[int], int]:
+    """EBML data size (``None`` if unknown) and its length in bytes."""
+    first = buf[pos]
+    length = 1
+    while length <= 8 and not first & (0x80 >> (length - 1)):
+        length += 1
+    if length > 8 or pos + length > len(buf):
+        raise ValueError("bad EBML size")
+    value = first & (0xFF >> length)
+    for byte in buf[pos + 1:pos + length]:
+        value = (value << 8) | byte
+    if value == (1 << (7 * length)) - 1:
+        return None, length
+    return value, length
+
+
+def _element(buf: bytes, pos: int) -> Tuple[int, Optional[int], int]:
+    """(id, size, data_start) of the element starting at ``pos``."""
+    element_id, id_len = _read_id(buf, pos)
+    size, size_len     = _read_size(buf, pos + id_len)
+    return element_id, size, pos + id_len + size_len
+
+
+def _seek_entries(buf: bytes, start: int, end: int) -> List[Tuple[int, int]]:
+    """(SeekID, SeekPosition) pairs of a SeekHead."""
+    entries = []
+    pos = start
+    while pos < end:
+        element_id, size, data = _element(buf, pos)
+        if size is None:
+            break
+        if element_id == _SEEK:
+            seek_id, seek_pos = None, None
+            child = data
+            while child < data + size:
+                child_id, child_size, child_data = _element(buf, child)
+                if child_size is None:
+                    break
+                value = bytes(buf[child_data:child_data + child_size])
+                if child_id == _SEEK_ID:
+                    seek_id = int.from_bytes(value, "big")
+                elif child_id == _SEEK_POS:
+                    seek_pos = int.from_bytes(value, "big")
+                child = child_data + child_size
+            if seek_id is not None and seek_pos is not None:
+                entries.append((seek_id, seek_pos))
+        pos = data + size
+    return entries
+
+
+async def _locate_mkv(read: Reader, file_size: int) -> IndexRanges:
+    """Find ``Cues`` through the Segment's SeekHead (or directly, if it comes first)."""
+    buf = await read(0, min(file_size, _MKV_HEAD_BYTES))
+    try:
+        element_id, size, data = _element(buf, 0)
+        if element_id != _EBML_HEADER or size is None:
+            return []
+        element_id, _, segment_data = _element(buf, data + size)
+        if element_id != _SEGMENT:
+            return []
+
+        cues_pos = None
+        pos = segment_data
+        while pos < len(buf) and cues_pos is None:
+            element_id, size, data = _element(buf, pos)
+            if element_id == _CUES:
+                cues_pos = pos
+            elif element_id == _SEEK_HEAD and size is not None and data + size <= len(buf):
+                for seek_id, seek_pos in _seek_entries(buf, data, data + size):
+                    if seek_id == _CUES:
+                        cues_pos = segment_data + seek_pos
+            elif element_id == _CLUSTER or size is None:
+                break
+            if size is None:
+                break
+            pos = data + size
+    except (ValueError, IndexError) as exc:
+        logger.debug("matroska header unreadable: %s", exc)
+        return []
+
+    if cues_pos is None or cues_pos >= file_size:
+        return []
+
+    header = await read(cues_pos, 12)
+    try:
+        element_id, size, data = _element(header, 0)
+    except (ValueError, IndexError):
+        return []
+    if element_id != _CUES or size is None:
+        return []
+    return [(cues_pos, min(cues_pos + data + size, file_size) - 1)]
@@ -22,3 +22,22 @@ class Cryptic:
             return hmac.compare_digest(file_hash, expected)
         except Exception:
             return False
+
+    @staticmethod
+    def hash_user_files(user_id: str) -> str:
+        """Signature for a link to all of ``user_id``'s files as one archive."""
+        payload = f"files:{user_id}:{Config.SECRET_KEY}"
+        signature = hmac.new(
+            Config.SECRET_KEY.encode("utf-8"),
+            payload.encode("utf-8"),
+            hashlib.sha256,
+        ).hexdigest()
+        return signature[:24]
+
+    @staticmethod
+    def verify_user_files(signature: str, user_id: str) -> bool:
+        try:
+            expected = Cryptic.hash_user_files(user_id)
+            return hmac.compare_digest(signature, expected)
+        except Exception:
+            return False
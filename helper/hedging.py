@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from .sessions import MediaSessionPool
+
+logger = logging.getLogger(__name__)
+
+# Latency samples kept per DC, and how many are needed before hedging starts.
+_SAMPLES     = 256
+_MIN_SAMPLES = 32
+
+# Hedge tokens that may be banked while traffic is calm.
+_MAX_TOKENS = 10.0
+
+
+class _DcLatency:
+    def __init__(self):
+        self.samples: Deque[float] = deque(maxlen=_SAMPLES)
+        self.deadline: Optional[float] = None
+        self._since = 0  # samples added since the deadline was computed
+
+    def add(self, elapsed: float, percentile: float, floor: float) -> None:
+        self.samples.append(elapsed)
+        self._since += 1
+        if len(self.samples) >= _MIN_SAMPLES and (self.deadline is None or self._since >= 16):
+            ordered       = sorted(self.samples)
+            index         = min(len(ordered) - 1, int(len(ordered) * percentile / 100))
+            self.deadline = max(floor, ordered[index])
+            self._since   = 0
+
+
+class Hedger:
+    """
+    Hedged GetFile calls for one Telegram account.
+
+    A call that hasn't returned by the DC's ``percentile`` latency (never
+    less than ``min_delay``) is sent again on a different session of the
+    same pool; whichever answers first wins and the other is cancelled.
+    Every plain call earns ``budget`` hedge tokens and every hedge spends
+    one, so hedges stay within that fraction of all calls.  The duplicate
+    runs inside the original's scheduler slot.
+    """
+
+    def __init__(self, percentile: float, budget: float, min_delay: float):
+        self.percentile = percentile
+        self.budget     = budget
+        self.min_delay  = min_delay
+        self.enabled    = 0 < percentile < 100 and budget > 0
+        self._latency: Dict[int, _DcLatency] = {}
+        self._tokens    = 1.0
+
+        self.calls       = 0
+        self.hedged      = 0
+        self.hedge_wins  = 0
+        self.over_budget = 0
+
+    def deadline(self, dc_id: int) -> Optional[float]:
+        latency = self._latency.get(dc_id)
+        return latency.deadline if latency else None
+
+    def _record(self, dc_id: int, elapsed: float) -> None:
+        latency = self._latency.get(dc_id)
+        if latency is None:
+            latency = self._latency[dc_id] = _DcLatency()
+        latency.add(elapsed, self.percentile, self.min_delay)
+
+    async def invoke(self, pool, query, dc_id: int):
+        """``pool.invoke(query)``, hedged when it runs past the deadline."""
+        self.calls  += 1
+        self._tokens = min(_MAX_TOKENS, self._tokens + self.budget)
+        started      = time.monotonic()
+
+        deadline = self.deadline(dc_id)
+        if (
+            not self.enabled
+            or deadline is None
+            or not isinstance(pool, MediaSessionPool)
+            or len(pool.sessions) < 2
+        ):
+            result = await pool.invoke(query)
+            self._record(dc_id, time.monotonic() - started)
+            return result
+
+        first   = pool.pick()
+        primary = asyncio.ensure_future(first.invoke(query))
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=deadline)
+            if done or self._tokens < 1.0:
+                if not done:
+                    self.over_budget += 1
+                result = await primary
+                self._record(dc_id, time.monotonic() - started)
+                return result
+
+            self._tokens -= 1.0
+            self.hedged  += 1
+            logger.debug("hedging GetFile to DC %s after %.0f ms", dc_id, deadline * 1000)
+            hedge = asyncio.ensure_future(pool.pick(exclude=first).invoke(query))
+            try:
+                result = await self._race(primary, hedge)
+                self._record(dc_id, time.monotonic() - started)
+                return result
+            finally:
+                if not hedge.done():
+                    hedge.cancel()
+        finally:
+            if not primary.done():
+                primary.cancel()
+
+    async def _race(self, primary: asyncio.Future, hedge: asyncio.Future):
+        """First successful result of the two; the primary's error if both fail."""
+        pending = {primary, hedge}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                if future.cancelled() or future.exception() is not None:
+                    continue
+                if future is hedge:
+                    self.hedge_wins += 1
+                return future.result()
+        return primary.result()
+
+    def stats(self) -> dict:
+        return {
+            "enabled":      self.enabled,
+            "calls":        self.calls,
+            "hedged":       self.hedged,
+            "hedge_wins":   self.hedge_wins,
+            "win_rate":     round(self.hedge_wins / self.hedged, 3) if self.hedged else None,
+            "over_budget":  self.over_budget,
+            "deadlines_ms": {
+                dc_id: round(latency.deadline * 1000, 1)
+                for dc_id, latency in self._latency.items()
+                if latency.deadline is not None
+            },
+        }
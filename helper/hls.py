@@ -0,0 +1,97 @@
+import math
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from .container import Fragment
+
+# Init section range plus fragments, or None for files that can't be offered.
+HlsIndex = Optional[Tuple[Tuple[int, int], List[Fragment]]]
+
+
+class HlsIndexCache:
+    """
+    Fragment tables of recently requested playlists, including the negative
+    answers, so a player polling ``index.m3u8`` never re-reads the file.
+    """
+
+    def __init__(self, max_files: int):
+        self.max_files = max_files
+        self._store: "OrderedDict[str, HlsIndex]" = OrderedDict()
+
+        self.hits   = 0
+        self.misses = 0
+
+    def __contains__(self, file_hash: str) -> bool:
+        return file_hash in self._store
+
+    def get(self, file_hash: str) -> HlsIndex:
+        if file_hash not in self._store:
+            self.misses += 1
+            return None
+        self._store.move_to_end(file_hash)
+        self.hits += 1
+        return self._store[file_hash]
+
+    def put(self, file_hash: str, index: HlsIndex) -> None:
+        self._store[file_hash] = index
+        self._store.move_to_end(file_hash)
+        while len(self._store) > self.max_files:
+            self._store.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            "files":    len(self._store),
+            "playable": sum(1 for index in self._store.values() if index),
+            "hits":     self.hits,
+            "misses":   self.misses,
+        }
+
+
+def group_fragments(fragments: List[Fragment], target: float) -> List[Fragment]:
+    """
+    Merge consecutive fragments into segments of at least ``target`` seconds.
+
+    Short fragments would otherwise each cost the player a request; grouped
+    segments are one contiguous range each and map onto whole Telegram parts
+    that the part caches share with /stream viewers.
+    """
+    segments: List[Fragment] = []
+    start, size, duration = 0, 0, 0.0
+    for offset, frag_size, frag_duration in fragments:
+        if not size:
+            start = offset
+        size     += frag_size
+        duration += frag_duration
+        if duration >= target:
+            segments.append((start, size, duration))
+            size, duration = 0, 0.0
+    if size:
+        segments.append((start, size, duration))
+    return segments
+
+
+def render_playlist(index: Tuple[Tuple[int, int], List[Fragment]], url: str, target: float) -> str:
+    """VOD media playlist addressing ``url`` with EXT-X-BYTERANGE segments."""
+    (init_start, init_end), fragments = index
+    segments = group_fragments(fragments, target)
+
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:7",
+        f"#EXT-X-TARGETDURATION:{max(1, math.ceil(max(d for _, _, d in segments)))}",
+        "#EXT-X-MEDIA-SEQUENCE:0",
+        "#EXT-X-PLAYLIST-TYPE:VOD",
+        "#EXT-X-INDEPENDENT-SEGMENTS",
+        f'#EXT-X-MAP:URI="{url}",BYTERANGE="{init_end - init_start + 1}@{init_start}"',
+    ]
+    for offset, size, duration in segments:
+        lines += [
+            f"#EXTINF:{duration:.3f},",
+            f"#EXT-X-BYTERANGE:{size}@{offset}",
+            url,
+        ]
+    lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines) + "\n"
+
+
+hls_indexes = HlsIndexCache(512)
@@ -0,0 +1,301 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class FileMaterializer:
+    """
+    Whole-file disk tier for the hottest files.
+
+    Every stream request adds one to the file's popularity score, which
+    halves every ``half_life`` seconds.  Once the score reaches ``threshold``
+    the file is copied to ``<root>/<file_hash>.file`` in the background: read
+    sequentially at warm-up priority, hashed with SHA-256 on the way, fsync'd,
+    re-hashed from disk and only then renamed into place next to a
+    ``.json`` sidecar.  From then on responses are sent from the local file
+    with ``sendfile`` and no Telegram traffic at all.
+
+    When the disk budget runs out the least popular materialized file is
+    dropped, but never for a newcomer that is less popular than it.
+    """
+
+    SUFFIX      = ".file"
+    META_SUFFIX = ".json"
+
+    def __init__(self, root: str, max_bytes: int, threshold: float, half_life: float):
+        self.root      = root
+        self.max_bytes = max_bytes
+        self.threshold = threshold
+        self.half_life = max(1.0, half_life)
+        self.enabled   = max_bytes > 0 and threshold > 0
+        self.service   = None
+
+        # file_hash → sidecar metadata ({"size", "sha256"})
+        self._files:  Dict[str, dict] = {}
+        self._size    = 0
+        # file_hash → (score, time of last update)
+        self._scores: Dict[str, Tuple[float, float]] = {}
+        self._tasks:  Dict[str, asyncio.Task] = {}
+        self._slot    = asyncio.Semaphore(1)
+        self._loaded  = False
+
+        self.served    = 0
+        self.completed = 0
+        self.failed    = 0
+        self.evicted   = 0
+
+    def attach(self, streaming_service) -> None:
+        self.service = streaming_service
+
+    # ── Paths ─────────────────────────────────────────────────────────────────
+
+    def path(self, file_hash: str) -> str:
+        return os.path.join(self.root, f"{file_hash}{self.SUFFIX}")
+
+    def _meta_path(self, file_hash: str) -> str:
+        return os.path.join(self.root, f"{file_hash}{self.META_SUFFIX}")
+
+    # ── Startup ───────────────────────────────────────────────────────────────
+
+    async def load(self) -> None:
+        """Scan the root off the event loop; called once before serving."""
+        if self.enabled and not self._loaded:
+            await asyncio.get_running_loop().run_in_executor(None, self._load)
+
+    def _load(self) -> None:
+        """Pick up files committed by earlier runs and drop unfinished copies."""
+        os.makedirs(self.root, exist_ok=True)
+        now = time.monotonic()
+        for fn in os.listdir(self.root):
+            path = os.path.join(self.root, fn)
+            if fn.endswith(".tmp"):
+                os.remove(path)
+                continue
+            if not fn.endswith(self.SUFFIX):
+                continue
+            file_hash = fn[: -len(self.SUFFIX)]
+            try:
+                with open(self._meta_path(file_hash), "r", encoding="utf-8") as fh:
+                    meta = json.load(fh)
+                if os.path.getsize(path) != meta["size"]:
+                    raise ValueError("size mismatch")
+            except (OSError, ValueError, KeyError, TypeError) as exc:
+                logger.warning("materialized file %s dropped: %s", file_hash, exc)
+                self._remove(file_hash)
+                continue
+            self._files[file_hash]  = meta
+            self._size             += meta["size"]
+            # Survivors start out as popular as a file that just qualified.
+            self._scores[file_hash] = (self.threshold, now)
+        self._loaded = True
+        logger.info(
+            "materialized files ready  root=%s  files=%d  size=%d/%d",
+            self.root, len(self._files), self._size, self.max_bytes,
+        )
+
+    # ── Popularity ────────────────────────────────────────────────────────────
+
+    def score(self, file_hash: str, now: Optional[float] = None) -> float:
+        now = time.monotonic() if now is None else now
+        score, updated = self._scores.get(file_hash, (0.0, now))
+        return score * 0.5 ** ((now - updated) / self.half_life)
+
+    def _prune_scores(self, now: float) -> None:
+        # Forget files whose score has decayed to nothing.
+        self._scores = {
+            file_hash: (self.score(file_hash, now), now)
+            for file_hash in self._scores
+            if file_hash in self._files or self.score(file_hash, now) >= 0.01
+        }
+
+    # ── Public API ────────────────────────────────────────────────────────────
+
+    def touch(self, file_data: dict) -> Optional[str]:
+        """
+        Count a request for ``file_data`` and return the local copy's path if
+        it is materialized.  Starts a copy once the file is popular enough.
+        """
+        if not self.enabled or not self._loaded:
+            return None
+
+        file_hash = file_data["file_id"]
+        now       = time.monotonic()
+        score     = self.score(file_hash, now) + 1.0
+        self._scores[file_hash] = (score, now)
+        if len(self._scores) > 4096:
+            self._prune_scores(now)
+
+        if file_hash in self._files:
+            self.served += 1
+            return self.path(file_hash)
+
+        file_size = int(file_data["file_size"])
+        if (
+            score >= self.threshold
+            and file_hash not in self._tasks
+            and 0 < file_size <= self.max_bytes
+            and self.service is not None
+        ):
+            task = asyncio.create_task(self._run(file_hash, file_data))
+            self._tasks[file_hash] = task
+            task.add_done_callback(lambda _: self._tasks.pop(file_hash, None))
+        return None
+
+    async def _run(self, file_hash: str, file_data: dict) -> None:
+        async with self._slot:
+            try:
+                await self._materialize(file_hash, file_data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                self.failed += 1
+                logger.warning("materializing %s failed: %s", file_hash, exc)
+
+    async def _materialize(self, file_hash: str, file_data: dict) -> None:
+        file_size = int(file_data["file_size"])
+        if self._make_room(file_hash, file_size, evict=False) is None:
+            logger.debug("materialize %s skipped: budget held by more popular files", file_hash)
+            return
+
+        loop   = asyncio.get_running_loop()
+        path   = self.path(file_hash)
+        tmp    = f"{path}.{os.getpid()}.tmp"
+        digest = hashlib.sha256()
+        fh     = await loop.run_in_executor(None, open, tmp, "wb")
+        try:
+            try:
+                written = 0
+                async for chunk in self.service.iter_file(file_data):
+                    await loop.run_in_executor(None, _write_hashed, fh, digest, chunk)
+                    written += len(chunk)
+                await loop.run_in_executor(None, _sync, fh)
+            finally:
+                await loop.run_in_executor(None, fh.close)
+
+            if written != file_size:
+                raise ValueError(f"got {written} of {file_size} bytes")
+            sha256 = digest.hexdigest()
+            on_disk = await loop.run_in_executor(None, _sha256_file, tmp)
+            if on_disk != sha256:
+                raise ValueError("checksum mismatch after write")
+
+            # Space may have been claimed while copying.
+            evicted = self._make_room(file_hash, file_size)
+            if evicted is None:
+                raise ValueError("disk budget no longer available")
+            await loop.run_in_executor(None, self._remove_all, evicted)
+            meta = {"size": file_size, "sha256": sha256, "message_id": str(file_data["message_id"])}
+            await loop.run_in_executor(None, _commit, tmp, path, self._meta_path(file_hash), meta)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+        self._files[file_hash] = meta
+        self._size            += file_size
+        self.completed        += 1
+        logger.info("materialized %s  (%d bytes, sha256 %s)", file_hash, file_size, sha256[:12])
+
+    def _make_room(self, file_hash: str, file_size: int, evict: bool = True) -> Optional[List[str]]:
+        """
+        Evict less popular files until ``file_size`` fits and return them
+        (their files are left for ``_remove_all``); None if it can't fit.
+        """
+        now     = time.monotonic()
+        score   = self.score(file_hash, now)
+        victims = sorted(self._files, key=lambda h: self.score(h, now))
+        needed  = self._size + file_size - self.max_bytes
+        chosen  = []
+        for victim in victims:
+            if needed <= 0:
+                break
+            if self.score(victim, now) >= score:
+                return None
+            chosen.append(victim)
+            needed -= self._files[victim]["size"]
+        if needed > 0:
+            return None
+        if not evict:
+            return []
+        for victim in chosen:
+            self._size -= self._files.pop(victim)["size"]
+            self.evicted += 1
+            logger.debug("materialized file %s evicted", victim)
+        return chosen
+
+    def _remove_all(self, file_hashes: List[str]) -> None:
+        for file_hash in file_hashes:
+            self._remove(file_hash)
+
+    def _remove(self, file_hash: str) -> None:
+        for path in (self.path(file_hash), self._meta_path(file_hash)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as exc:
+                logger.warning("removing %s failed: %s", path, exc)
+
+    def cancel_all(self) -> None:
+        for task in list(self._tasks.values()):
+            task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "enabled":   self.enabled,
+            "files":     len(self._files),
+            "size":      self._size,
+            "max_bytes": self.max_bytes,
+            "copying":   list(self._tasks),
+            "served":    self.served,
+            "completed": self.completed,
+            "failed":    self.failed,
+            "evicted":   self.evicted,
+        }
+
+
+def _write_hashed(fh, digest, chunk) -> None:
+    digest.update(chunk)
+    fh.write(chunk)
+
+
+def _sync(fh) -> None:
+    fh.flush()
+    os.fsync(fh.fileno())
+
+
+def _sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _commit(tmp: str, path: str, meta_path: str, meta: dict) -> None:
+    # The sidecar goes first: a .file without one is dropped on startup.
+    meta_tmp = f"{meta_path}.{os.getpid()}.tmp"
+    with open(meta_tmp, "w", encoding="utf-8") as fh:
+        json.dump(meta, fh)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(meta_tmp, meta_path)
+    os.replace(tmp, path)
+
+
+file_materializer = FileMaterializer(
+    os.path.join(Config.CACHE_DIR, "files"),
+    Config.MATERIALIZE_SIZE,
+    Config.MATERIALIZE_THRESHOLD,
+    Config.MATERIALIZE_HALF_LIFE,
+)
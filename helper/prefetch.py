@@ -0,0 +1,88 @@
+import math
+import time
+from typing import List, Set
+
+# Smoothing factor for drain-rate and latency moving averages.
+_ALPHA = 0.3
+
+# Streams currently being served, exposed via /api/streams for debugging.
+_active: Set["PrefetchController"] = set()
+
+
+class PrefetchController:
+    """
+    Chooses how many parts a single stream keeps requested ahead of the client.
+
+    The depth is the number of parts the client drains during one GetFile
+    round-trip, plus one for jitter, clamped to ``[min_depth, max_depth]``.
+    Fast clients on slow DCs get a deep window; slow or stalled clients stop
+    pulling parts they won't read for a long time.
+    """
+
+    def __init__(
+        self,
+        min_depth: int,
+        max_depth: int,
+        chunk_size: int,
+        label: str = "",
+    ):
+        self.min_depth  = max(1, min_depth)
+        self.max_depth  = max(self.min_depth, max_depth)
+        self.chunk_size = chunk_size
+        self.label      = label
+        self.depth      = self.min_depth
+        self.started    = time.monotonic()
+
+        self.drain_rate    = 0.0  # bytes/s the client accepts
+        self.fetch_latency = 0.0  # seconds per part
+        self.bytes_written = 0
+
+    def __enter__(self) -> "PrefetchController":
+        _active.add(self)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        _active.discard(self)
+
+    @staticmethod
+    def _ewma(current: float, sample: float) -> float:
+        return sample if not current else current + _ALPHA * (sample - current)
+
+    def record_write(self, nbytes: int, seconds: float) -> None:
+        self.bytes_written += nbytes
+        # A write that lands in the socket buffer returns almost instantly;
+        # floor the duration so one such write doesn't read as infinite speed.
+        self.drain_rate = self._ewma(self.drain_rate, nbytes / max(seconds, 1e-3))
+        self._update()
+
+    def record_fetch(self, seconds: float) -> None:
+        self.fetch_latency = self._ewma(self.fetch_latency, seconds)
+        self._update()
+
+    def seed(self, drain_rate: float, fetch_latency: float) -> None:
+        """Start from what an earlier response of the same viewer learned."""
+        self.drain_rate    = drain_rate
+        self.fetch_latency = fetch_latency
+        self._update()
+
+    def _update(self) -> None:
+        if not self.drain_rate or not self.fetch_latency:
+            return
+        need = math.ceil(self.drain_rate * self.fetch_latency / self.chunk_size) + 1
+        self.depth = min(self.max_depth, max(self.min_depth, need))
+
+    def stats(self) -> dict:
+        return {
+            "stream":           self.label,
+            "depth":            self.depth,
+            "min_depth":        self.min_depth,
+            "max_depth":        self.max_depth,
+            "drain_rate":       int(self.drain_rate),
+            "fetch_latency_ms": round(self.fetch_latency * 1000, 1),
+            "bytes_written":    self.bytes_written,
+            "age":              int(time.monotonic() - self.started),
+        }
+
+
+def active_stream_stats() -> List[dict]:
+    return [c.stats() for c in _active]
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Optional, Tuple
+
+from config import Config
+
+from .buffers import stream_buffers
+
+logger = logging.getLogger(__name__)
+
+# (offset, limit) of one Telegram part request.
+PartKey = Tuple[int, int]
+
+
+class ReadAhead:
+    """What one viewer's last response had requested but not yet delivered."""
+
+    def __init__(self, key: str):
+        self.key   = key
+        self.tasks: Dict[PartKey, asyncio.Task] = {}
+        self.drain_rate    = 0.0
+        self.fetch_latency = 0.0
+        self.expires       = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def window(self) -> Tuple[int, int]:
+        """First and one-past-last byte offsets covered by the parked parts."""
+        start = min(offset for offset, _ in self.tasks)
+        end   = max(offset + limit for offset, limit in self.tasks)
+        return start, end
+
+    def cancel(self) -> None:
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        for task in self.tasks.values():
+            task.cancel()
+            stream_buffers.release(task)
+        self.tasks.clear()
+
+
+class ReadAheadRegistry:
+    """
+    Short-lived read-ahead contexts keyed by route and viewer
+    (``dl:file_hash:client_ip`` or ``stream:file_hash:client_ip``).
+
+    Players routinely abort ``bytes=0-`` and reissue ``bytes=N-`` a moment
+    later.  When a response ends early its in-flight part fetches are parked
+    here together with the learned prefetch depth instead of being cancelled.
+    A follow-up request from the same viewer that starts inside, or right
+    after, the parked window adopts them and continues where the last one
+    stopped.  Unclaimed contexts are dropped after READAHEAD_TTL seconds.
+    """
+
+    def __init__(self):
+        self._contexts: Dict[str, ReadAhead] = {}
+
+        self.parked  = 0
+        self.adopted = 0
+        self.expired = 0
+
+    def park(self, key: str, tasks: Dict[PartKey, asyncio.Task], prefetch=None) -> None:
+        ttl = Config.READAHEAD_TTL
+        if not key or ttl <= 0 or not tasks:
+            for task in tasks.values():
+                task.cancel()
+                stream_buffers.release(task)
+            return
+
+        ctx = self._contexts.get(key)
+        if ctx is None:
+            ctx = self._contexts[key] = ReadAhead(key)
+        for part, task in tasks.items():
+            old = ctx.tasks.pop(part, None)
+            if old is not None and old is not task:
+                old.cancel()
+                stream_buffers.release(old)
+            task.add_done_callback(_consume)
+            ctx.tasks[part] = task
+        if prefetch is not None:
+            ctx.drain_rate    = prefetch.drain_rate
+            ctx.fetch_latency = prefetch.fetch_latency
+
+        ctx.expires = time.monotonic() + ttl
+        if ctx._timer:
+            ctx._timer.cancel()
+        ctx._timer = asyncio.get_running_loop().call_later(ttl, self._expire, key, ctx)
+        self.parked += 1
+
+    def adopt(self, key: str, offset: int, chunk_size: int) -> Optional[ReadAhead]:
+        """
+        Hand over the parked parts for ``key`` from ``offset`` on if a response
+        starting at part ``offset`` continues them.  Parts before ``offset``
+        stay parked until the TTL runs out — another connection of the same
+        viewer may still be on its way to them.
+
+        One part of slack is allowed on either side: the part that was being
+        written when the player aborted usually isn't parked, and a reissue
+        right after the window still benefits from the learned depth.
+        """
+        ctx = self._contexts.get(key) if key else None
+        if ctx is None or not ctx.tasks:
+            return None
+
+        start, end = ctx.window()
+        if not start - chunk_size <= offset <= end + chunk_size:
+            return None
+
+        taken = ReadAhead(key)
+        taken.drain_rate    = ctx.drain_rate
+        taken.fetch_latency = ctx.fetch_latency
+        for part in [p for p in ctx.tasks if p[0] >= offset]:
+            taken.tasks[part] = ctx.tasks.pop(part)
+        if not ctx.tasks:
+            del self._contexts[key]
+            if ctx._timer:
+                ctx._timer.cancel()
+                ctx._timer = None
+        self.adopted += 1
+        logger.debug("read-ahead %s adopted at %d with %d part(s)", key, offset, len(taken.tasks))
+        return taken
+
+    def _expire(self, key: str, ctx: ReadAhead) -> None:
+        if self._contexts.get(key) is ctx:
+            del self._contexts[key]
+            ctx._timer = None
+            ctx.cancel()
+            self.expired += 1
+
+    def stats(self) -> dict:
+        return {
+            "contexts": len(self._contexts),
+            "parts":    sum(len(c.tasks) for c in self._contexts.values()),
+            "parked":   self.parked,
+            "adopted":  self.adopted,
+            "expired":  self.expired,
+        }
+
+
+def _consume(task: asyncio.Task) -> None:
+    # A parked part may fail or be dropped without anyone awaiting it.
+    if not task.cancelled():
+        task.exception()
+
+
+read_ahead = ReadAheadRegistry()
@@ -0,0 +1,201 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """GetFile priority classes; lower values are dispatched first."""
+
+    HEAD     = 0  # first part of a /stream response — the player is blocked on it
+    PLAYBACK = 1  # sequential read-ahead of a /stream response
+    BULK     = 2  # /dl downloads
+    WARMUP   = 3  # background prefetch nobody is waiting on yet
+
+
+# Finish tags of flows that have nothing queued are dropped past this many.
+_MAX_FLOW_TAGS = 4096
+
+
+class SlotTicket:
+    """
+    Priority of one logical fetch that may be raised while it waits — a
+    background warm-up of a part that a viewer has just asked for.
+    """
+
+    __slots__ = ("priority", "_waiting")
+
+    def __init__(self, priority: Priority):
+        self.priority = priority
+        self._waiting: Optional[Tuple["_DcQueue", asyncio.Future, str, float]] = None
+
+    def raise_to(self, priority: Priority) -> None:
+        if priority >= self.priority:
+            return
+        self.priority = priority
+        if self._waiting is not None:
+            queue, future, flow, weight = self._waiting
+            queue._push(priority, flow, weight, future)
+
+
+class _DcQueue:
+    """
+    Admission queue for one DC.
+
+    At most ``limit`` calls run at once.  Waiters are ordered by priority
+    class, then by a weighted-fair-queueing finish tag per flow, so within a
+    class each client gets its share of slots whatever its request rate.
+    """
+
+    def __init__(self, dc_id: int, limit: int):
+        self.dc_id   = dc_id
+        self.limit   = max(1, limit)
+        self.active  = 0
+        self.waiting: List[Tuple[int, float, int, asyncio.Future]] = []
+        self.vtime   = [0.0] * len(Priority)
+        self.finish: Dict[Tuple[int, str], float] = {}
+        self._seq    = itertools.count()
+
+        self.paused_until = 0.0
+        self._resume: Optional[asyncio.TimerHandle] = None
+
+        self.granted = [0] * len(Priority)
+        self.queued  = 0
+        self.pauses  = 0
+
+    def _paused(self) -> bool:
+        return time.monotonic() < self.paused_until
+
+    async def acquire(
+        self,
+        priority: Priority,
+        flow: str,
+        weight: float,
+        ticket: Optional[SlotTicket] = None,
+    ) -> None:
+        if ticket is not None:
+            priority = ticket.priority
+        if self.active < self.limit and not self.waiting and not self._paused():
+            self.active += 1
+            self.granted[priority] += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._push(priority, flow, weight, future)
+        self.queued += 1
+        if ticket is not None:
+            ticket._waiting = (self, future, flow, weight)
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Granted and cancelled in the same tick — hand the slot on.
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+        finally:
+            if ticket is not None:
+                ticket._waiting = None
+
+    def _push(self, priority: Priority, flow: str, weight: float, future: asyncio.Future) -> None:
+        """Queue ``future``; a raised ticket pushes it again and the stale entry is skipped."""
+        if len(self.finish) > _MAX_FLOW_TAGS:
+            self.finish = {
+                key: tag for key, tag in self.finish.items() if tag > self.vtime[key[0]]
+            }
+        start = max(self.vtime[priority], self.finish.get((priority, flow), 0.0))
+        tag   = start + 1.0 / max(weight, 1e-3)
+        self.finish[(priority, flow)] = tag
+        heapq.heappush(self.waiting, (int(priority), tag, next(self._seq), future))
+
+    def release(self) -> None:
+        self.active -= 1
+        self._dispatch()
+
+    def pause(self, seconds: float) -> None:
+        """Hold back new calls after a FloodWait instead of piling more on."""
+        until = time.monotonic() + seconds
+        if until <= self.paused_until:
+            return
+        self.paused_until = until
+        self.pauses      += 1
+        logger.warning("GetFile to DC %s paused for %ds", self.dc_id, seconds)
+
+    def _dispatch(self) -> None:
+        if self._paused():
+            if self._resume is None:
+                delay = self.paused_until - time.monotonic()
+                self._resume = asyncio.get_running_loop().call_later(delay, self._on_resume)
+            return
+        while self.active < self.limit and self.waiting:
+            priority, tag, _, future = heapq.heappop(self.waiting)
+            if future.done():
+                continue  # waiter was cancelled
+            self.vtime[priority] = tag
+            self.active += 1
+            self.granted[priority] += 1
+            future.set_result(None)
+
+    def _on_resume(self) -> None:
+        self._resume = None
+        self._dispatch()
+
+    def stats(self) -> dict:
+        return {
+            "limit":   self.limit,
+            "active":  self.active,
+            "waiting": len({id(w[3]) for w in self.waiting if not w[3].done()}),
+            "queued":  self.queued,
+            "pauses":  self.pauses,
+            "granted": {p.name.lower(): self.granted[p] for p in Priority},
+        }
+
+
+class GetFileScheduler:
+    """
+    Central admission control for GetFile-style calls of one Telegram account.
+
+    Every call takes a slot on its DC's queue first, which bounds concurrent
+    calls per DC, serves interactive playback before bulk downloads and
+    background warm-up, and shares slots fairly between clients of the same
+    class.  A FloodWait pauses the whole DC instead of each caller retrying
+    into it on its own.
+    """
+
+    def __init__(self, limit_per_dc: int):
+        self.limit_per_dc = limit_per_dc
+        self._queues: Dict[int, _DcQueue] = {}
+
+    def _queue(self, dc_id: int) -> _DcQueue:
+        queue = self._queues.get(dc_id)
+        if queue is None:
+            queue = self._queues[dc_id] = _DcQueue(dc_id, self.limit_per_dc)
+        return queue
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        dc_id: int,
+        priority: Priority = Priority.PLAYBACK,
+        flow: str = "",
+        weight: float = 1.0,
+        ticket: Optional[SlotTicket] = None,
+    ):
+        queue = self._queue(dc_id)
+        await queue.acquire(priority, flow, weight, ticket)
+        try:
+            yield
+        finally:
+            queue.release()
+
+    def pause(self, dc_id: int, seconds: float) -> None:
+        self._queue(dc_id).pause(seconds)
+
+    def stats(self) -> Dict[int, dict]:
+        return {dc_id: queue.stats() for dc_id, queue in self._queues.items()}
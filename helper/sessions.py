@@ -0,0 +1,386 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+from pyrogram import raw
+from pyrogram.errors import FloodWait, RPCError
+from pyrogram.session import Session
+
+logger = logging.getLogger(__name__)
+
+# Smoothing factor for the per-session latency moving average.
+_LATENCY_ALPHA = 0.2
+
+# Consecutive failures after which a session is reported unhealthy.
+_UNHEALTHY_AFTER = 3
+
+# Recent call outcomes kept per session, how many are needed before the
+# error rate counts, and the rate that opens the circuit.
+_WINDOW          = 20
+_MIN_WINDOW      = 10
+_TRIP_ERROR_RATE = 0.5
+
+# A session is only ever called slow above this average latency (seconds).
+_SLOW_FLOOR = 1.0
+
+
+def dc_lock(client, dc_id: int) -> asyncio.Lock:
+    """
+    Lock guarding the creation of ``client.media_sessions[dc_id]``.
+
+    Authorizing a session to a slow DC can take seconds; one lock per DC
+    keeps that from holding up sessions to every other DC of the client.
+    """
+    locks = getattr(client, "media_session_locks", None)
+    if locks is None:
+        locks = client.media_session_locks = {}
+    lock = locks.get(dc_id)
+    if lock is None:
+        lock = locks[dc_id] = asyncio.Lock()
+    return lock
+
+
+class PooledSession:
+    """
+    A media ``Session`` plus the load and health counters the pool routes on.
+
+    Only transport failures (timeouts, dropped connections) count against a
+    session: an RPC error means Telegram answered, so the connection is fine.
+    Too many of them in a row, or too high a rate among recent calls, opens
+    the session's circuit — the pool stops routing to it and rebuilds it.
+    """
+
+    def __init__(self, session: Session, index: int):
+        self.session   = session
+        self.index     = index
+        self.created   = time.monotonic()
+        self.last_used = self.created
+        self.on_trip: Optional[Callable[["PooledSession"], None]] = None
+
+        self.in_flight          = 0
+        self.requests           = 0
+        self.errors             = 0
+        self.consecutive_errors = 0
+        self.flood_waits        = 0
+        self.latency            = 0.0
+        self.last_error: Optional[str] = None
+
+        self.outcomes: Deque[bool] = deque(maxlen=_WINDOW)
+        self.circuit_open = False
+        self.trip_reason: Optional[str] = None
+
+    @property
+    def healthy(self) -> bool:
+        return not self.circuit_open and self.consecutive_errors < _UNHEALTHY_AFTER
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def _observe(self, elapsed: float) -> None:
+        self.latency = (
+            elapsed if not self.latency
+            else self.latency + _LATENCY_ALPHA * (elapsed - self.latency)
+        )
+
+    def trip(self, reason: str) -> None:
+        """Open the circuit and let the pool know."""
+        if self.circuit_open:
+            return
+        self.circuit_open = True
+        self.trip_reason  = reason
+        if self.on_trip:
+            self.on_trip(self)
+
+    async def invoke(self, query, *args, **kwargs):
+        self.in_flight += 1
+        self.requests  += 1
+        started = time.monotonic()
+        try:
+            result = await self.session.invoke(query, *args, **kwargs)
+        except RPCError as exc:
+            self.errors     += 1
+            self.last_error  = f"{type(exc).__name__}: {exc}"
+            if isinstance(exc, FloodWait):
+                self.flood_waits += 1
+            self.consecutive_errors = 0
+            self.outcomes.append(True)
+            raise
+        except asyncio.CancelledError:
+            # A hedge loser or an abandoned part ran at least this long; that
+            # only says something when it is already slower than usual.
+            elapsed = time.monotonic() - started
+            if elapsed > self.latency:
+                self._observe(elapsed)
+            raise
+        except Exception as exc:
+            self.errors             += 1
+            self.consecutive_errors += 1
+            self.last_error          = f"{type(exc).__name__}: {exc}"
+            self.outcomes.append(False)
+            if self.consecutive_errors >= _UNHEALTHY_AFTER:
+                self.trip(f"{self.consecutive_errors} consecutive errors")
+            elif len(self.outcomes) >= _MIN_WINDOW and self.error_rate >= _TRIP_ERROR_RATE:
+                self.trip(f"error rate {self.error_rate:.0%}")
+            raise
+        else:
+            self._observe(time.monotonic() - started)
+            self.consecutive_errors = 0
+            self.outcomes.append(True)
+            return result
+        finally:
+            self.in_flight -= 1
+            self.last_used  = time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "index":       self.index,
+            "healthy":     self.healthy,
+            "circuit":     "open" if self.circuit_open else "closed",
+            "trip_reason": self.trip_reason,
+            "in_flight":   self.in_flight,
+            "requests":    self.requests,
+            "errors":      self.errors,
+            "error_rate":  round(self.error_rate, 3),
+            "flood_waits": self.flood_waits,
+            "latency_ms":  round(self.latency * 1000, 1),
+            "age":         int(time.monotonic() - self.created),
+            "idle":        int(time.monotonic() - self.last_used),
+            "last_error":  self.last_error,
+        }
+
+
+class MediaSessionPool:
+    """
+    Up to ``size`` media sessions to one DC, each on its own MTProto connection.
+
+    The pool exposes ``invoke`` and ``stop`` like a pyrogram ``Session`` so it
+    can be stored in ``client.media_sessions`` and is stopped by pyrogram on
+    shutdown.  Every call is routed to the least-loaded healthy session.  The
+    first session is created up front; the rest are opened in the background
+    so the first viewer of a DC never waits for the whole pool.
+
+    A session whose circuit opens is skipped by ``pick`` while a replacement
+    is built in the background; the supervisor retries rebuilds that fail.
+    """
+
+    def __init__(
+        self,
+        dc_id: int,
+        factory: Callable[[], Awaitable[Session]],
+        size: int,
+    ):
+        self.dc_id    = dc_id
+        self.size     = max(1, size)
+        self._factory = factory
+        self.sessions: List[PooledSession] = []
+        self._grow_task: Optional[asyncio.Task] = None
+        self._lock      = asyncio.Lock()
+        self._rebuilds: Dict[int, asyncio.Task] = {}
+        self.closed     = False
+        self.rebuilt    = 0
+        self.trips      = 0
+
+    @classmethod
+    async def create(
+        cls,
+        dc_id: int,
+        factory: Callable[[], Awaitable[Session]],
+        size: int,
+        first: Optional[Session] = None,
+    ) -> "MediaSessionPool":
+        pool = cls(dc_id, factory, size)
+        pool._add(first or await factory())
+        if pool.size > 1:
+            pool._grow_task = asyncio.create_task(pool._grow())
+        return pool
+
+    def adopt(self, session: Session) -> None:
+        """Take over a session opened outside the pool, e.g. by pyrogram itself."""
+        self._add(session)
+
+    def _wrap(self, session: Session, index: int) -> PooledSession:
+        pooled = PooledSession(session, index)
+        pooled.on_trip = self._on_trip
+        return pooled
+
+    def _add(self, session: Session) -> PooledSession:
+        pooled = self._wrap(session, len(self.sessions))
+        self.sessions.append(pooled)
+        return pooled
+
+    async def _grow(self) -> None:
+        while len(self.sessions) < self.size:
+            try:
+                self._add(await self._factory())
+                logger.debug(
+                    "Media session pool DC %s: %d/%d sessions",
+                    self.dc_id, len(self.sessions), self.size,
+                )
+            except Exception as exc:
+                logger.warning("Could not grow media session pool for DC %s: %s", self.dc_id, exc)
+                return
+
+    async def wait_ready(self) -> None:
+        """Wait until the background fill of the pool has finished."""
+        if self._grow_task:
+            await asyncio.gather(self._grow_task, return_exceptions=True)
+
+    async def refresh(self, timeout: float = 10) -> None:
+        """
+        Ping every session, rebuild the ones that fail and top the pool back up
+        to its target size, so an idle DC is never found cold or dead.
+        """
+        async def _ping(pooled: PooledSession) -> None:
+            try:
+                await asyncio.wait_for(
+                    pooled.invoke(raw.functions.Ping(ping_id=random.getrandbits(63))),
+                    timeout,
+                )
+            except Exception as exc:
+                pooled.consecutive_errors = max(pooled.consecutive_errors, 1)
+                logger.debug("Ping failed on media session %d DC %s: %s", pooled.index, self.dc_id, exc)
+
+        await asyncio.gather(*(_ping(p) for p in list(self.sessions)))
+        await self.recover()
+        if len(self.sessions) < self.size and (not self._grow_task or self._grow_task.done()):
+            self._grow_task = asyncio.create_task(self._grow())
+
+    def pick(self, exclude: Optional[PooledSession] = None) -> PooledSession:
+        """
+        Return the least-loaded session, preferring healthy ones.  Sessions
+        with an open circuit are only used when nothing else is left.
+        """
+        if not self.sessions:
+            raise OSError(f"media session pool for DC {self.dc_id} is closed")
+        candidates = [s for s in self.sessions if s is not exclude] or self.sessions
+        closed     = [s for s in candidates if not s.circuit_open]
+        return min(
+            closed or candidates,
+            key=lambda s: (not s.healthy, s.in_flight, s.requests),
+        )
+
+    async def invoke(self, query, *args, **kwargs):
+        return await self.pick().invoke(query, *args, **kwargs)
+
+    async def replace(self, pooled: PooledSession) -> PooledSession:
+        """Swap ``pooled`` for a freshly authorized session and stop the old one."""
+        fresh = self._wrap(await self._factory(), pooled.index)
+        try:
+            self.sessions[self.sessions.index(pooled)] = fresh
+        except ValueError:
+            self.sessions.append(fresh)
+        self.rebuilt += 1
+        asyncio.create_task(_stop_quietly(pooled.session))
+        logger.info("Rebuilt media session %d for DC %s", pooled.index, self.dc_id)
+        return fresh
+
+    async def recover(self) -> int:
+        """Rebuild every session currently failing; returns how many were replaced."""
+        async with self._lock:
+            failing = [s for s in self.sessions if s.consecutive_errors or s.circuit_open]
+            for pooled in failing:
+                await self.replace(pooled)
+            return len(failing)
+
+    # ── Circuit breaking ──────────────────────────────────────────────────────
+
+    def _on_trip(self, pooled: PooledSession) -> None:
+        self.trips += 1
+        logger.warning(
+            "Media session %d DC %s circuit open (%s) — rebuilding",
+            pooled.index, self.dc_id, pooled.trip_reason,
+        )
+        self._schedule_rebuild(pooled)
+
+    def _schedule_rebuild(self, pooled: PooledSession) -> bool:
+        if self.closed or pooled.index in self._rebuilds:
+            return False
+        task = asyncio.create_task(self._rebuild(pooled))
+        self._rebuilds[pooled.index] = task
+        task.add_done_callback(lambda _: self._rebuilds.pop(pooled.index, None))
+        return True
+
+    async def _rebuild(self, pooled: PooledSession) -> None:
+        async with self._lock:
+            if pooled not in self.sessions:
+                return
+            try:
+                await self.replace(pooled)
+            except Exception as exc:
+                logger.warning(
+                    "Rebuilding media session %d for DC %s failed: %s",
+                    pooled.index, self.dc_id, exc,
+                )
+
+    def trip_slow(self, factor: float) -> int:
+        """
+        Open the circuit of every session averaging more than ``factor`` times
+        the median latency of its peers; returns how many were tripped.
+        """
+        if factor <= 0:
+            return 0
+        measured = [
+            s for s in self.sessions
+            if not s.circuit_open and s.requests >= _MIN_WINDOW and s.latency
+        ]
+        tripped = 0
+        for pooled in measured:
+            peers = sorted(s.latency for s in measured if s is not pooled)
+            if not peers:
+                break
+            median = peers[len(peers) // 2]
+            if pooled.latency > max(_SLOW_FLOOR, factor * median):
+                pooled.trip(f"latency {pooled.latency * 1000:.0f} ms vs {median * 1000:.0f} ms")
+                tripped += 1
+        return tripped
+
+    def rebuild_open(self) -> int:
+        """Start a rebuild for every open circuit that has none running; returns how many."""
+        return sum(
+            self._schedule_rebuild(pooled)
+            for pooled in list(self.sessions)
+            if pooled.circuit_open
+        )
+
+    def idle_for(self) -> float:
+        """Seconds since any session was last used; 0 while a call is running."""
+        if not self.sessions or any(s.in_flight for s in self.sessions):
+            return 0.0
+        return time.monotonic() - max(s.last_used for s in self.sessions)
+
+    async def stop(self) -> None:
+        self.closed = True
+        if self._grow_task:
+            self._grow_task.cancel()
+        for task in list(self._rebuilds.values()):
+            task.cancel()
+        for pooled in self.sessions:
+            try:
+                await pooled.session.stop()
+            except Exception as exc:
+                logger.debug("Error stopping media session DC %s: %s", self.dc_id, exc)
+        self.sessions.clear()
+
+    def stats(self) -> dict:
+        return {
+            "dc_id":    self.dc_id,
+            "size":     len(self.sessions),
+            "target":   self.size,
+            "rebuilt":  self.rebuilt,
+            "trips":    self.trips,
+            "open":     sum(1 for s in self.sessions if s.circuit_open),
+            "sessions": [s.stats() for s in self.sessions],
+        }
+
+
+async def _stop_quietly(session: Session) -> None:
+    try:
+        await session.stop()
+    except Exception as exc:
+        logger.debug("Error stopping retired media session: %s", exc)
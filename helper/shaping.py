@@ -0,0 +1,188 @@
+import time
+from typing import Dict, Iterator, Union
+
+from config import Config
+
+# Runtime settings (Config.get, editable from /bot_settings).  Rates are in
+# bytes per second and connection caps in concurrent responses; 0 = unlimited.
+RATE_KEYS = {
+    "global": "rate_global",
+    "ip":     "rate_per_ip",
+    "file":   "rate_per_file",
+    "conn":   "rate_per_conn",
+}
+CONN_KEYS = {
+    "ip":   "max_conns_per_ip",
+    "file": "max_conns_per_file",
+}
+
+# Largest single write while a rate applies, so a 1 MB part doesn't turn into
+# one long stall followed by a burst.
+SLICE_SIZE = 64 * 1024
+
+
+class TokenBucket:
+    """
+    Token bucket that lets a writer go into debt.
+
+    ``reserve`` always takes the tokens and returns how long the caller must
+    sleep before the debt is paid off.  One second of ``rate`` may be banked
+    as burst.
+    """
+
+    def __init__(self, rate: int = 0):
+        self.rate    = rate
+        self.tokens  = float(rate)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens  = min(float(self.rate), self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, nbytes: int, rate: int) -> float:
+        now = time.monotonic()
+        if rate != self.rate:
+            self._refill(now)
+            # A bucket that was unlimited until now starts with a full burst.
+            self.tokens = float(rate) if self.rate <= 0 else min(self.tokens, float(rate))
+            self.rate   = rate
+        if rate <= 0:
+            self.updated = now
+            return 0.0
+        self._refill(now)
+        self.tokens -= nbytes
+        return -self.tokens / rate if self.tokens < 0 else 0.0
+
+    def idle(self) -> bool:
+        """True once the bucket is full again and holds no state worth keeping."""
+        self._refill(time.monotonic())
+        return self.rate <= 0 or self.tokens >= self.rate
+
+
+class ConnectionLimitExceeded(Exception):
+    def __init__(self, scope: str, limit: int):
+        super().__init__(f"too many connections per {scope} (limit {limit})")
+        self.scope = scope
+        self.limit = limit
+
+
+class StreamLease:
+    """One response's share of the shaper: its own bucket plus the shared ones."""
+
+    def __init__(self, shaper: "TrafficShaper", client_ip: str, file_hash: str):
+        self.shaper    = shaper
+        self.client_ip = client_ip
+        self.file_hash = file_hash
+        self.bucket    = TokenBucket()
+        self.throttled = 0.0  # seconds spent waiting on any bucket
+
+    def __enter__(self) -> "StreamLease":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.shaper._release(self)
+
+    @property
+    def limited(self) -> bool:
+        return any(Config.get(key, 0) for key in RATE_KEYS.values())
+
+    def slices(self, chunk: Union[bytes, memoryview]) -> Iterator[Union[bytes, memoryview]]:
+        """Split ``chunk`` into shaping-sized writes when a rate applies."""
+        if not self.limited or len(chunk) <= SLICE_SIZE:
+            yield chunk
+            return
+        view = memoryview(chunk)
+        for start in range(0, len(view), SLICE_SIZE):
+            yield view[start:start + SLICE_SIZE]
+
+    def reserve(self, nbytes: int) -> float:
+        """Charge ``nbytes`` to every level and return the longest wait."""
+        shaper = self.shaper
+        delay  = max(
+            shaper.global_bucket.reserve(nbytes, Config.get(RATE_KEYS["global"], 0)),
+            shaper.ip_buckets[self.client_ip].reserve(nbytes, Config.get(RATE_KEYS["ip"], 0)),
+            shaper.file_buckets[self.file_hash].reserve(nbytes, Config.get(RATE_KEYS["file"], 0)),
+            self.bucket.reserve(nbytes, Config.get(RATE_KEYS["conn"], 0)),
+        )
+        self.throttled += delay
+        return delay
+
+
+class TrafficShaper:
+    """
+    Hierarchical egress control for stream responses.
+
+    Every byte written is charged to a global bucket, the client IP's bucket,
+    the file's bucket and the connection's own bucket, and the writer sleeps
+    for the slowest of them.  Concurrent responses are also capped per IP and
+    per file, so one download manager opening many connections can neither
+    hog the uplink nor crowd out other viewers.
+    """
+
+    def __init__(self):
+        self.global_bucket = TokenBucket()
+        self.ip_buckets:   Dict[str, TokenBucket] = {}
+        self.file_buckets: Dict[str, TokenBucket] = {}
+        self.ip_conns:     Dict[str, int] = {}
+        self.file_conns:   Dict[str, int] = {}
+
+        self.rejected = 0
+
+    def open(self, client_ip: str, file_hash: str) -> StreamLease:
+        """Admit a new response or raise ``ConnectionLimitExceeded``."""
+        for scope, key, counts, name in (
+            ("ip",   CONN_KEYS["ip"],   self.ip_conns,   client_ip),
+            ("file", CONN_KEYS["file"], self.file_conns, file_hash),
+        ):
+            limit = Config.get(key, 0)
+            if limit and counts.get(name, 0) >= limit:
+                self.rejected += 1
+                raise ConnectionLimitExceeded(scope, limit)
+
+        self._prune()
+        self.ip_conns[client_ip]   = self.ip_conns.get(client_ip, 0) + 1
+        self.file_conns[file_hash] = self.file_conns.get(file_hash, 0) + 1
+        self.ip_buckets.setdefault(client_ip, TokenBucket())
+        self.file_buckets.setdefault(file_hash, TokenBucket())
+        return StreamLease(self, client_ip, file_hash)
+
+    def _release(self, lease: StreamLease) -> None:
+        for counts, name in (
+            (self.ip_conns,   lease.client_ip),
+            (self.file_conns, lease.file_hash),
+        ):
+            left = counts.get(name, 0) - 1
+            if left > 0:
+                counts[name] = left
+            else:
+                counts.pop(name, None)
+
+    def _prune(self) -> None:
+        """Drop shared buckets that have no connections and no debt left."""
+        for buckets, counts in (
+            (self.ip_buckets,   self.ip_conns),
+            (self.file_buckets, self.file_conns),
+        ):
+            for name in [n for n, b in buckets.items() if n not in counts and b.idle()]:
+                del buckets[name]
+
+    def limits(self) -> Dict[str, int]:
+        keys = list(RATE_KEYS.values()) + list(CONN_KEYS.values())
+        return {key: Config.get(key, 0) for key in keys}
+
+    def stats(self) -> dict:
+        return {
+            "limits":       self.limits(),
+            "connections":  sum(self.ip_conns.values()),
+            "clients":      len(self.ip_conns),
+            "files":        len(self.file_conns),
+            "rejected":     self.rejected,
+            "top_clients":  _top(self.ip_conns),
+        }
+
+
+def _top(counts: Dict[str, int], n: int = 5) -> Dict[str, int]:
+    return dict(sorted(counts.items(), key=lambda kv: kv[1], reverse=True)[:n])
+
+
+traffic_shaper = TrafficShaper()
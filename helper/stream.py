@@ -3,24 +3,61 @@ import logging
 import mimetypes
 import math
 import time
-from typing import Dict, Set, Tuple, Union
+import uuid
+import zlib
+from contextlib import aclosing
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, List, Optional, Sequence, Set, Tuple, Union
 
 from aiohttp import web
 from pyrogram import Client, utils, raw
-from pyrogram.errors import AuthBytesInvalid, FloodWait
+from pyrogram.errors import (
+    AuthBytesInvalid,
+    FileReferenceExpired,
+    FileReferenceInvalid,
+    FloodWait,
+    RPCError,
+)
 from pyrogram.file_id import FileId, FileType, ThumbnailSource
 from pyrogram.session import Auth, Session
 
 from config import Config
 from database import Database
+from .buffers import stream_buffers
+from .cache import disk_cache, head_tail_cache, memory_cache, part_tickets, pinned_ranges
+from .cdn import CdnFetcher
+from .container import locate_fragments, locate_index
+from .hedging import Hedger
+from .hls import HlsIndex, hls_indexes
+from .materialize import file_materializer
+from .prefetch import PrefetchController
+from .readahead import read_ahead
+from .scheduler import GetFileScheduler, Priority, SlotTicket
+from .sessions import MediaSessionPool, dc_lock
+from .shaping import SLICE_SIZE, ConnectionLimitExceeded, StreamLease, traffic_shaper
+from .zipstream import ZipEntry, ZipLayout, unique_names
 
 logger = logging.getLogger(__name__)
 
 # Telegram hard-caps upload.GetFile at 1 MB per call.
 CHUNK_SIZE = 1024 * 1024  # 1 MB
 
-# Minimum prefetch buffer: keep this many chunks fetched ahead to guarantee
-# smooth playback without mid-stream stalls.
+# GetFile also accepts any power-of-two limit from 4 KB up to 1 MB at an
+# offset that is a multiple of it.  /stream responses open with a part of
+# FIRST_PART_SIZE and double from there, so the first byte waits for a small
+# part instead of a full megabyte.  0 disables the ramp.
+def _valid_part_size(size: int) -> int:
+    if size <= 0 or size >= CHUNK_SIZE:
+        return 0
+    return max(4096, 1 << (size.bit_length() - 1))
+
+
+FIRST_PART_SIZE = _valid_part_size(Config.FIRST_PART_SIZE)
+
+# Default fetch window: how many parts are requested ahead of the consumer.
+# Per-route ceilings come from Config.STREAM_FETCH_WINDOW / DL_FETCH_WINDOW;
+# the actual depth adapts per stream (see helper/prefetch.py).
 PREFETCH_COUNT = 3
 
 MIME_TYPE_MAP = {
@@ -30,6 +67,14 @@ MIME_TYPE_MAP = {
     "document": "application/octet-stream",
 }
 
+# ── Mid-stream recovery ───────────────────────────────────────────────────────
+# Counts of in-place recoveries performed by yield_file, reported in /api/health.
+recovery_stats: Dict[str, int] = {
+    "file_reference": 0,  # FileId re-resolved after FILE_REFERENCE_EXPIRED
+    "session":        0,  # media session rebuilt after connection errors
+    "exhausted":      0,  # streams that gave up after STREAM_RECOVERY_BUDGET
+}
+
 # ── Session dedup for live-viewer counting ────────────────────────────────────
 # Maps (file_hash, client_ip) → last-seen timestamp so that multiple
 # range-requests from the same player are counted as ONE session.
@@ -79,11 +124,20 @@ async def get_file_ids(client: Client, message_id: str) -> FileId:
     return FileId.decode(media.file_id)
 
 
+class FloodWaitExhausted(Exception):
+    """Every retry of a part hit a FloodWait; the sessions themselves are fine."""
+
+
 class ByteStreamer:
 
     def __init__(self, client: Client):
         self.client: Client = client
         self.cached_file_ids: Dict[str, FileId] = {}
+        self.active_streams: int = 0
+        self.total_streams: int = 0
+        self.cdn = CdnFetcher(client)
+        self.scheduler = GetFileScheduler(Config.GETFILE_CONCURRENCY_PER_DC)
+        self.hedger = Hedger(Config.HEDGE_PERCENTILE, Config.HEDGE_BUDGET, Config.HEDGE_MIN_DELAY)
         self.clean_timer: int = 30 * 60
         asyncio.create_task(self.clean_cache())
 
@@ -99,61 +153,108 @@ class ByteStreamer:
         self.cached_file_ids[db_id] = file_id
         return file_id
 
-    async def generate_media_session(self, client: Client, file_id: FileId) -> Session:
-        media_session = client.media_sessions.get(file_id.dc_id)
-
-        if media_session is None:
-            if file_id.dc_id != await client.storage.dc_id():
-                media_session = Session(
+    async def create_media_session(self, client: Client, dc_id: int) -> Session:
+        """Open and authorize one new media session to ``dc_id``."""
+        if dc_id != await client.storage.dc_id():
+            media_session = Session(
+                client,
+                dc_id,
+                await Auth(
                     client,
-                    file_id.dc_id,
-                    await Auth(
-                        client,
-                        file_id.dc_id,
-                        await client.storage.test_mode(),
-                    ).create(),
+                    dc_id,
                     await client.storage.test_mode(),
-                    is_media=True,
-                )
-                await media_session.start()
+                ).create(),
+                await client.storage.test_mode(),
+                is_media=True,
+            )
+            await media_session.start()
 
-                for _ in range(6):
-                    exported_auth = await client.invoke(
-                        raw.functions.auth.ExportAuthorization(dc_id=file_id.dc_id)
-                    )
-                    try:
-                        await media_session.invoke(
-                            raw.functions.auth.ImportAuthorization(
-                                id=exported_auth.id,
-                                bytes=exported_auth.bytes,
-                            )
+            for _ in range(6):
+                exported_auth = await client.invoke(
+                    raw.functions.auth.ExportAuthorization(dc_id=dc_id)
+                )
+                try:
+                    await media_session.invoke(
+                        raw.functions.auth.ImportAuthorization(
+                            id=exported_auth.id,
+                            bytes=exported_auth.bytes,
                         )
-                        break
-                    except AuthBytesInvalid:
-                        logger.debug("Invalid auth bytes for DC %s — retrying", file_id.dc_id)
-                        continue
-                else:
-                    await media_session.stop()
-                    raise AuthBytesInvalid
-
+                    )
+                    break
+                except AuthBytesInvalid:
+                    logger.debug("Invalid auth bytes for DC %s — retrying", dc_id)
+                    continue
             else:
-                media_session = Session(
-                    client,
-                    file_id.dc_id,
-                    await client.storage.auth_key(),
-                    await client.storage.test_mode(),
-                    is_media=True,
-                )
-                await media_session.start()
-
-            logger.debug("Created media session for DC %s", file_id.dc_id)
-            client.media_sessions[file_id.dc_id] = media_session
+                await media_session.stop()
+                raise AuthBytesInvalid
 
         else:
-            logger.debug("Reusing cached media session for DC %s", file_id.dc_id)
+            media_session = Session(
+                client,
+                dc_id,
+                await client.storage.auth_key(),
+                await client.storage.test_mode(),
+                is_media=True,
+            )
+            await media_session.start()
 
+        logger.debug("Created media session for DC %s", dc_id)
         return media_session
 
+    async def generate_media_session(self, client: Client, file_id: FileId) -> MediaSessionPool:
+        return await self.media_pool(client, file_id.dc_id)
+
+    async def media_pool(self, client: Client, dc_id: int) -> MediaSessionPool:
+        media_session = client.media_sessions.get(dc_id)
+
+        if isinstance(media_session, MediaSessionPool):
+            logger.debug("Reusing cached media session pool for DC %s", dc_id)
+            return media_session
+
+        async with dc_lock(client, dc_id):
+            media_session = client.media_sessions.get(dc_id)
+            if isinstance(media_session, MediaSessionPool):
+                return media_session
+
+            # A plain Session may already exist (e.g. created by pyrogram for
+            # inline results) — adopt it as the first member of the pool.
+            pool = await MediaSessionPool.create(
+                dc_id,
+                lambda: self.create_media_session(client, dc_id),
+                Config.MEDIA_SESSIONS_PER_DC,
+                first=media_session,
+            )
+            # pyrogram opens its own sessions under the client-wide lock; one
+            # it stored while ours was being authorized joins the pool.
+            async with client.media_sessions_lock:
+                current = client.media_sessions.get(dc_id)
+                if current is not None and current is not media_session:
+                    pool.adopt(current)
+                client.media_sessions[dc_id] = pool
+            logger.debug("Created media session pool for DC %s (target %d)", dc_id, pool.size)
+            return pool
+
+    def stats(self) -> dict:
+        me = getattr(self.client, "me", None)
+        return {
+            "name":            self.client.name,
+            "username":        me.username if me else None,
+            "active_streams":  self.active_streams,
+            "total_streams":   self.total_streams,
+            "cached_file_ids": len(self.cached_file_ids),
+            "media_sessions":  self.session_stats(),
+            "cdn":             self.cdn.stats(),
+            "scheduler":       self.scheduler.stats(),
+            "hedging":         self.hedger.stats(),
+        }
+
+    def session_stats(self) -> Dict[int, dict]:
+        return {
+            dc_id: pool.stats()
+            for dc_id, pool in self.client.media_sessions.items()
+            if isinstance(pool, MediaSessionPool)
+        }
+
     @staticmethod
     async def get_location(
         file_id: FileId,
@@ -203,118 +304,471 @@ class ByteStreamer:
 
         return location
 
-    async def yield_file(
+    async def _fetch_part(
         self,
         file_id: FileId,
+        media_session: MediaSessionPool,
+        location,
         offset: int,
-        first_part_cut: int,
-        last_part_cut: int,
-        part_count: int,
-        chunk_size: int,
-    ):
+        limit: int,
+        part_label: str,
+        priority: Priority = Priority.PLAYBACK,
+        flow: str = "",
+        ticket: Optional[SlotTicket] = None,
+    ) -> bytes:
         """
-        Continuously fetch and yield Telegram file chunks using a prefetch queue.
+        Fetch one part from Telegram, retrying FloodWaits and transient errors.
 
-        Instead of the old packet-by-packet approach (request → yield → request →
-        yield …), we use an asyncio.Queue to keep PREFETCH_COUNT chunks in flight
-        at all times.  This eliminates the gap between writing one chunk and
-        requesting the next, which was the root cause of mid-stream buffering.
+        Every call waits for a slot from ``self.scheduler`` on the DC it goes
+        to; a FloodWait pauses that DC for all callers.  With a ``ticket`` the
+        slot is requested at the ticket's priority, which may rise while the
+        call waits.  GetFile calls that run unusually long are hedged by
+        ``self.hedger``.
+        """
+        redirect = self.cdn.redirects.get(file_id.media_id)
+        if redirect is not None:
+            try:
+                async with self.scheduler.slot(redirect.dc_id, priority, flow, ticket=ticket):
+                    return await self.cdn.fetch(media_session, redirect, offset, limit)
+            except Exception as exc:
+                # File token expired, the file left the CDN or the CDN DC is
+                # unreachable — drop the redirect and ask the origin DC again.
+                logger.debug("CDN fetch failed for part %s (%s) — re-requesting", part_label, exc)
+                self.cdn.forget(file_id.media_id)
+
+        for attempt in range(5):
+            try:
+                async with self.scheduler.slot(file_id.dc_id, priority, flow, ticket=ticket):
+                    r = await self.hedger.invoke(
+                        media_session,
+                        raw.functions.upload.GetFile(
+                            location=location,
+                            offset=offset,
+                            limit=limit,
+                            cdn_supported=True,
+                        ),
+                        file_id.dc_id,
+                    )
+                break
+            except FloodWait as fw:
+                logger.warning("FloodWait %ds on part %s — pausing DC %s", fw.value, part_label, file_id.dc_id)
+                self.scheduler.pause(file_id.dc_id, fw.value + 1)
+            except (TimeoutError, AttributeError) as exc:
+                logger.debug("Transient error part %s: %s", part_label, exc)
+                if attempt == 4:
+                    raise
+                await asyncio.sleep(0.5 * (attempt + 1))
+        else:
+            err = FloodWaitExhausted(f"All retries failed at part {part_label}: FloodWait")
+            logger.error(str(err))
+            raise err
+
+        if isinstance(r, raw.types.upload.FileCdnRedirect):
+            logger.debug("FileCdnRedirect to DC %s for part %s", r.dc_id, part_label)
+            self.cdn.remember(file_id.media_id, r)
+            try:
+                async with self.scheduler.slot(r.dc_id, priority, flow, ticket=ticket):
+                    return await self.cdn.fetch(media_session, r, offset, limit)
+            except Exception:
+                # Don't let later parts retry a redirect that just failed.
+                self.cdn.forget(file_id.media_id)
+                raise
+
+        if not isinstance(r, raw.types.upload.File):
+            err = TypeError(f"Unexpected response type: {type(r)}")
+            logger.error(str(err))
+            raise err
+
+        return r.bytes
+
+    async def get_part(
+        self,
+        file_id: FileId,
+        media_session: MediaSessionPool,
+        location,
+        offset: int,
+        limit: int,
+        part_label: str = "?",
+        priority: Priority = Priority.PLAYBACK,
+        flow: str = "",
+        cache: bool = True,
+    ) -> bytes:
+        """
+        Return the bytes of one aligned part.
+
+        Lookups go memory → disk → Telegram.  Concurrent viewers asking for
+        the same part share a single in-flight fetch via ``memory_cache``; a
+        caller joining a fetch queued at a lower priority (a warm-up, say)
+        raises it to its own.  With ``cache=False`` cached parts are still
+        used, but a part fetched from Telegram is stored in neither cache.
+        """
+        part = offset // CHUNK_SIZE
+
+        if limit != CHUNK_SIZE or offset % CHUNK_SIZE:
+            # Ramp parts: a cached full part beats another round-trip, and a
+            # memoryview slice of it costs no copy.
+            cached = memory_cache.get((file_id.media_id, part))
+            if cached is not None:
+                start = offset - part * CHUNK_SIZE
+                return memoryview(cached)[start:start + limit]
+            return await self._fetch_part(
+                file_id, media_session, location, offset, limit, part_label, priority, flow,
+            )
+
+        key = (file_id.media_id, part)
+        if not cache:
+            # A whole-file copy reads every part once; caching them would
+            # only push other files' hot parts out of memory and disk.
+            cached = memory_cache.get(key)
+            if cached is None:
+                cached = await disk_cache.get(file_id.media_id, part)
+            if cached is not None:
+                return cached
+            return await self._fetch_part(
+                file_id, media_session, location, offset, limit, part_label, priority, flow,
+            )
+
+        ticket = part_tickets.get(key)
+        if ticket is not None:
+            ticket.raise_to(priority)
+        elif not memory_cache.has(key):
+            ticket = part_tickets[key] = SlotTicket(priority)
+
+        async def _load() -> bytes:
+            try:
+                cached = await disk_cache.get(file_id.media_id, part)
+                if cached is not None:
+                    return cached
+                chunk = await self._fetch_part(
+                    file_id, media_session, location, offset, limit, part_label, priority, flow, ticket,
+                )
+                if chunk:
+                    asyncio.create_task(disk_cache.put(file_id.media_id, part, chunk))
+                return chunk
+            finally:
+                if part_tickets.get(key) is ticket:
+                    del part_tickets[key]
+
+        return await memory_cache.get_or_fetch(key, _load)
+
+    async def _yield_parts(
+        self,
+        file_id: FileId,
+        parts: Sequence[Tuple[int, int]],
+        window: int = PREFETCH_COUNT,
+        prefetch: Optional[PrefetchController] = None,
+        message_id: Optional[str] = None,
+        priority: Priority = Priority.PLAYBACK,
+        flow: str = "",
+        readahead_key: Optional[str] = None,
+        cache: bool = True,
+    ):
+        """
+        Fetch ``(offset, limit)`` parts with a sliding window and yield their
+        bytes in order.
+
+        Up to ``window`` parts are requested ahead of the consumer at once, so
+        a single stream is no longer capped at one part per DC round-trip.
+        When a ``prefetch`` controller is given its adaptive depth replaces
+        the fixed window and every fetch latency is reported back to it.
+        Parts may complete out of order; each is awaited and yielded strictly
+        in order.  Closing the generator cancels whatever is still in flight.
+
+        A failed part is recovered in place instead of truncating the
+        response: an expired file reference is re-resolved from
+        ``message_id`` and failing media sessions are rebuilt, then fetching
+        resumes at the same part.  At most STREAM_RECOVERY_BUDGET recoveries
+        are attempted per call.
+
+        Parts are fetched at ``priority`` on behalf of ``flow`` (the client),
+        except that the first part of a playback response — the one a player
+        waits on after every seek — is promoted to ``Priority.HEAD``.
+
+        With a ``readahead_key`` (the viewer's session key) parts still in
+        flight when the consumer stops are parked in ``read_ahead`` rather
+        than cancelled, and a later call for the same viewer that starts
+        inside or right after that window picks them up again.
+
+        ``cache`` is passed on to ``get_part``.
         """
         client        = self.client
         media_session = await self.generate_media_session(client, file_id)
         location      = await self.get_location(file_id)
+        window        = max(1, window)
+        part_count    = len(parts)
+
+        pending: Dict[int, asyncio.Task] = {}
+        next_part     = 0
+        parts_yielded = 0
+        recoveries    = 0
+        current: Optional[asyncio.Task] = None
+
+        adopted: Dict[Tuple[int, int], asyncio.Task] = {}
+        if readahead_key and parts:
+            ctx = read_ahead.adopt(readahead_key, parts[0][0], CHUNK_SIZE)
+            if ctx is not None:
+                adopted = ctx.tasks
+                if prefetch:
+                    prefetch.seed(ctx.drain_rate, ctx.fetch_latency)
+
+        self.active_streams += 1
+        self.total_streams  += 1
+
+        async def _fetch(part_idx: int) -> bytes:
+            started = time.monotonic()
+            part_offset, limit = parts[part_idx]
+            part_priority = priority
+            if part_idx == 0 and priority == Priority.PLAYBACK:
+                part_priority = Priority.HEAD
+            chunk = await self.get_part(
+                file_id,
+                media_session,
+                location,
+                part_offset,
+                limit,
+                f"{part_idx + 1}/{part_count}",
+                part_priority,
+                flow,
+                cache,
+            )
+            if prefetch:
+                prefetch.record_fetch(time.monotonic() - started)
+            return chunk
+
+        async def _cancel_pending() -> None:
+            tasks = list(pending.values()) + list(adopted.values())
+            for task in tasks:
+                task.cancel()
+                stream_buffers.release(task)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            pending.clear()
+            adopted.clear()
+
+        async def _recover(exc: Exception) -> bool:
+            nonlocal file_id, location, media_session
+            if isinstance(exc, FloodWaitExhausted):
+                # Rebuilding sessions during a flood limit only makes it worse.
+                return False
+            if isinstance(exc, (FileReferenceExpired, FileReferenceInvalid)):
+                if message_id is None:
+                    return False
+                file_id  = await self.generate_file_properties(message_id)
+                location = await self.get_location(file_id)
+                recovery_stats["file_reference"] += 1
+            elif isinstance(exc, (OSError, TimeoutError, AttributeError)):
+                if media_session.closed:
+                    # The idle pool was reaped while this viewer was paused.
+                    media_session = await self.generate_media_session(client, file_id)
+                else:
+                    await media_session.recover()
+                recovery_stats["session"] += 1
+            else:
+                return False
+            return True
 
-        # Queue of (part_index, chunk_bytes | Exception)
-        queue: asyncio.Queue = asyncio.Queue(maxsize=PREFETCH_COUNT + 2)
-
-        async def _fetch_worker():
-            """Fetch all parts and push them into the queue."""
-            current_offset = offset
+        try:
             for part_idx in range(part_count):
-                for attempt in range(5):
+                while True:
+                    depth = prefetch.depth if prefetch else window
+                    while next_part < part_count and next_part < part_idx + depth:
+                        task = adopted.pop(parts[next_part], None)
+                        if task is None:
+                            limit = parts[next_part][1]
+                            if next_part == part_idx:
+                                await stream_buffers.reserve(limit)
+                            elif not stream_buffers.try_reserve(limit):
+                                break  # buffer budget spent: no read-ahead for now
+                            task = asyncio.create_task(_fetch(next_part))
+                            stream_buffers.bind(task, limit)
+                        pending[next_part] = task
+                        next_part += 1
+
                     try:
-                        r = await media_session.invoke(
-                            raw.functions.upload.GetFile(
-                                location=location,
-                                offset=current_offset,
-                                limit=chunk_size,
-                            )
-                        )
+                        # Shielded so a consumer cancelled mid-wait leaves the
+                        # part in ``pending`` for the read-ahead to park.
+                        current = pending[part_idx]
+                        chunk   = await asyncio.shield(current)
+                        del pending[part_idx]
+                        break
+                    except Exception as exc:
+                        stream_buffers.release(pending.pop(part_idx, None))
+                        failure = exc
+
+                    # Parts queued behind the failed one used the same file
+                    # reference / sessions — drop them and resume from here.
+                    await _cancel_pending()
+                    next_part = part_idx
+
+                    if recoveries >= Config.STREAM_RECOVERY_BUDGET:
+                        recovery_stats["exhausted"] += 1
+                        chunk = None
+                        break
+                    try:
+                        recovered = await _recover(failure)
+                    except Exception as exc:
+                        logger.warning("yield_file: recovery failed: %s", exc)
+                        recovered = False
+                    if not recovered:
+                        chunk = None
                         break
-                    except FloodWait as fw:
-                        logger.warning(
-                            "FloodWait %ds on part %d/%d — sleeping",
-                            fw.value, part_idx + 1, part_count,
-                        )
-                        await asyncio.sleep(fw.value + 1)
-                    except (TimeoutError, AttributeError) as exc:
-                        logger.debug("Transient error part %d: %s", part_idx + 1, exc)
-                        if attempt == 4:
-                            await queue.put(exc)
-                            return
-                        await asyncio.sleep(0.5 * (attempt + 1))
-                else:
-                    err = IOError(f"All retries failed at part {part_idx + 1}")
-                    logger.error(str(err))
-                    await queue.put(err)
-                    return
 
-                if isinstance(r, raw.types.upload.FileCdnRedirect):
+                    recoveries += 1
                     logger.warning(
-                        "FileCdnRedirect received for part %d — stopping", part_idx + 1
+                        "yield_file: recovered from %s at part %d/%d (%d/%d)",
+                        type(failure).__name__, part_idx + 1, part_count,
+                        recoveries, Config.STREAM_RECOVERY_BUDGET,
                     )
-                    await queue.put(EOFError("CDN redirect"))
-                    return
+                    await asyncio.sleep(0.5 * recoveries)
 
-                if not isinstance(r, raw.types.upload.File):
-                    err = TypeError(f"Unexpected response type: {type(r)}")
-                    logger.error(str(err))
-                    await queue.put(err)
-                    return
+                if chunk is None:
+                    logger.error("yield_file: fetch error: %s", failure)
+                    break
 
-                chunk = r.bytes
                 if not chunk:
-                    await queue.put(None)  # Signal EOF
-                    return
-
-                # Slice the chunk for boundary alignment
-                if part_count == 1:
-                    sliced = chunk[first_part_cut:last_part_cut]
-                elif part_idx == 0:
-                    sliced = chunk[first_part_cut:]
-                elif part_idx == part_count - 1:
-                    sliced = chunk[:last_part_cut]
-                else:
-                    sliced = chunk
+                    break  # EOF
 
-                await queue.put(sliced)
-                current_offset += chunk_size
+                yield chunk
+                parts_yielded += 1
+                stream_buffers.release(current)
+                current = None
+        finally:
+            self.active_streams -= 1
+            stream_buffers.release(current)
+            if readahead_key:
+                adopted.update((parts[idx], task) for idx, task in pending.items())
+                read_ahead.park(readahead_key, adopted, prefetch)
+                pending.clear()
+                adopted = {}
+            await _cancel_pending()
+            logger.debug("yield_file finished after %d part(s)", parts_yielded)
 
-            await queue.put(None)  # Normal EOF sentinel
+    async def yield_file(
+        self,
+        file_id: FileId,
+        offset: int,
+        first_part_cut: int,
+        last_part_cut: int,
+        part_count: int,
+        chunk_size: int,
+        window: int = PREFETCH_COUNT,
+        prefetch: Optional[PrefetchController] = None,
+        message_id: Optional[str] = None,
+        priority: Priority = Priority.PLAYBACK,
+        flow: str = "",
+        readahead_key: Optional[str] = None,
+        first_part_size: int = 0,
+        cache: bool = True,
+    ):
+        """
+        Yield ``part_count`` consecutive parts starting at ``offset``, trimmed
+        to the requested byte range.
 
-        # Start the background fetch worker
-        fetch_task = asyncio.create_task(_fetch_worker())
+        With ``first_part_size`` the range is instead covered by parts that
+        start that small and double up to ``chunk_size`` (see
+        ``_ramp_parts``), unless the first full part is cached already.
 
-        try:
-            parts_yielded = 0
-            while True:
-                item = await queue.get()
-                if item is None:
-                    break  # EOF
-                if isinstance(item, BaseException):
-                    logger.error("yield_file: fetch error: %s", item)
-                    break
-                yield item
-                parts_yielded += 1
-        except Exception as exc:
-            logger.error("yield_file: consumer error: %s", exc)
-        finally:
-            fetch_task.cancel()
-            try:
-                await fetch_task
-            except (asyncio.CancelledError, Exception):
-                pass
-            logger.debug("yield_file finished after %d part(s)", parts_yielded if 'parts_yielded' in dir() else 0)
+        Trimmed first/last parts are yielded as ``memoryview`` slices of the
+        fetched buffer, never as copies.  See ``_yield_parts`` for windowing,
+        recovery and ``cache``.
+        """
+        from_bytes  = offset + first_part_cut
+        until_bytes = offset + (part_count - 1) * chunk_size + last_part_cut - 1
+
+        if first_part_size and not self._part_cached(file_id, offset // chunk_size):
+            parts = _ramp_parts(from_bytes, until_bytes, first_part_size)
+        else:
+            parts = [(offset + i * chunk_size, chunk_size) for i in range(part_count)]
+
+        async with aclosing(self._yield_parts(
+            file_id, parts, window, prefetch, message_id, priority, flow, readahead_key, cache,
+        )) as chunks:
+            part_idx = 0
+            async for chunk in chunks:
+                # Slice the chunk for boundary alignment.  memoryview slices
+                # share the part's buffer, so trimming never copies bytes.
+                part_start = parts[part_idx][0]
+                lo = max(from_bytes - part_start, 0)
+                hi = min(until_bytes - part_start + 1, len(chunk))
+                if lo == 0 and hi == len(chunk):
+                    yield chunk
+                else:
+                    yield memoryview(chunk)[lo:hi]
+                part_idx += 1
+
+    @staticmethod
+    def _part_cached(file_id: FileId, part: int) -> bool:
+        """True if full part ``part`` is in (or on its way into) a part cache."""
+        key = (file_id.media_id, part)
+        return memory_cache.has(key) or disk_cache.has(*key)
+
+    async def yield_ranges(
+        self,
+        file_id: FileId,
+        ranges: Sequence[Tuple[int, int]],
+        window: int = PREFETCH_COUNT,
+        prefetch: Optional[PrefetchController] = None,
+        message_id: Optional[str] = None,
+        priority: Priority = Priority.PLAYBACK,
+        flow: str = "",
+    ):
+        """
+        Yield ``(range_index, piece)`` for sorted, non-overlapping inclusive
+        byte ranges.  A Telegram part shared by several ranges is fetched once
+        and sliced for each of them.
+        """
+        parts: List[Tuple[int, int]] = []
+        for start, end in ranges:
+            for part_offset in range(start - start % CHUNK_SIZE, end + 1, CHUNK_SIZE):
+                if not parts or parts[-1][0] != part_offset:
+                    parts.append((part_offset, CHUNK_SIZE))
+
+        range_idx = 0
+        async with aclosing(
+            self._yield_parts(file_id, parts, window, prefetch, message_id, priority, flow)
+        ) as chunks:
+            part_idx = 0
+            async for chunk in chunks:
+                part_start = parts[part_idx][0]
+                part_end   = part_start + len(chunk) - 1
+                view       = memoryview(chunk)
+                while range_idx < len(ranges):
+                    start, end = ranges[range_idx]
+                    if start > part_end:
+                        break
+                    lo = max(start, part_start) - part_start
+                    hi = min(end, part_end) - part_start + 1
+                    if hi > lo:
+                        yield range_idx, view[lo:hi]
+                    if end > part_end:
+                        break
+                    range_idx += 1
+                part_idx += 1
+
+    async def read_range(
+        self,
+        file_id: FileId,
+        from_bytes: int,
+        until_bytes: int,
+        message_id: Optional[str] = None,
+        priority: Priority = Priority.HEAD,
+        flow: str = "",
+    ) -> bytes:
+        """Fetch an inclusive byte range into memory; meant for small ranges."""
+        offset, first_part_cut, last_part_cut, part_count = _part_span(from_bytes, until_bytes)
+        async with aclosing(self.yield_file(
+            file_id,
+            offset,
+            first_part_cut,
+            last_part_cut,
+            part_count,
+            CHUNK_SIZE,
+            message_id=message_id,
+            priority=priority,
+            flow=flow,
+            first_part_size=FIRST_PART_SIZE if priority == Priority.HEAD else 0,
+        )) as chunks:
+            return b"".join([bytes(chunk) async for chunk in chunks])
 
     async def clean_cache(self) -> None:
         while True:
@@ -324,23 +778,193 @@ class ByteStreamer:
             logger.debug("ByteStreamer cache cleared")
 
 
-def _parse_range(range_header: str, file_size: int):
-    if range_header:
-        try:
-            raw_range   = range_header.replace("bytes=", "").split(",")[0].strip()
+def _parse_ranges(range_header: str, file_size: int) -> Optional[List[Tuple[int, int]]]:
+    """
+    Parse a ``Range: bytes=...`` header into sorted, merged inclusive ranges.
+
+    Returns ``None`` when there is no usable header (serve the whole file) and
+    an empty list when none of the ranges can be satisfied (416).  Overlapping
+    and adjacent ranges are merged; more than MAX_RANGES are coalesced into a
+    single covering range so one request can't fan out into thousands of parts.
+    """
+    if not range_header:
+        return None
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec.strip():
+        return None
+
+    ranges: List[Tuple[int, int]] = []
+    try:
+        for raw_range in spec.split(","):
+            raw_range = raw_range.strip()
+            if not raw_range:
+                continue
             start_str, end_str = raw_range.split("-")
-            from_bytes  = int(start_str) if start_str else 0
-            until_bytes = int(end_str)   if end_str   else file_size - 1
-        except (ValueError, AttributeError):
-            from_bytes  = 0
-            until_bytes = file_size - 1
+            if start_str:
+                from_bytes  = int(start_str)
+                until_bytes = int(end_str) if end_str else file_size - 1
+            else:
+                # Suffix range: the last N bytes.
+                from_bytes  = max(0, file_size - int(end_str))
+                until_bytes = file_size - 1
+            if from_bytes >= file_size:
+                continue
+            if from_bytes < 0 or from_bytes > until_bytes:
+                return None
+            ranges.append((from_bytes, min(until_bytes, file_size - 1)))
+    except ValueError:
+        return None
+
+    ranges.sort()
+    merged: List[Tuple[int, int]] = []
+    for from_bytes, until_bytes in ranges:
+        if merged and from_bytes <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], until_bytes))
+        else:
+            merged.append((from_bytes, until_bytes))
+
+    if len(merged) > max(1, Config.MAX_RANGES):
+        merged = [(merged[0][0], max(end for _, end in merged))]
+    return merged
+
+
+def _multipart_header(boundary: str, mime: str, from_bytes: int, until_bytes: int, file_size: int) -> bytes:
+    return (
+        f"\r\n--{boundary}\r\n"
+        f"Content-Type: {mime}\r\n"
+        f"Content-Range: bytes {from_bytes}-{until_bytes}/{file_size}\r\n"
+        f"\r\n"
+    ).encode()
+
+
+def _file_validators(file_data: dict) -> Tuple[str, Optional[datetime]]:
+    """
+    Strong ETag and Last-Modified for a stored file.
+
+    A Telegram message's media never changes, so (message_id, file_size)
+    identifies the exact bytes served and the ETag is strong.
+    """
+    etag    = f'"{file_data["message_id"]}-{int(file_data["file_size"]):x}"'
+    created = file_data.get("created_at")
+    if isinstance(created, datetime):
+        if created.tzinfo is None:
+            created = created.replace(tzinfo=timezone.utc)
+        created = created.replace(microsecond=0)
     else:
-        from_bytes  = 0
-        until_bytes = file_size - 1
+        created = None
+    return etag, created
+
+
+def _parse_http_date(value: str) -> Optional[datetime]:
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if parsed is None:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def _etag_list_matches(header: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match list against ``etag``."""
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == opaque
+        for candidate in header.split(",")
+    )
+
 
-    from_bytes  = max(0, from_bytes)
-    until_bytes = min(until_bytes, file_size - 1)
-    return from_bytes, until_bytes
+def _is_not_modified(request: web.Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    """RFC 9110 §13.2.2: If-None-Match wins; If-Modified-Since only without it."""
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is not None:
+        return _etag_list_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("If-Modified-Since")
+    if if_modified_since and last_modified is not None:
+        since = _parse_http_date(if_modified_since)
+        return since is not None and last_modified <= since
+    return False
+
+
+def _if_range_matches(request: web.Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    """True when the Range header may be honoured under If-Range."""
+    if_range = request.headers.get("If-Range")
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        # Strong comparison: a weak validator never matches.
+        return if_range == etag
+    if last_modified is None:
+        return False
+    return _parse_http_date(if_range) == last_modified
+
+
+def _ramp_parts(from_bytes: int, until_bytes: int, first_limit: int) -> List[Tuple[int, int]]:
+    """
+    ``(offset, limit)`` parts covering an inclusive range, starting at
+    ``first_limit`` bytes and doubling up to CHUNK_SIZE.  Each part takes the
+    largest power of two up to its target size that its offset is a multiple
+    of, so every part is a valid GetFile request and the ramp lands on 1 MB
+    boundaries from where on parts are the regular, cacheable ones.
+    """
+    parts  = []
+    target = first_limit
+    offset = from_bytes - from_bytes % first_limit
+    while offset <= until_bytes:
+        limit = target
+        while offset % limit:
+            limit //= 2
+        parts.append((offset, limit))
+        offset += limit
+        target  = min(CHUNK_SIZE, target * 2)
+    return parts
+
+
+def _part_span(from_bytes: int, until_bytes: int) -> Tuple[int, int, int, int]:
+    """(offset, first_part_cut, last_part_cut, part_count) for an inclusive range."""
+    offset         = from_bytes - (from_bytes % CHUNK_SIZE)
+    first_part_cut = from_bytes - offset
+    last_part_cut  = (until_bytes % CHUNK_SIZE) + 1
+    part_count     = math.ceil((until_bytes + 1) / CHUNK_SIZE) - (offset // CHUNK_SIZE)
+    return offset, first_part_cut, last_part_cut, part_count
+
+
+def _edge_bounds(edge: str, file_size: int) -> Tuple[int, int]:
+    """Inclusive byte range held by the ``"head"`` or ``"tail"`` probe buffer."""
+    size = min(file_size, Config.PROBE_BUFFER_SIZE)
+    if edge == "head":
+        return 0, size - 1
+    return file_size - size, file_size - 1
+
+
+def _probe_edge(from_bytes: int, until_bytes: int, file_size: int) -> Optional[str]:
+    """Which probe buffer, if any, fully covers the range."""
+    if Config.PROBE_BUFFER_SIZE <= 0:
+        return None
+    for edge in ("head", "tail"):
+        start, end = _edge_bounds(edge, file_size)
+        if start <= from_bytes and until_bytes <= end:
+            return edge
+    return None
+
+
+def _slice_edge(
+    data: Optional[bytes],
+    edge: str,
+    from_bytes: int,
+    until_bytes: int,
+    file_size: int,
+) -> Optional[bytes]:
+    if data is None:
+        return None
+    start, _ = _edge_bounds(edge, file_size)
+    return data[from_bytes - start: until_bytes - start + 1]
 
 
 def _get_client_ip(request: web.Request) -> str:
@@ -414,21 +1038,202 @@ async def _should_track_bandwidth(
 
 class StreamingService:
 
-    def __init__(self, bot_client: Client, db: Database):
+    def __init__(self, bot_client: Client, db: Database, workers: Sequence[Client] = ()):
         self.bot      = bot_client
         self.db       = db
         self.streamer = ByteStreamer(bot_client)
+        # The main bot plus any worker bots; each keeps its own FileId cache
+        # and media sessions, and streams are spread by current load.
+        self.streamers: List[ByteStreamer] = [self.streamer] + [
+            ByteStreamer(worker) for worker in workers
+        ]
+        # file_hash → background index lookup, so each file is indexed once.
+        self._index_tasks: Dict[str, asyncio.Task] = {}
+
+    def pick_streamer(self) -> ByteStreamer:
+        return min(self.streamers, key=lambda s: (s.active_streams, s.total_streams))
+
+    def client_stats(self) -> List[dict]:
+        return [streamer.stats() for streamer in self.streamers]
+
+    @staticmethod
+    async def _multipart_body(
+        streamer: ByteStreamer,
+        file_id: FileId,
+        ranges: Sequence[Tuple[int, int]],
+        part_headers: Sequence[bytes],
+        trailer: bytes,
+        window: int,
+        prefetch: PrefetchController,
+        message_id: str,
+        priority: Priority,
+        flow: str,
+    ):
+        """Interleave the multipart/byteranges part headers with range bytes."""
+        current = -1
+        async with aclosing(
+            streamer.yield_ranges(file_id, ranges, window, prefetch, message_id, priority, flow)
+        ) as pieces:
+            async for range_idx, piece in pieces:
+                while current < range_idx:
+                    current += 1
+                    yield part_headers[current]
+                yield piece
+        # A short read leaves the body truncated rather than falsely complete.
+        if current == len(ranges) - 1:
+            yield trailer
+
+    async def warm_file(self, file_data: dict) -> None:
+        """
+        Get a file ready for a viewer who is about to open it: resolve and
+        cache its FileId, make sure its DC has a media session pool, and pull
+        the first and last parts into the part caches and probe buffers.
+        Every fetch runs at ``Priority.WARMUP`` so live traffic goes first.
+        """
+        file_hash  = file_data["file_id"]
+        file_size  = int(file_data["file_size"])
+        message_id = str(file_data["message_id"])
+        if file_size <= 0:
+            return
+
+        streamer      = self.pick_streamer()
+        file_id       = await streamer.get_file_properties(message_id)
+        media_session = await streamer.generate_media_session(streamer.client, file_id)
+        location      = await streamer.get_location(file_id)
+
+        offsets = sorted({0, (file_size - 1) // CHUNK_SIZE * CHUNK_SIZE})
+        chunks  = await asyncio.gather(*(
+            streamer.get_part(
+                file_id, media_session, location, offset, CHUNK_SIZE,
+                "warm-up", Priority.WARMUP, "warm-up",
+            )
+            for offset in offsets
+        ))
+
+        for edge in ("head", "tail"):
+            start, end = _edge_bounds(edge, file_size)
+            for offset, chunk in zip(offsets, chunks):
+                if offset <= start and end < offset + len(chunk):
+                    head_tail_cache.put(file_hash, edge, bytes(chunk[start - offset:end - offset + 1]))
+
+        await self.index_file(streamer, file_id, file_data)
+
+    async def index_file(self, streamer: "ByteStreamer", file_id: FileId, file_data: dict) -> None:
+        """
+        Locate the container's seek index (MP4 ``moov``, Matroska ``Cues``),
+        store its byte ranges on the file document and pin those bytes in
+        memory.  Ranges already on the document are only re-pinned.
+        """
+        file_hash  = file_data["file_id"]
+        file_size  = int(file_data["file_size"])
+        message_id = str(file_data["message_id"])
+
+        async def _read(offset: int, length: int) -> bytes:
+            until = min(offset + length, file_size) - 1
+            if until < offset:
+                return b""
+            return await streamer.read_range(file_id, offset, until, message_id, Priority.WARMUP, "index")
+
+        index_ranges = file_data.get("index_ranges")
+        if index_ranges is None:
+            index_ranges = [[start, end] for start, end in await locate_index(_read, file_size)]
+            file_data["index_ranges"] = index_ranges
+            await self.db.set_file_index(file_hash, index_ranges)
+            if index_ranges:
+                logger.debug("index of %s at %s", file_hash, index_ranges)
+
+        pins = []
+        for start, end in index_ranges:
+            if end - start + 1 <= pinned_ranges.max_range:
+                pins.append((start, await _read(start, end - start + 1)))
+        pinned_ranges.put(file_hash, pins)
+
+    def _index_in_background(self, streamer: "ByteStreamer", file_id: FileId, file_data: dict) -> None:
+        file_hash = file_data["file_id"]
+        if file_hash in self._index_tasks or pinned_ranges.has(file_hash):
+            return
+        if file_data.get("index_ranges") == [] or pinned_ranges.max_bytes <= 0:
+            return
+
+        async def _run() -> None:
+            try:
+                await self.index_file(streamer, file_id, file_data)
+            except Exception as exc:
+                logger.debug("indexing %s failed: %s", file_hash, exc)
+
+        task = asyncio.create_task(_run())
+        self._index_tasks[file_hash] = task
+        task.add_done_callback(lambda _: self._index_tasks.pop(file_hash, None))
+
+    async def iter_file(self, file_data: dict):
+        """
+        Every byte of ``file_data`` in order, fetched at warm-up priority and
+        without filling the part caches (the caller keeps its own copy).
+        """
+        file_size  = int(file_data["file_size"])
+        message_id = str(file_data["message_id"])
+        streamer   = self.pick_streamer()
+        file_id    = await streamer.get_file_properties(message_id)
+
+        offset, first_part_cut, last_part_cut, part_count = _part_span(0, file_size - 1)
+        async with aclosing(streamer.yield_file(
+            file_id,
+            offset,
+            first_part_cut,
+            last_part_cut,
+            part_count,
+            CHUNK_SIZE,
+            Config.DL_FETCH_WINDOW,
+            message_id=message_id,
+            priority=Priority.WARMUP,
+            flow="materialize",
+            cache=False,
+        )) as chunks:
+            async for chunk in chunks:
+                yield chunk
+
+    async def hls_index(self, file_hash: str) -> HlsIndex:
+        """
+        Init section and fragments for an HLS playlist of ``file_hash``, or
+        ``None`` when the file isn't a fragmented MP4 with a segment index.
+        Looked up once per file; the answer is kept in ``hls_indexes``.
+        """
+        if file_hash in hls_indexes:
+            return hls_indexes.get(file_hash)
+
+        if file_hash in _file_meta_cache:
+            file_data = _file_meta_cache[file_hash]
+        else:
+            file_data = await self.db.get_file_by_hash(file_hash)
+            if not file_data:
+                raise web.HTTPNotFound(reason="file not found")
+            _file_meta_cache[file_hash] = file_data
+
+        file_size  = int(file_data["file_size"])
+        message_id = str(file_data["message_id"])
+        streamer   = self.pick_streamer()
+        file_id    = await streamer.get_file_properties(message_id)
+
+        async def _read(offset: int, length: int) -> bytes:
+            until = min(offset + length, file_size) - 1
+            if until < offset:
+                return b""
+            return await streamer.read_range(file_id, offset, until, message_id, Priority.HEAD, "hls")
+
+        index = await locate_fragments(_read, file_size) if file_size > 0 else None
+        hls_indexes.put(file_hash, index)
+        return index
 
     async def stream_file(
         self,
         request: web.Request,
         file_hash: str,
         is_download: bool = False,
+        session_key: Optional[str] = None,
     ) -> web.StreamResponse:
 
-        range_header     = request.headers.get("Range", "")
-        is_range_request = bool(range_header)
-        client_ip        = _get_client_ip(request)
+        range_header = request.headers.get("Range", "")
+        client_ip    = _get_client_ip(request)
 
         # ── File metadata ─────────────────────────────────────────────────────
         if file_hash in _file_meta_cache:
@@ -439,28 +1244,46 @@ class StreamingService:
                 raise web.HTTPNotFound(reason="file not found")
             _file_meta_cache[file_hash] = file_data
 
-        # ── Bandwidth guard ───────────────────────────────────────────────────
-        # Only check on fresh (non-range or first-range) requests to avoid DB
-        # overhead on every 1 MB chunk during active playback.
-        if Config.get("bandwidth_mode", True):
-            stats  = await self.db.get_bandwidth_stats()
-            max_bw = Config.get("max_bandwidth", 107374182400)
-            if max_bw and stats["total_bandwidth"] >= max_bw:
-                raise web.HTTPServiceUnavailable(reason="bandwidth limit exceeded")
+        # ── Conditional request ───────────────────────────────────────────────
+        # Answered before the bandwidth guard and any Telegram work: a 304
+        # costs neither a GetFile nor metered bytes.
+        etag, last_modified = _file_validators(file_data)
+        validators = {"ETag": etag}
+        if last_modified is not None:
+            validators["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+
+        if _is_not_modified(request, etag, last_modified):
+            return web.Response(
+                status=304,
+                headers={
+                    **validators,
+                    "Accept-Ranges":               "bytes",
+                    "Cache-Control":               "no-cache",
+                    "Access-Control-Allow-Origin": "*",
+                },
+            )
+
+        # A stale If-Range means the client's partial copy is of something
+        # else — send the whole file instead of the requested ranges.
+        if range_header and not _if_range_matches(request, etag, last_modified):
+            range_header = ""
 
         file_size  = int(file_data["file_size"])
         file_name  = file_data["file_name"]
         message_id = str(file_data["message_id"])
 
-        # Resolve FileId before preparing response
-        try:
-            file_id = await self.streamer.get_file_properties(message_id)
-        except Exception as exc:
-            logger.error("get_file_properties failed: msg=%s err=%s", message_id, exc)
-            raise web.HTTPNotFound(reason="could not resolve file on Telegram")
-
-        from_bytes, until_bytes = _parse_range(range_header, file_size)
+        ranges = _parse_ranges(range_header, file_size)
+        if ranges is not None and not ranges:
+            return web.Response(
+                status=416,
+                body=b"Range Not Satisfiable",
+                headers={"Content-Range": f"bytes */{file_size}"},
+            )
+        is_range_request = ranges is not None
+        if ranges is None:
+            ranges = [(0, file_size - 1)]
 
+        from_bytes, until_bytes = ranges[0]
         if from_bytes > until_bytes or from_bytes >= file_size:
             return web.Response(
                 status=416,
@@ -468,19 +1291,6 @@ class StreamingService:
                 headers={"Content-Range": f"bytes */{file_size}"},
             )
 
-        until_bytes = min(until_bytes, file_size - 1)
-        req_length  = until_bytes - from_bytes + 1
-
-        offset         = from_bytes - (from_bytes % CHUNK_SIZE)
-        first_part_cut = from_bytes - offset
-        last_part_cut  = (until_bytes % CHUNK_SIZE) + 1
-        part_count     = math.ceil((until_bytes + 1) / CHUNK_SIZE) - (offset // CHUNK_SIZE)
-
-        logger.debug(
-            "stream  msg=%s  size=%d  range=%d-%d  offset=%d  parts=%d",
-            message_id, file_size, from_bytes, until_bytes, offset, part_count,
-        )
-
         mime = (
             file_data.get("mime_type")
             or mimetypes.guess_type(file_name)[0]
@@ -494,7 +1304,6 @@ class StreamingService:
 
         headers = {
             "Content-Type":                mime,
-            "Content-Length":              str(req_length),
             "Content-Disposition":         f'{disposition}; filename="{file_name}"',
             "Accept-Ranges":               "bytes",
             "Cache-Control":               "no-cache",
@@ -502,35 +1311,485 @@ class StreamingService:
             "Connection":                  "keep-alive",
             # Hint to the browser/player: don't wait for the whole file
             "X-Content-Type-Options":      "nosniff",
+            **validators,
         }
-        if is_range_request:
-            headers["Content-Range"] = f"bytes {from_bytes}-{until_bytes}/{file_size}"
 
-        response = web.StreamResponse(status=status, headers=headers)
-        await response.prepare(request)
+        if len(ranges) == 1:
+            headers["Content-Length"] = str(until_bytes - from_bytes + 1)
+            if is_range_request:
+                headers["Content-Range"] = f"bytes {from_bytes}-{until_bytes}/{file_size}"
+        else:
+            boundary     = uuid.uuid4().hex
+            part_headers = [
+                _multipart_header(boundary, mime, start, end, file_size)
+                for start, end in ranges
+            ]
+            trailer = f"\r\n--{boundary}--\r\n".encode()
+
+            headers["Content-Type"]   = f"multipart/byteranges; boundary={boundary}"
+            headers["Content-Length"] = str(
+                sum(len(h) for h in part_headers)
+                + sum(end - start + 1 for start, end in ranges)
+                + len(trailer)
+            )
 
-        bytes_sent = 0
+        # ── Fast paths ────────────────────────────────────────────────────────
+        # Players probe with HEAD and a few bytes at either end of the file
+        # before playback.  HEAD needs nothing but the file document; tiny
+        # ranges come from the pinned head/tail buffer once it is filled.
+        # Both are small enough to skip the connection caps and quota check.
+        if request.method == "HEAD":
+            response = web.StreamResponse(status=status, headers=headers)
+            await response.prepare(request)
+            await response.write_eof()
+            return response
+
+        edge = None
+        if is_range_request and len(ranges) == 1:
+            edge = _probe_edge(from_bytes, until_bytes, file_size)
+        if edge:
+            probe = _slice_edge(head_tail_cache.get(file_hash, edge), edge, from_bytes, until_bytes, file_size)
+            if probe is not None:
+                return await self._send_probe(request, status, headers, probe, client_ip, message_id, from_bytes)
+
+        # ── Connection caps ───────────────────────────────────────────────────
         try:
-            async for chunk in self.streamer.yield_file(
+            lease = traffic_shaper.open(client_ip, file_hash)
+        except ConnectionLimitExceeded as exc:
+            logger.debug("stream  msg=%s  ip=%s  rejected: %s", message_id, client_ip, exc)
+            raise web.HTTPTooManyRequests(reason=str(exc), headers={"Retry-After": "5"})
+
+        with lease:
+            # ── Bandwidth guard ───────────────────────────────────────────────────
+            # Only check on fresh (non-range or first-range) requests to avoid DB
+            # overhead on every 1 MB chunk during active playback.
+            await self._check_bandwidth()
+
+            # ── Pinned index ──────────────────────────────────────────────────
+            # Seeks re-read the container index; once pinned it is served from
+            # RAM.  Unlike the probe buffer it may run to megabytes, so it is
+            # admitted, metered and shaped like any other response.
+            if is_range_request and len(ranges) == 1:
+                pinned = pinned_ranges.find(file_hash, from_bytes, until_bytes)
+                if pinned is not None:
+                    return await self._send_pinned(
+                        request, status, headers, pinned, lease, client_ip, message_id, from_bytes,
+                    )
+
+            # ── Materialized files ────────────────────────────────────────────
+            local_path = file_materializer.touch(file_data)
+            if local_path and len(ranges) == 1:
+                response = await self._send_local(
+                    request, status, headers, local_path, lease,
+                    client_ip, message_id, from_bytes, until_bytes,
+                )
+                if response is not None:
+                    return response
+
+            # Resolve FileId before preparing response.  A worker that can't see
+            # the message falls back to the main bot.
+            streamer = self.pick_streamer()
+            try:
+                file_id = await streamer.get_file_properties(message_id)
+            except Exception as exc:
+                if streamer is self.streamer:
+                    logger.error("get_file_properties failed: msg=%s err=%s", message_id, exc)
+                    raise web.HTTPNotFound(reason="could not resolve file on Telegram")
+                logger.warning(
+                    "get_file_properties failed on %s: msg=%s err=%s — using main bot",
+                    streamer.client.name, message_id, exc,
+                )
+                streamer = self.streamer
+                try:
+                    file_id = await streamer.get_file_properties(message_id)
+                except Exception as exc:
+                    logger.error("get_file_properties failed: msg=%s err=%s", message_id, exc)
+                    raise web.HTTPNotFound(reason="could not resolve file on Telegram")
+
+            if edge:
+                start, end = _edge_bounds(edge, file_size)
+                try:
+                    data = await streamer.read_range(file_id, start, end, message_id, flow=client_ip)
+                except Exception as exc:
+                    logger.warning("probe buffer fill failed: msg=%s err=%s", message_id, exc)
+                    data = None
+                if data is not None and len(data) == end - start + 1:
+                    head_tail_cache.put(file_hash, edge, data)
+                    probe = _slice_edge(data, edge, from_bytes, until_bytes, file_size)
+                    return await self._send_probe(request, status, headers, probe, client_ip, message_id, from_bytes)
+
+            self._index_in_background(streamer, file_id, file_data)
+
+            # /dl is throughput-bound and may use a deep window; /stream is
+            # latency-bound and shouldn't fetch far past what the player needs.
+            # Within that ceiling the depth follows the client's drain rate.
+            window   = Config.DL_FETCH_WINDOW if is_download else Config.STREAM_FETCH_WINDOW
+            priority = Priority.BULK if is_download else Priority.PLAYBACK
+            prefetch = PrefetchController(
+                Config.PREFETCH_MIN_DEPTH,
+                window,
+                CHUNK_SIZE,
+                label=f"{file_hash}:{client_ip}:{from_bytes}",
+            )
+            # Parked read-ahead is only handed between responses of one route:
+            # a /dl segment never picks up a /stream player's parts.
+            readahead_key = f"{'dl' if is_download else 'stream'}:{session_key}" if session_key else None
+
+            if len(ranges) == 1:
+                offset, first_part_cut, last_part_cut, part_count = _part_span(from_bytes, until_bytes)
+
+                logger.debug(
+                    "stream  msg=%s  size=%d  range=%d-%d  offset=%d  parts=%d",
+                    message_id, file_size, from_bytes, until_bytes, offset, part_count,
+                )
+
+                body = streamer.yield_file(
+                    file_id,
+                    offset,
+                    first_part_cut,
+                    last_part_cut,
+                    part_count,
+                    CHUNK_SIZE,
+                    window,
+                    prefetch,
+                    message_id,
+                    priority,
+                    client_ip,
+                    readahead_key,
+                    0 if is_download else FIRST_PART_SIZE,
+                )
+            else:
+                logger.debug(
+                    "stream  msg=%s  size=%d  multipart ranges=%s",
+                    message_id, file_size, ranges,
+                )
+
+                body = self._multipart_body(
+                    streamer, file_id, ranges, part_headers, trailer,
+                    window, prefetch, message_id, priority, client_ip,
+                )
+
+            response = web.StreamResponse(status=status, headers=headers)
+            await response.prepare(request)
+
+            bytes_sent = 0
+            try:
+                with prefetch:
+                    async with aclosing(body) as chunks:
+                        async for chunk in chunks:
+                            started = time.monotonic()
+                            for piece in lease.slices(chunk):
+                                delay = lease.reserve(len(piece))
+                                if delay:
+                                    await asyncio.sleep(delay)
+                                await response.write(piece)
+                                bytes_sent += len(piece)
+                            prefetch.record_write(len(chunk), time.monotonic() - started)
+            except (asyncio.CancelledError, ConnectionResetError):
+                logger.debug("stream  msg=%s  client disconnected after %d bytes", message_id, bytes_sent)
+            except Exception as exc:
+                logger.error("streaming error: msg=%s err=%s", message_id, exc)
+
+            try:
+                await response.write_eof()
+            except Exception:
+                pass
+
+            await self._track_bandwidth(client_ip, message_id, from_bytes, bytes_sent)
+
+        return response
+
+    async def _check_bandwidth(self) -> None:
+        if Config.get("bandwidth_mode", True):
+            stats  = await self.db.get_bandwidth_stats()
+            max_bw = Config.get("max_bandwidth", 107374182400)
+            if max_bw and stats["total_bandwidth"] >= max_bw:
+                raise web.HTTPServiceUnavailable(reason="bandwidth limit exceeded")
+
+    async def stream_zip(
+        self,
+        request: web.Request,
+        docs: List[dict],
+        archive_name: str,
+    ) -> web.StreamResponse:
+        """
+        Stream ``docs`` as one STORED ZIP64 archive built on the fly.
+
+        Member sizes are known, so the archive length and layout are fixed
+        before the first byte and single ranges can be resumed.  CRCs follow
+        each member in a data descriptor; they are computed while the data
+        streams and kept on the file document for later resumes.  A range
+        that needs the CRC of a member it skips entirely, and whose CRC isn't
+        known yet, is answered with the whole archive instead.
+        """
+        client_ip = _get_client_ip(request)
+        names     = unique_names([doc["file_name"] for doc in docs])
+        layout    = ZipLayout([
+            ZipEntry(name, int(doc["file_size"]), doc.get("created_at"), doc.get("crc32"))
+            for name, doc in zip(names, docs)
+        ])
+        etag = layout.etag([doc["file_id"] for doc in docs])
+
+        headers = {
+            "Content-Type":                "application/zip",
+            "Content-Disposition":         f'attachment; filename="{archive_name}"',
+            "Accept-Ranges":               "bytes",
+            "Cache-Control":               "no-cache",
+            "Access-Control-Allow-Origin": "*",
+            "ETag":                        etag,
+        }
+        if _is_not_modified(request, etag, None):
+            return web.Response(status=304, headers=headers)
+
+        range_header = request.headers.get("Range", "")
+        if range_header and not _if_range_matches(request, etag, None):
+            range_header = ""
+        ranges = _parse_ranges(range_header, layout.size)
+        if ranges is not None and not ranges:
+            return web.Response(
+                status=416,
+                body=b"Range Not Satisfiable",
+                headers={"Content-Range": f"bytes */{layout.size}"},
+            )
+
+        status = 200
+        from_bytes, until_bytes = 0, layout.size - 1
+        if ranges is not None:
+            if len(ranges) == 1 and not layout.unknown_crcs(*ranges[0]):
+                status = 206
+                from_bytes, until_bytes = ranges[0]
+                headers["Content-Range"] = f"bytes {from_bytes}-{until_bytes}/{layout.size}"
+            else:
+                logger.debug("zip  ranges=%s  not servable — sending whole archive", ranges)
+        headers["Content-Length"] = str(until_bytes - from_bytes + 1)
+
+        if request.method == "HEAD":
+            response = web.StreamResponse(status=status, headers=headers)
+            await response.prepare(request)
+            await response.write_eof()
+            return response
+
+        try:
+            lease = traffic_shaper.open(client_ip, etag)
+        except ConnectionLimitExceeded as exc:
+            raise web.HTTPTooManyRequests(reason=str(exc), headers={"Retry-After": "5"})
+
+        with lease:
+            await self._check_bandwidth()
+
+            response = web.StreamResponse(status=status, headers=headers)
+            await response.prepare(request)
+
+            # member index → (first data offset sent, data bytes sent)
+            delivered: Dict[int, List[int]] = {}
+            bytes_sent = 0
+            try:
+                body = self._zip_body(self.pick_streamer(), layout, docs, from_bytes, until_bytes, client_ip)
+                async with aclosing(body) as chunks:
+                    async for idx, data_offset, chunk in chunks:
+                        for piece in lease.slices(chunk):
+                            delay = lease.reserve(len(piece))
+                            if delay:
+                                await asyncio.sleep(delay)
+                            await response.write(piece)
+                            bytes_sent += len(piece)
+                            if idx >= 0:
+                                delivered.setdefault(idx, [data_offset, 0])[1] += len(piece)
+            except (asyncio.CancelledError, ConnectionResetError):
+                logger.debug("zip  files=%d  client disconnected after %d bytes", len(docs), bytes_sent)
+            except Exception as exc:
+                logger.error("zip streaming error: files=%d err=%s", len(docs), exc)
+
+            try:
+                await response.write_eof()
+            except Exception:
+                pass
+
+            for idx, (data_offset, sent) in delivered.items():
+                await self._track_bandwidth(client_ip, str(docs[idx]["message_id"]), data_offset, sent)
+
+        return response
+
+    async def _zip_body(
+        self,
+        streamer: "ByteStreamer",
+        layout: ZipLayout,
+        docs: List[dict],
+        from_bytes: int,
+        until_bytes: int,
+        client_ip: str,
+    ):
+        """
+        Yield ``(member index or -1, member data offset, bytes)`` for an
+        inclusive range of the archive.  A member whose CRC is still unknown
+        and whose descriptor is in range is read from its first byte, with
+        the part before the range only hashed, not sent.
+        """
+        for offset, length, kind, idx in layout.overlapping(from_bytes, until_bytes):
+            lo = max(from_bytes, offset) - offset
+            hi = min(until_bytes, offset + length - 1) - offset
+            if kind != "data":
+                yield -1, 0, layout.render(kind, idx)[lo:hi + 1]
+                continue
+
+            entry    = layout.entries[idx]
+            doc      = docs[idx]
+            need_crc = entry.crc is None and until_bytes >= layout.data_end(idx)
+            start    = 0 if need_crc else lo
+            file_id  = await streamer.get_file_properties(str(doc["message_id"]))
+
+            crc = 0
+            pos = start
+            part_offset, first_part_cut, last_part_cut, part_count = _part_span(start, hi)
+            async with aclosing(streamer.yield_file(
                 file_id,
-                offset,
+                part_offset,
                 first_part_cut,
                 last_part_cut,
                 part_count,
                 CHUNK_SIZE,
-            ):
-                await response.write(chunk)
-                bytes_sent += len(chunk)
+                Config.DL_FETCH_WINDOW,
+                message_id=str(doc["message_id"]),
+                priority=Priority.BULK,
+                flow=client_ip,
+            )) as chunks:
+                async for chunk in chunks:
+                    if need_crc:
+                        crc = zlib.crc32(chunk, crc)
+                    end = pos + len(chunk)
+                    if end > lo:
+                        yield idx, max(lo, pos), chunk[max(0, lo - pos):]
+                    pos = end
+
+            if need_crc:
+                if pos != entry.size:
+                    raise ValueError(f"{doc['file_id']}: read {pos} of {entry.size} bytes")
+                entry.crc    = crc
+                doc["crc32"] = crc
+                asyncio.create_task(self.db.set_file_crc(doc["file_id"], crc))
+
+    async def _send_local(
+        self,
+        request: web.Request,
+        status: int,
+        headers: Dict[str, str],
+        path: str,
+        lease: StreamLease,
+        client_ip: str,
+        message_id: str,
+        from_bytes: int,
+        until_bytes: int,
+    ) -> Optional[web.StreamResponse]:
+        """
+        Send one range of a materialized file.  Zero-copy ``sendfile`` unless
+        a rate limit applies, in which case it is read and written in shaped
+        slices like any other response.
+        """
+        loop  = asyncio.get_running_loop()
+        count = until_bytes - from_bytes + 1
+        try:
+            fh = await loop.run_in_executor(None, open, path, "rb")
+        except OSError as exc:
+            # Evicted since the lookup — the caller streams it from Telegram.
+            logger.debug("local  msg=%s  unavailable: %s", message_id, exc)
+            return None
+
+        response = web.StreamResponse(status=status, headers=headers)
+        await response.prepare(request)
+
+        bytes_sent = 0
+        try:
+            sent = False
+            if not lease.limited and request.transport is not None:
+                try:
+                    await loop.sendfile(request.transport, fh, from_bytes, count)
+                    bytes_sent = count
+                    sent       = True
+                except NotImplementedError:
+                    pass
+            if not sent:
+                slice_size = SLICE_SIZE if lease.limited else CHUNK_SIZE
+                await loop.run_in_executor(None, fh.seek, from_bytes)
+                while bytes_sent < count:
+                    piece = await loop.run_in_executor(
+                        None, fh.read, min(slice_size, count - bytes_sent)
+                    )
+                    if not piece:
+                        break
+                    delay = lease.reserve(len(piece))
+                    if delay:
+                        await asyncio.sleep(delay)
+                    await response.write(piece)
+                    bytes_sent += len(piece)
         except (asyncio.CancelledError, ConnectionResetError):
-            logger.debug("stream  msg=%s  client disconnected after %d bytes", message_id, bytes_sent)
+            logger.debug("local  msg=%s  client disconnected after %d bytes", message_id, bytes_sent)
         except Exception as exc:
-            logger.error("streaming error: msg=%s err=%s", message_id, exc)
+            logger.error("local streaming error: msg=%s err=%s", message_id, exc)
+        finally:
+            await loop.run_in_executor(None, fh.close)
 
         try:
             await response.write_eof()
         except Exception:
             pass
 
+        await self._track_bandwidth(client_ip, message_id, from_bytes, bytes_sent)
+        return response
+
+    async def _send_pinned(
+        self,
+        request: web.Request,
+        status: int,
+        headers: Dict[str, str],
+        data: bytes,
+        lease: StreamLease,
+        client_ip: str,
+        message_id: str,
+        from_bytes: int,
+    ) -> web.StreamResponse:
+        """Send a range held in memory, in shaped slices when a rate applies."""
+        if not lease.limited:
+            return await self._send_probe(request, status, headers, data, client_ip, message_id, from_bytes)
+
+        response = web.StreamResponse(status=status, headers=headers)
+        await response.prepare(request)
+
+        bytes_sent = 0
+        try:
+            for piece in lease.slices(data):
+                delay = lease.reserve(len(piece))
+                if delay:
+                    await asyncio.sleep(delay)
+                await response.write(piece)
+                bytes_sent += len(piece)
+            await response.write_eof()
+        except (asyncio.CancelledError, ConnectionResetError):
+            logger.debug("pinned  msg=%s  client disconnected after %d bytes", message_id, bytes_sent)
+
+        await self._track_bandwidth(client_ip, message_id, from_bytes, bytes_sent)
+        return response
+
+    async def _send_probe(
+        self,
+        request: web.Request,
+        status: int,
+        headers: Dict[str, str],
+        data: bytes,
+        client_ip: str,
+        message_id: str,
+        from_bytes: int,
+    ) -> web.Response:
+        response = web.Response(status=status, headers=headers, body=data)
+        await self._track_bandwidth(client_ip, message_id, from_bytes, len(data))
+        return response
+
+    async def _track_bandwidth(
+        self,
+        client_ip: str,
+        message_id: str,
+        from_bytes: int,
+        bytes_sent: int,
+    ) -> None:
         # Record only actual bytes delivered — not the full requested range.
         # Additionally, only track a given (client, file, offset) once per
         # _BW_DEDUP_TTL window to prevent counting the same segment multiple
@@ -544,5 +1803,3 @@ class StreamingService:
                     "bw dedup  msg=%s  ip=%s  from=%d  bytes=%d  (skipped)",
                     message_id, client_ip, from_bytes, bytes_sent,
                 )
-
-        return response
@@ -0,0 +1,87 @@
+import asyncio
+import logging
+import time
+from typing import Iterable, Optional
+
+from config import Config
+
+from .sessions import MediaSessionPool, dc_lock
+
+logger = logging.getLogger(__name__)
+
+
+class SessionSupervisor:
+    """
+    Periodic health pass over every media session pool of every client.
+
+    Circuits open on their own when a session keeps failing; this pass adds
+    what a single call can't see: sessions far slower than their peers are
+    tripped, rebuilds that failed are retried, and pools nobody has used for
+    ``idle_timeout`` seconds are closed and dropped from
+    ``client.media_sessions`` (the next request reopens them).  DCs in
+    ``keep`` — the warmed ones — are never reaped.
+    """
+
+    def __init__(self, interval: float, idle_timeout: float, slow_factor: float):
+        self.interval     = max(1.0, interval)
+        self.idle_timeout = idle_timeout
+        self.slow_factor  = slow_factor
+
+        self.passes       = 0
+        self.slow_trips   = 0
+        self.retries      = 0
+        self.reaped       = 0
+        self.last_pass: Optional[float] = None
+
+    async def run(self, streaming_service, keep: Iterable[int] = ()) -> None:
+        keep = set(keep)
+        while True:
+            await asyncio.sleep(self.interval)
+            for streamer in streaming_service.streamers:
+                try:
+                    await self.check(streamer.client, keep)
+                except Exception as exc:
+                    logger.warning("session supervisor pass on %s failed: %s", streamer.client.name, exc)
+            self.passes   += 1
+            self.last_pass = time.time()
+
+    async def check(self, client, keep: Iterable[int] = ()) -> None:
+        for dc_id, pool in list(client.media_sessions.items()):
+            if not isinstance(pool, MediaSessionPool):
+                continue
+            if (
+                self.idle_timeout > 0
+                and dc_id not in keep
+                and pool.idle_for() >= self.idle_timeout
+            ):
+                await self._reap(client, dc_id, pool)
+                continue
+            self.slow_trips += pool.trip_slow(self.slow_factor)
+            self.retries    += pool.rebuild_open()
+
+    async def _reap(self, client, dc_id: int, pool: MediaSessionPool) -> None:
+        async with dc_lock(client, dc_id):
+            if client.media_sessions.get(dc_id) is not pool or pool.idle_for() < self.idle_timeout:
+                return
+            del client.media_sessions[dc_id]
+        await pool.stop()
+        self.reaped += 1
+        logger.info("Closed idle media session pool for DC %s on %s", dc_id, client.name)
+
+    def stats(self) -> dict:
+        return {
+            "interval":     self.interval,
+            "idle_timeout": self.idle_timeout,
+            "passes":       self.passes,
+            "slow_trips":   self.slow_trips,
+            "retries":      self.retries,
+            "reaped":       self.reaped,
+            "last_pass":    self.last_pass,
+        }
+
+
+session_supervisor = SessionSupervisor(
+    Config.SESSION_CHECK_INTERVAL,
+    Config.MEDIA_SESSION_IDLE_TTL,
+    Config.SESSION_SLOW_FACTOR,
+)
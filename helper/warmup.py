@@ -0,0 +1,163 @@
+import asyncio
+import logging
+from collections import Counter
+from typing import Dict, List
+
+from pyrogram.file_id import FileId
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+async def resolve_warmup_dcs(database) -> List[int]:
+    """
+    DCs to keep media sessions open for.
+
+    WARMUP_DCS is either a comma-separated list of DC ids, ``auto`` to learn
+    them from the most recently stored files, or empty / ``none`` to disable.
+    """
+    setting = Config.WARMUP_DCS.strip().lower()
+    if setting in ("", "none", "off", "0"):
+        return []
+    if setting != "auto":
+        dc_ids = set()
+        for value in setting.split(","):
+            value = value.strip()
+            if not value:
+                continue
+            try:
+                dc_id = int(value)
+            except ValueError:
+                dc_id = 0
+            if not 1 <= dc_id <= 5:
+                logger.warning("⚠️  ɪɢɴᴏʀɪɴɢ ɪɴᴠᴀʟɪᴅ ᴡᴀʀᴍᴜᴘ_ᴅᴄꜱ ᴇɴᴛʀʏ: %r", value)
+                continue
+            dc_ids.add(dc_id)
+        return sorted(dc_ids)
+
+    counts: Counter = Counter()
+    for tg_file_id in await database.get_recent_telegram_file_ids(Config.WARMUP_SAMPLE):
+        try:
+            counts[FileId.decode(tg_file_id).dc_id] += 1
+        except Exception:
+            continue
+    return [dc_id for dc_id, _ in counts.most_common()]
+
+
+async def warm_up(streaming_service, dc_ids: List[int]) -> None:
+    """Open full media session pools to ``dc_ids`` on every streaming client."""
+    async def _warm(streamer, dc_id: int) -> None:
+        try:
+            pool = await streamer.media_pool(streamer.client, dc_id)
+            await pool.wait_ready()
+            logger.info(
+                "🔥  ᴍᴇᴅɪᴀ ꜱᴇꜱꜱɪᴏɴꜱ ᴡᴀʀᴍ  │  %s  │  ᴅᴄ %s  │  %d/%d",
+                streamer.client.name, dc_id, len(pool.sessions), pool.size,
+            )
+        except Exception as exc:
+            logger.warning("⚠️  ᴡᴀʀᴍ-ᴜᴘ ꜰᴀɪʟᴇᴅ  │  %s  │  ᴅᴄ %s: %s", streamer.client.name, dc_id, exc)
+
+    await asyncio.gather(*(
+        _warm(streamer, dc_id)
+        for streamer in streaming_service.streamers
+        for dc_id in dc_ids
+    ))
+
+
+async def keep_warm(streaming_service, dc_ids: List[int], interval: float) -> None:
+    """
+    Warm ``dc_ids`` once, then periodically ping and repair the pools so they
+    never go cold.  Meant to run as a background task: a slow or unreachable
+    DC must not hold up the web server.
+    """
+    await warm_up(streaming_service, dc_ids)
+    while True:
+        await asyncio.sleep(interval)
+        for streamer in streaming_service.streamers:
+            for dc_id in dc_ids:
+                try:
+                    pool = await streamer.media_pool(streamer.client, dc_id)
+                    await pool.refresh()
+                except Exception as exc:
+                    logger.debug("keep_warm DC %s on %s failed: %s", dc_id, streamer.client.name, exc)
+
+
+class PredictiveWarmer:
+    """
+    Warms files that are about to be played: links that were just generated
+    and stream pages that were just rendered.
+
+    Warm-ups are fire-and-forget but bounded — at most ``concurrency`` run at
+    once, at most ``max_pending`` are queued, each is cut off after
+    ``TIMEOUT`` seconds and all of them can be cancelled — and their GetFile
+    calls use the lowest scheduler priority, so they never crowd out live
+    traffic.
+    """
+
+    TIMEOUT = 30  # seconds
+
+    def __init__(self, concurrency: int, max_pending: int):
+        self.service      = None
+        self.concurrency  = concurrency
+        self.max_pending  = max_pending
+        self._slots       = asyncio.Semaphore(max(1, concurrency))
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+        self.completed = 0
+        self.failed    = 0
+        self.dropped   = 0
+
+    def attach(self, streaming_service) -> None:
+        self.service = streaming_service
+
+    def schedule(self, file_data: dict) -> bool:
+        """Queue a warm-up for ``file_data`` (a file document); False if skipped."""
+        if self.service is None or self.concurrency <= 0:
+            return False
+        file_hash = file_data.get("file_id")
+        if not file_hash or file_hash in self._tasks:
+            return False
+        if len(self._tasks) >= self.max_pending:
+            self.dropped += 1
+            return False
+
+        task = asyncio.create_task(self._run(file_hash, file_data))
+        self._tasks[file_hash] = task
+        task.add_done_callback(lambda _: self._tasks.pop(file_hash, None))
+        return True
+
+    async def _run(self, file_hash: str, file_data: dict) -> None:
+        async with self._slots:
+            try:
+                await asyncio.wait_for(self.service.warm_file(file_data), self.TIMEOUT)
+                self.completed += 1
+                logger.debug("predictive warm-up done for %s", file_hash)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                self.failed += 1
+                logger.debug("predictive warm-up failed for %s: %s", file_hash, exc)
+
+    def cancel(self, file_hash: str) -> None:
+        task = self._tasks.get(file_hash)
+        if task:
+            task.cancel()
+
+    def cancel_all(self) -> None:
+        for task in list(self._tasks.values()):
+            task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "pending":   len(self._tasks),
+            "completed": self.completed,
+            "failed":    self.failed,
+            "dropped":   self.dropped,
+        }
+
+
+predictive_warmer = PredictiveWarmer(
+    Config.PREDICTIVE_WARMUP_CONCURRENCY,
+    Config.PREDICTIVE_WARMUP_QUEUE,
+)
@@ -0,0 +1,186 @@
+import hashlib
+import os
+import struct
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
+
+# Every entry is written as ZIP64 with a data descriptor, so sizes above
+# 4 GiB need no special case and the CRC may follow the data.
+_VERSION   = 45      # 4.5: ZIP64
+_FLAGS     = 0x0808  # bit 3: data descriptor, bit 11: UTF-8 names
+_MAX16     = 0xFFFF
+_MAX32     = 0xFFFFFFFF
+
+_LOCAL_EXTRA   = struct.pack("<HH", 0x0001, 16)
+_CENTRAL_EXTRA = struct.pack("<HH", 0x0001, 24)
+
+DESCRIPTOR_SIZE = 24
+_ZIP64_EOCD     = 56
+_ZIP64_LOCATOR  = 20
+_EOCD           = 22
+
+
+class ZipEntry:
+    """One archive member; ``crc`` is ``None`` until the data has been read."""
+
+    def __init__(self, name: str, size: int, modified: Optional[datetime], crc: Optional[int] = None):
+        self.name   = name.encode("utf-8")
+        self.size   = size
+        self.crc    = 0 if size == 0 else crc
+        self.offset = 0
+
+        modified = modified or datetime(1980, 1, 1)
+        year     = min(max(modified.year, 1980), 2107)
+        self.dos_date = ((year - 1980) << 9) | (modified.month << 5) | modified.day
+        self.dos_time = (modified.hour << 11) | (modified.minute << 5) | (modified.second // 2)
+
+    @property
+    def header_size(self) -> int:
+        return 30 + len(self.name) + len(_LOCAL_EXTRA) + 16
+
+    @property
+    def central_size(self) -> int:
+        return 46 + len(self.name) + len(_CENTRAL_EXTRA) + 24
+
+
+# (offset, length, kind, entry index) — kind is "header", "data",
+# "descriptor" or "directory" (central directory through EOCD, index -1).
+Segment = Tuple[int, int, str, int]
+
+
+class ZipLayout:
+    """
+    Byte layout of a STORED ZIP64 archive whose member sizes are known.
+
+    Everything except the CRCs is fixed up front, so the total size is known
+    before the first byte is sent and any byte range can be produced without
+    building the archive: headers are rendered on demand and member data is
+    read straight from the source.
+    """
+
+    def __init__(self, entries: Sequence[ZipEntry]):
+        self.entries  = list(entries)
+        self.segments: List[Segment] = []
+
+        offset = 0
+        for idx, entry in enumerate(self.entries):
+            entry.offset = offset
+            for kind, length in (
+                ("header",     entry.header_size),
+                ("data",       entry.size),
+                ("descriptor", DESCRIPTOR_SIZE),
+            ):
+                if length:
+                    self.segments.append((offset, length, kind, idx))
+                offset += length
+
+        self.directory_offset = offset
+        self.directory_size   = sum(entry.central_size for entry in self.entries)
+        tail = self.directory_size + _ZIP64_EOCD + _ZIP64_LOCATOR + _EOCD
+        self.segments.append((offset, tail, "directory", -1))
+        self.size = offset + tail
+
+    def etag(self, keys: Sequence[str]) -> str:
+        """Strong validator over member identity, order, names and sizes."""
+        digest = hashlib.sha256()
+        for key, entry in zip(keys, self.entries):
+            digest.update(f"{key}:{entry.size}:".encode() + entry.name + b"\0")
+        return f'"zip-{digest.hexdigest()[:24]}"'
+
+    # ── Rendering ─────────────────────────────────────────────────────────────
+
+    def header(self, idx: int) -> bytes:
+        entry = self.entries[idx]
+        return struct.pack(
+            "<IHHHHHIIIHH",
+            0x04034B50, _VERSION, _FLAGS, 0, entry.dos_time, entry.dos_date,
+            0, _MAX32, _MAX32, len(entry.name), len(_LOCAL_EXTRA) + 16,
+        ) + entry.name + _LOCAL_EXTRA + struct.pack("<QQ", entry.size, entry.size)
+
+    def descriptor(self, idx: int) -> bytes:
+        entry = self.entries[idx]
+        return struct.pack("<IIQQ", 0x08074B50, entry.crc, entry.size, entry.size)
+
+    def directory(self) -> bytes:
+        records = []
+        for entry in self.entries:
+            records.append(struct.pack(
+                "<IHHHHHHIIIHHHHHII",
+                0x02014B50, _VERSION, _VERSION, _FLAGS, 0, entry.dos_time, entry.dos_date,
+                entry.crc, _MAX32, _MAX32, len(entry.name), len(_CENTRAL_EXTRA) + 24,
+                0, 0, 0, 0, _MAX32,
+            ) + entry.name + _CENTRAL_EXTRA + struct.pack("<QQQ", entry.size, entry.size, entry.offset))
+
+        count = len(self.entries)
+        eocd64_offset = self.directory_offset + self.directory_size
+        records.append(struct.pack(
+            "<IQHHIIQQQQ",
+            0x06064B50, _ZIP64_EOCD - 12, _VERSION, _VERSION, 0, 0,
+            count, count, self.directory_size, self.directory_offset,
+        ))
+        records.append(struct.pack("<IIQI", 0x07064B50, 0, eocd64_offset, 1))
+        records.append(struct.pack(
+            "<IHHHHIIH",
+            0x06054B50, 0, 0, min(count, _MAX16), min(count, _MAX16),
+            min(self.directory_size, _MAX32), _MAX32, 0,
+        ))
+        return b"".join(records)
+
+    def render(self, kind: str, idx: int) -> bytes:
+        if kind == "header":
+            return self.header(idx)
+        if kind == "descriptor":
+            return self.descriptor(idx)
+        return self.directory()
+
+    # ── Range planning ────────────────────────────────────────────────────────
+
+    def overlapping(self, from_bytes: int, until_bytes: int) -> List[Segment]:
+        return [
+            seg for seg in self.segments
+            if seg[0] <= until_bytes and seg[0] + seg[1] > from_bytes
+        ]
+
+    def unknown_crcs(self, from_bytes: int, until_bytes: int) -> List[int]:
+        """
+        Members whose CRC the range needs but won't stream past: their data
+        lies wholly before ``from_bytes`` while their descriptor or the
+        central directory lies inside the range.
+        """
+        if until_bytes < self.directory_offset:
+            needed = {
+                idx for _, _, kind, idx in self.overlapping(from_bytes, until_bytes)
+                if kind == "descriptor"
+            }
+        else:
+            needed = set(range(len(self.entries)))
+        return [
+            idx for idx in sorted(needed)
+            if self.entries[idx].crc is None
+            and self.data_end(idx) <= from_bytes
+        ]
+
+    def data_start(self, idx: int) -> int:
+        entry = self.entries[idx]
+        return entry.offset + entry.header_size
+
+    def data_end(self, idx: int) -> int:
+        """One past the last data byte of member ``idx``."""
+        return self.data_start(idx) + self.entries[idx].size
+
+
+def unique_names(names: Sequence[str]) -> List[str]:
+    """Archive-safe member names, made unique as ``name (2).ext``."""
+    taken  = set()
+    result = []
+    for name in names:
+        name      = name.replace("\\", "_").replace("/", "_").strip() or "file"
+        base, ext = os.path.splitext(name)
+        candidate = name
+        copy      = 1
+        while candidate.lower() in taken:
+            copy     += 1
+            candidate = f"{base} ({copy}){ext}"
+        taken.add(candidate.lower())
+        result.append(candidate)
+    return result
@@ -4,10 +4,14 @@ import sys
 
 from aiohttp import web
 
-from bot import Bot
+from bot import Bot, start_workers
 from app import build_app
 from config import Config
 from database import Database, db_instance
+from helper.cache import disk_cache
+from helper.materialize import file_materializer
+from helper.supervisor import session_supervisor
+from helper.warmup import keep_warm, predictive_warmer, resolve_warmup_dcs
 
 
 class LoggingFormatter(logging.Formatter):
@@ -97,14 +101,37 @@ async def main() -> None:
         bot_info.dc_id,
     )
 
+    #Worker bots
+    workers = []
+    if Config.MULTI_TOKENS:
+        logger.info("🤖  ꜱᴛᴀʀᴛɪɴɢ %d ᴡᴏʀᴋᴇʀ ʙᴏᴛꜱ…", len(Config.MULTI_TOKENS))
+        workers = await start_workers()
+        logger.info("✅  %d/%d ᴡᴏʀᴋᴇʀ ʙᴏᴛꜱ ᴏɴʟɪɴᴇ", len(workers), len(Config.MULTI_TOKENS))
+
+    #Materialized files
+    await file_materializer.load()
+
     #Web Server
     logger.info("🌐  ꜱᴛᴀʀᴛɪɴɢ ᴡᴇʙ ꜱᴇʀᴠᴇʀ…")
-    web_app = build_app(bot, database)
+    web_app = build_app(bot, database, workers)
+
     runner  = web.AppRunner(web_app)
     await runner.setup()
     site = web.TCPSite(runner, Config.BIND_ADDRESS, Config.PORT)
     await site.start()
 
+    #Media session warm-up (in the background, once the port is bound)
+    warm_task = None
+    dc_ids    = await resolve_warmup_dcs(database)
+    if dc_ids:
+        logger.info("🔥  ᴡᴀʀᴍɪɴɢ ᴍᴇᴅɪᴀ ꜱᴇꜱꜱɪᴏɴꜱ ꜰᴏʀ ᴅᴄ %s…", ", ".join(map(str, dc_ids)))
+        warm_task = asyncio.create_task(
+            keep_warm(web_app["streaming_service"], dc_ids, Config.WARMUP_INTERVAL)
+        )
+    supervisor_task = asyncio.create_task(
+        session_supervisor.run(web_app["streaming_service"], keep=dc_ids)
+    )
+
     public_url = Config.URL or f"http://{Config.BIND_ADDRESS}:{Config.PORT}"
     logger.info("✅  ᴡᴇʙ ꜱᴇʀᴠᴇʀ ʟɪᴠᴇ")
     logger.info("🔗  %s", public_url)
@@ -118,10 +145,18 @@ async def main() -> None:
         await asyncio.Event().wait()
     finally:
         logger.info("🛑  ꜱʜᴜᴛᴛɪɴɢ ᴅᴏᴡɴ ᴡᴇʙ ꜱᴇʀᴠᴇʀ…")
+        if warm_task:
+            warm_task.cancel()
+        supervisor_task.cancel()
+        predictive_warmer.cancel_all()
+        file_materializer.cancel_all()
         await runner.cleanup()
+        await disk_cache.close()
         logger.info("🛑  ᴄʟᴏꜱɪɴɢ ᴅᴀᴛᴀʙᴀꜱᴇ…")
         await database.close()
         logger.info("🛑  ꜱᴛᴏᴘᴘɪɴɢ ʙᴏᴛ…")
+        for worker in workers:
+            await worker.stop()
         await bot.stop()
         logger.info("✅  ꜱʜᴜᴛᴅᴏᴡɴ ᴄᴏᴍᴘʟᴇᴛᴇ")
 
@@ -0,0 +1,135 @@
+import asyncio
+import gc
+
+from helper import buffers
+from helper.buffers import BufferBudget
+
+MB = 1024 * 1024
+
+
+async def _idle():
+    await asyncio.sleep(10)
+
+
+def _bound(budget, nbytes):
+    """A fetch task holding ``nbytes`` of ``budget``."""
+    task = asyncio.ensure_future(_idle())
+    budget.bind(task, nbytes)
+    return task
+
+
+def test_reserve_and_release():
+    async def main():
+        budget = BufferBudget(4 * MB)
+        await budget.reserve(MB)
+        task = _bound(budget, MB)
+        assert budget.used == MB and budget.stats()["parts"] == 1
+
+        budget.release(task)
+        budget.release(task)  # a second release is a no-op
+        budget.release(None)
+        task.cancel()
+        return budget
+
+    budget = asyncio.run(main())
+    assert budget.used == 0 and budget.peak == MB
+
+
+def test_collected_task_releases_its_share():
+    async def main():
+        budget = BufferBudget(4 * MB)
+        await budget.reserve(MB)
+        task = _bound(budget, MB)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        del task
+        await asyncio.sleep(0)  # let the loop drop its done-callback handles
+        gc.collect()
+        return budget.used
+
+    assert asyncio.run(main()) == 0
+
+
+def test_read_ahead_leaves_headroom():
+    async def main():
+        budget = BufferBudget(10 * MB)
+        granted = 0
+        while budget.try_reserve(MB):
+            granted += 1
+        # The last 20 % is kept for parts a viewer is blocked on.
+        await asyncio.wait_for(budget.reserve(MB), 0.1)
+        return granted, budget
+
+    granted, budget = asyncio.run(main())
+    assert granted == 8 and budget.used == 9 * MB and budget.prefetch_denied == 1
+
+
+def test_waiters_are_served_in_order_as_space_frees():
+    async def main():
+        budget = BufferBudget(2 * MB)
+        await budget.reserve(MB)
+        holder = _bound(budget, MB)
+        await budget.reserve(MB)
+        other = _bound(budget, MB)
+
+        order = []
+
+        async def wait(label):
+            await budget.reserve(MB)
+            order.append(label)
+
+        waiters = [asyncio.create_task(wait(label)) for label in ("first", "second")]
+        await asyncio.sleep(0)
+        assert budget.stats()["waiting"] == 2
+        assert not budget.try_reserve(1)  # read-ahead never overtakes a waiter
+
+        budget.release(holder)
+        await asyncio.sleep(0.01)
+        assert order == ["first"]
+        budget.release(other)
+        await asyncio.gather(*waiters)
+        holder.cancel()
+        other.cancel()
+        return order, budget.used
+
+    assert asyncio.run(main()) == (["first", "second"], 2 * MB)
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def main():
+        budget = BufferBudget(MB)
+        await budget.reserve(MB)
+        waiter = asyncio.create_task(budget.reserve(MB))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        return budget.stats()
+
+    stats = asyncio.run(main())
+    assert stats["waiting"] == 0 and stats["used"] == MB
+
+
+def test_long_wait_is_let_through_over_budget(monkeypatch):
+    monkeypatch.setattr(buffers, "_MAX_WAIT", 0.05)
+
+    async def main():
+        budget = BufferBudget(MB)
+        await budget.reserve(MB)
+        await budget.reserve(MB)
+        return budget.stats()
+
+    stats = asyncio.run(main())
+    assert stats["overcommits"] == 1 and stats["used"] == 2 * MB and stats["waiting"] == 0
+
+
+def test_disabled_budget_is_a_no_op():
+    async def main():
+        budget = BufferBudget(0)
+        await budget.reserve(100 * MB)
+        assert budget.try_reserve(100 * MB)
+        task = _bound(budget, 100 * MB)
+        budget.release(task)
+        task.cancel()
+        return budget.used
+
+    assert asyncio.run(main()) == 0
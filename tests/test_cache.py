@@ -0,0 +1,215 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from helper import cache
+from helper.cache import DiskChunkCache, MemoryChunkCache
+
+PART  = 1000
+MEDIA = 42
+
+
+def _part(n):
+    return bytes([n]) * PART
+
+
+def _files(root):
+    return sorted(
+        os.path.relpath(os.path.join(dirpath, fn), root).replace(os.sep, "/")
+        for dirpath, _, filenames in os.walk(root)
+        for fn in filenames
+    )
+
+
+def _run(disk, coro):
+    async def main():
+        try:
+            return await coro
+        finally:
+            await disk.close()
+
+    return asyncio.run(main())
+
+
+def test_put_then_get(tmp_path):
+    disk = DiskChunkCache(str(tmp_path), 10 * PART)
+
+    async def main():
+        assert await disk.get(MEDIA, 0) is None
+        await disk.put(MEDIA, 0, _part(1))
+        return await disk.get(MEDIA, 0)
+
+    assert _run(disk, main()) == _part(1)
+    assert disk.has(MEDIA, 0) and disk.stats()["hits"] == 1 and disk.stats()["misses"] == 1
+    assert _files(tmp_path) == ["42/0.part", "index.json"]
+
+
+def test_failed_write_leaves_nothing_behind(tmp_path, monkeypatch):
+    disk = DiskChunkCache(str(tmp_path), 10 * PART)
+
+    def broken_fsync(fd):
+        raise OSError("disk full")
+
+    async def main():
+        await disk.get(MEDIA, 0)  # load the index before breaking fsync
+        monkeypatch.setattr(cache.os, "fsync", broken_fsync)
+        await disk.put(MEDIA, 0, _part(1))
+
+    _run(disk, main())
+    assert not disk.has(MEDIA, 0)
+    assert "42/0.part" not in _files(tmp_path)
+    assert not any(name.endswith(".tmp") for name in _files(tmp_path))
+
+
+def test_least_recently_used_parts_are_evicted(tmp_path):
+    disk = DiskChunkCache(str(tmp_path), 3 * PART)
+
+    async def main():
+        for n in range(3):
+            await disk.put(MEDIA, n, _part(n))
+        await disk.get(MEDIA, 0)
+        await disk.put(MEDIA, 3, _part(3))
+
+    _run(disk, main())
+    assert [disk.has(MEDIA, n) for n in range(4)] == [True, False, True, True]
+    assert disk.stats()["size"] == 3 * PART
+    assert "42/1.part" not in _files(tmp_path)
+
+
+def test_oversized_part_is_not_cached(tmp_path):
+    disk = DiskChunkCache(str(tmp_path), PART - 1)
+    _run(disk, disk.put(MEDIA, 0, _part(0)))
+    assert not disk.has(MEDIA, 0)
+
+
+def test_restart_reconciles_index_with_directory(tmp_path):
+    disk = DiskChunkCache(str(tmp_path), 10 * PART)
+
+    async def fill():
+        for n in range(3):
+            await disk.put(MEDIA, n, _part(n))
+        await disk.get(MEDIA, 0)
+
+    _run(disk, fill())
+    with open(tmp_path / "index.json") as fh:
+        assert [name for name, _ in json.load(fh)] == ["42/1", "42/2", "42/0"]
+
+    # After the last flush: one part lost, one written, one torn temp file.
+    os.remove(tmp_path / "42" / "2.part")
+    (tmp_path / "42" / "7.part").write_bytes(_part(7))
+    (tmp_path / "42" / "8.part.123.tmp").write_bytes(b"torn")
+
+    restarted = DiskChunkCache(str(tmp_path), 10 * PART)
+    assert _run(restarted, restarted.get(MEDIA, 1)) == _part(1)
+    assert list(restarted._index) == ["42/0", "42/7", "42/1"]
+    assert restarted.stats()["size"] == 3 * PART
+    assert not any(name.endswith(".tmp") for name in _files(tmp_path))
+
+
+def test_restart_with_smaller_budget_evicts_oldest(tmp_path):
+    disk = DiskChunkCache(str(tmp_path), 10 * PART)
+
+    async def fill():
+        for n in range(4):
+            await disk.put(MEDIA, n, _part(n))
+
+    _run(disk, fill())
+
+    smaller = DiskChunkCache(str(tmp_path), 2 * PART)
+    _run(smaller, smaller.get(MEDIA, 3))
+    assert [smaller.has(MEDIA, n) for n in range(4)] == [False, False, True, True]
+    assert _files(tmp_path) == ["42/2.part", "42/3.part", "index.json"]
+
+
+def test_unreadable_index_is_rebuilt(tmp_path):
+    (tmp_path / "42").mkdir()
+    (tmp_path / "42" / "0.part").write_bytes(_part(0))
+    (tmp_path / "index.json").write_text("{not json")
+
+    disk = DiskChunkCache(str(tmp_path), 10 * PART)
+    assert _run(disk, disk.get(MEDIA, 0)) == _part(0)
+
+
+@pytest.mark.parametrize("max_bytes", [0, -1])
+def test_disabled_cache_touches_nothing(tmp_path, max_bytes):
+    disk = DiskChunkCache(str(tmp_path / "chunks"), max_bytes)
+
+    async def main():
+        await disk.put(MEDIA, 0, _part(0))
+        return await disk.get(MEDIA, 0)
+
+    assert _run(disk, main()) is None
+    assert not (tmp_path / "chunks").exists()
+
+
+def test_concurrent_viewers_share_one_fetch():
+    memory = MemoryChunkCache(10 * PART)
+    calls  = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return _part(1)
+
+    async def main():
+        results = await asyncio.gather(*(memory.get_or_fetch((MEDIA, 0), fetch) for _ in range(5)))
+        again   = await memory.get_or_fetch((MEDIA, 0), fetch)
+        return results, again
+
+    results, again = asyncio.run(main())
+    assert results == [_part(1)] * 5 and again == _part(1)
+    assert len(calls) == 1
+    assert memory.stats()["coalesced"] == 4 and memory.stats()["hits"] == 1
+
+
+def test_failed_fetch_reaches_every_joiner_and_is_not_cached():
+    memory = MemoryChunkCache(10 * PART)
+    calls  = []
+
+    async def failing():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise OSError("session died")
+
+    async def main():
+        results = await asyncio.gather(
+            *(memory.get_or_fetch((MEDIA, 0), failing) for _ in range(3)),
+            return_exceptions=True,
+        )
+        retried = await memory.get_or_fetch((MEDIA, 0), lambda: asyncio.sleep(0, _part(2)))
+        return results, retried
+
+    results, retried = asyncio.run(main())
+    assert len(calls) == 1
+    assert all(isinstance(r, OSError) for r in results)
+    assert retried == _part(2) and memory.stats()["inflight"] == 0
+
+
+def test_cancelled_viewer_does_not_cancel_the_shared_fetch():
+    memory = MemoryChunkCache(10 * PART)
+
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return _part(1)
+
+    async def main():
+        first  = asyncio.create_task(memory.get_or_fetch((MEDIA, 0), fetch))
+        second = asyncio.create_task(memory.get_or_fetch((MEDIA, 0), fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == _part(1)
+    assert memory.get((MEDIA, 0)) == _part(1)
+
+
+def test_memory_cache_evicts_least_recently_used():
+    memory = MemoryChunkCache(2 * PART)
+    memory.put((MEDIA, 0), _part(0))
+    memory.put((MEDIA, 1), _part(1))
+    memory.get((MEDIA, 0))
+    memory.put((MEDIA, 2), _part(2))
+    assert [memory.has((MEDIA, n)) for n in range(3)] == [True, False, True]
+    assert memory.stats()["size"] == 2 * PART
@@ -0,0 +1,176 @@
+import asyncio
+import os
+from hashlib import sha256
+from types import SimpleNamespace
+
+import pytest
+from pyrogram import raw
+from pyrogram.crypto import aes
+from pyrogram.errors import CDNFileHashMismatch
+
+from helper.cdn import HASH_BLOCK, CdnFetcher
+from helper.stream import ByteStreamer, Priority
+
+CDN_DC = 203
+TOKEN  = b"file-token"
+KEY    = os.urandom(32)
+IV     = os.urandom(16)
+DATA   = os.urandom(4 * HASH_BLOCK)
+HASHES = [
+    raw.types.FileHash(offset=offset, limit=HASH_BLOCK, hash=sha256(DATA[offset:offset + HASH_BLOCK]).digest())
+    for offset in range(0, len(DATA), HASH_BLOCK)
+]
+
+
+def _encrypt(offset: int, data: bytes) -> bytes:
+    return aes.ctr256_encrypt(data, KEY, bytearray(IV[:-4] + (offset // 16).to_bytes(4, "big")))
+
+
+class OriginSession:
+    """The file's home DC: redirects to the CDN and hands out hashes."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def invoke(self, query):
+        self.calls.append(type(query).__name__)
+        if isinstance(query, raw.functions.upload.GetFile):
+            return raw.types.upload.FileCdnRedirect(
+                dc_id=CDN_DC,
+                file_token=TOKEN,
+                encryption_key=KEY,
+                encryption_iv=IV,
+                file_hashes=HASHES[:1],
+            )
+        if isinstance(query, raw.functions.upload.ReuploadCdnFile):
+            return HASHES
+        if isinstance(query, raw.functions.upload.GetCdnFileHashes):
+            return [h for h in HASHES if h.offset >= query.offset][:2]
+        raise NotImplementedError(query)
+
+
+class CdnSession:
+    """The CDN DC: serves encrypted bytes, optionally after a reupload."""
+
+    def __init__(self, reupload_once=(), corrupt=False, fail=()):
+        self.reupload = set(reupload_once)
+        self.corrupt  = corrupt
+        self.fail     = list(fail)
+        self.calls    = []
+
+    async def invoke(self, query):
+        assert isinstance(query, raw.functions.upload.GetCdnFile)
+        if self.fail:
+            raise self.fail.pop(0)
+        assert query.file_token == TOKEN
+        self.calls.append((query.offset, query.limit))
+        if query.offset in self.reupload:
+            self.reupload.discard(query.offset)
+            return raw.types.upload.CdnFileReuploadNeeded(request_token=b"request")
+        data = DATA[query.offset:query.offset + query.limit]
+        if self.corrupt:
+            data = bytes([data[0] ^ 0xFF]) + data[1:]
+        return raw.types.upload.CdnFile(bytes=_encrypt(query.offset, data))
+
+
+def _client(cdn_session):
+    return SimpleNamespace(media_sessions={CDN_DC: cdn_session})
+
+
+def _fetch_part(streamer, origin, offset, limit):
+    file_id = SimpleNamespace(media_id=42, dc_id=2)
+    return streamer._fetch_part(file_id, origin, None, offset, limit, "1/1", Priority.PLAYBACK)
+
+
+def test_redirect_is_followed_decrypted_and_remembered():
+    async def main():
+        cdn      = CdnSession()
+        origin   = OriginSession()
+        streamer = ByteStreamer(_client(cdn))
+        first    = await _fetch_part(streamer, origin, 0, 2 * HASH_BLOCK)
+        second   = await _fetch_part(streamer, origin, 2 * HASH_BLOCK, 2 * HASH_BLOCK)
+        return first, second, origin.calls, streamer.cdn.stats()
+
+    first, second, origin_calls, stats = asyncio.run(main())
+    assert first == DATA[:2 * HASH_BLOCK]
+    assert second == DATA[2 * HASH_BLOCK:]
+    # One GetFile for the redirect; later parts go straight to the CDN.
+    assert origin_calls.count("GetFile") == 1
+    assert "GetCdnFileHashes" in origin_calls
+    assert stats["redirected_files"] == 1 and stats["parts"] == 2
+
+
+def test_reupload_needed_asks_the_origin_and_retries():
+    async def main():
+        cdn      = CdnSession(reupload_once={HASH_BLOCK})
+        origin   = OriginSession()
+        fetcher  = CdnFetcher(_client(cdn))
+        redirect = await origin.invoke(raw.functions.upload.GetFile(location=None, offset=0, limit=0))
+        fetcher.remember(42, redirect)
+        data = await fetcher.fetch(origin, redirect, HASH_BLOCK, HASH_BLOCK)
+        return data, origin.calls, cdn.calls, fetcher.reuploads
+
+    data, origin_calls, cdn_calls, reuploads = asyncio.run(main())
+    assert data == DATA[HASH_BLOCK:2 * HASH_BLOCK]
+    assert reuploads == 1 and "ReuploadCdnFile" in origin_calls
+    assert cdn_calls == [(HASH_BLOCK, HASH_BLOCK)] * 2
+    # ReuploadCdnFile returned every hash, so none had to be requested.
+    assert "GetCdnFileHashes" not in origin_calls
+
+
+def test_small_part_is_verified_as_a_whole_block():
+    async def main():
+        cdn      = CdnSession()
+        origin   = OriginSession()
+        streamer = ByteStreamer(_client(cdn))
+        data     = await _fetch_part(streamer, origin, HASH_BLOCK + 4096, 4096)
+        return data, cdn.calls
+
+    data, cdn_calls = asyncio.run(main())
+    assert data == DATA[HASH_BLOCK + 4096:HASH_BLOCK + 8192]
+    assert cdn_calls == [(HASH_BLOCK, HASH_BLOCK)]
+
+
+def test_hash_mismatch_raises():
+    async def main():
+        cdn      = CdnSession(corrupt=True)
+        origin   = OriginSession()
+        streamer = ByteStreamer(_client(cdn))
+        await _fetch_part(streamer, origin, 0, HASH_BLOCK)
+
+    with pytest.raises(CDNFileHashMismatch):
+        asyncio.run(main())
+
+
+def test_failing_redirect_is_forgotten():
+    async def main():
+        cdn      = CdnSession(fail=[KeyError(CDN_DC)])
+        origin   = OriginSession()
+        streamer = ByteStreamer(_client(cdn))
+        with pytest.raises(KeyError):
+            await _fetch_part(streamer, origin, 0, HASH_BLOCK)
+        redirects = dict(streamer.cdn.redirects)
+        # The next part asks the origin DC again instead of failing the same way.
+        data = await _fetch_part(streamer, origin, 0, HASH_BLOCK)
+        return redirects, data, origin.calls
+
+    redirects, data, origin_calls = asyncio.run(main())
+    assert redirects == {}
+    assert data == DATA[:HASH_BLOCK]
+    assert origin_calls.count("GetFile") == 2
+
+
+def test_remembered_redirect_falls_back_to_the_origin_on_any_error():
+    async def main():
+        cdn      = CdnSession()
+        origin   = OriginSession()
+        streamer = ByteStreamer(_client(cdn))
+        await _fetch_part(streamer, origin, 0, HASH_BLOCK)
+        cdn.fail = [OSError("connection reset")]
+        data = await _fetch_part(streamer, origin, HASH_BLOCK, HASH_BLOCK)
+        return data, origin.calls, streamer.cdn.stats()
+
+    data, origin_calls, stats = asyncio.run(main())
+    assert data == DATA[HASH_BLOCK:2 * HASH_BLOCK]
+    assert origin_calls.count("GetFile") == 2
+    assert stats["redirected_files"] == 1
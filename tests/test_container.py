@@ -0,0 +1,204 @@
+import asyncio
+
+import pytest
+
+from helper.container import locate_fragments, locate_index
+
+CUES_ID = 0x1C53BB6B
+
+
+def _reader(data, reads=None):
+    async def read(offset, length):
+        if reads is not None:
+            reads.append((offset, length))
+        return data[offset:offset + length]
+    return read
+
+
+def _locate(data, reads=None):
+    return asyncio.run(locate_index(_reader(data, reads), len(data)))
+
+
+# ── MP4 ───────────────────────────────────────────────────────────────────────
+
+def box(kind, payload=b""):
+    return (8 + len(payload)).to_bytes(4, "big") + kind + payload
+
+
+def large_box(kind, payload):
+    """A box with a 64-bit ``largesize`` header."""
+    return (1).to_bytes(4, "big") + kind + (16 + len(payload)).to_bytes(8, "big") + payload
+
+
+FTYP = box(b"ftyp", b"isom\x00\x00\x02\x00isomiso2mp41")
+MOOV = box(b"moov", box(b"mvhd", bytes(100)) + box(b"trak", bytes(300)))
+MDAT = box(b"mdat", bytes(5000))
+
+
+def test_faststart_mp4():
+    data  = FTYP + MOOV + MDAT
+    start = len(FTYP)
+    assert _locate(data) == [(start, start + len(MOOV) - 1)]
+
+
+def test_moov_at_the_end_is_found_without_reading_mdat():
+    data  = FTYP + box(b"free") + MDAT + MOOV
+    reads = []
+    start = len(data) - len(MOOV)
+    assert _locate(data, reads) == [(start, len(data) - 1)]
+    assert all(length <= 16 for _, length in reads)
+
+
+def test_large_size_mdat_is_skipped():
+    data  = FTYP + large_box(b"mdat", bytes(3000)) + MOOV
+    start = len(data) - len(MOOV)
+    assert _locate(data) == [(start, len(data) - 1)]
+
+
+def test_box_running_to_end_of_file():
+    # size 0 means "until the end of the file".
+    data  = FTYP + MDAT + (0).to_bytes(4, "big") + b"moov" + bytes(200)
+    start = len(FTYP) + len(MDAT)
+    assert _locate(data) == [(start, len(data) - 1)]
+
+
+def test_truncated_moov_is_clamped_to_the_file():
+    data  = FTYP + MDAT + MOOV[:-10]
+    start = len(FTYP) + len(MDAT)
+    assert _locate(data) == [(start, len(data) - 1)]
+
+
+@pytest.mark.parametrize("data", [
+    FTYP + MDAT,
+    FTYP + (4).to_bytes(4, "big") + b"mdat" + MOOV,
+    b"RIFF\x00\x00\x00\x00AVI LIST" + bytes(100),
+    b"",
+], ids=["no-moov", "corrupt-box-size", "not-a-container", "empty"])
+def test_unusable_files_have_no_index(data):
+    assert _locate(data) == []
+
+
+# ── Matroska / WebM ───────────────────────────────────────────────────────────
+
+def _vint(n):
+    return bytes([0x80 | n]) if n < 0x7F else b"\x01" + n.to_bytes(7, "big")
+
+
+def element(element_id, payload=b""):
+    return element_id.to_bytes((element_id.bit_length() + 7) // 8, "big") + _vint(len(payload)) + payload
+
+
+UNKNOWN_SIZE = b"\x01\xff\xff\xff\xff\xff\xff\xff"
+EBML         = element(0x1A45DFA3, element(0x4282, b"webm"))
+INFO         = element(0x1549A966, element(0x2AD7B1, (1000000).to_bytes(3, "big")))
+CLUSTER      = element(0x1F43B675, bytes(3000))
+CUES         = element(CUES_ID, element(0xBB, element(0xB3, b"\x00") + element(0xB7, bytes(6))) * 20)
+
+
+def _seek_head(position):
+    seek = element(0x53AB, CUES_ID.to_bytes(4, "big")) + element(0x53AC, position.to_bytes(4, "big"))
+    return element(0x114D9B74, element(0x4DBB, seek))
+
+
+def _segment(children, known_size=True):
+    body = b"".join(children)
+    if known_size:
+        return element(0x18538067, body)
+    return (0x18538067).to_bytes(4, "big") + UNKNOWN_SIZE + body
+
+
+@pytest.mark.parametrize("known_size", [True, False])
+def test_cues_found_through_the_seek_head(known_size):
+    # SeekPosition counts from the start of the Segment's data.
+    position = len(_seek_head(0)) + len(INFO) + len(CLUSTER)
+    children = [_seek_head(position), INFO, CLUSTER, CUES]
+    data     = EBML + _segment(children, known_size)
+
+    start = len(data) - len(b"".join(children)) + position
+    assert _locate(data) == [(start, start + len(CUES) - 1)]
+    assert data[start:start + 4] == CUES_ID.to_bytes(4, "big")
+
+
+def test_cues_ahead_of_the_clusters():
+    data  = EBML + _segment([INFO, CUES, CLUSTER])
+    start = data.index(CUES)
+    assert _locate(data) == [(start, start + len(CUES) - 1)]
+
+
+@pytest.mark.parametrize("children", [
+    [INFO, CLUSTER],
+    [_seek_head(10 ** 6), INFO, CLUSTER],
+    [_seek_head(0), INFO, CLUSTER],
+], ids=["no-cues", "seek-past-the-end", "seek-to-another-element"])
+def test_mkv_without_usable_cues(children):
+    assert _locate(EBML + _segment(children)) == []
+
+
+def test_mkv_garbage_after_the_header():
+    assert _locate(EBML + b"\x00" * 64) == []
+
+
+# ── Fragmented MP4 ────────────────────────────────────────────────────────────
+
+TIMESCALE = 1000
+
+
+def sidx(references, version=0, first_offset=0):
+    """A sidx box; ``references`` are (size, duration, is_sidx) triples."""
+    payload  = bytes([version, 0, 0, 0]) + (1).to_bytes(4, "big") + TIMESCALE.to_bytes(4, "big")
+    width    = 4 if version == 0 else 8
+    payload += (0).to_bytes(width, "big") + first_offset.to_bytes(width, "big")
+    payload += (0).to_bytes(2, "big") + len(references).to_bytes(2, "big")
+    for size, duration, is_sidx in references:
+        payload += ((is_sidx << 31) | size).to_bytes(4, "big")
+        payload += duration.to_bytes(4, "big") + (0x90000000).to_bytes(4, "big")
+    return box(b"sidx", payload)
+
+
+def fragment(n):
+    return box(b"moof", bytes(40 + n)) + box(b"mdat", bytes(700 + 10 * n))
+
+
+FRAGMENTS = [fragment(n) for n in range(4)]
+
+
+def _fragmented(version=0, references=None, gap=b""):
+    refs = references or [(len(f), 2000 + n, 0) for n, f in enumerate(FRAGMENTS)]
+    return FTYP + MOOV + sidx(refs, version, len(gap)) + gap + b"".join(FRAGMENTS)
+
+
+def _fragments(data):
+    return asyncio.run(locate_fragments(_reader(data), len(data)))
+
+
+@pytest.mark.parametrize("version", [0, 1])
+def test_sidx_fragments(version):
+    data            = _fragmented(version)
+    init, fragments = _fragments(data)
+
+    assert init == (0, len(FTYP) + len(MOOV) - 1)
+    assert [offset for offset, _, _ in fragments] == [data.index(f) for f in FRAGMENTS]
+    assert [size for _, size, _ in fragments] == [len(f) for f in FRAGMENTS]
+    assert [duration for _, _, duration in fragments] == [2.0, 2.001, 2.002, 2.003]
+
+
+def test_sidx_first_offset_skips_bytes_after_the_box():
+    data         = _fragmented(gap=box(b"free", bytes(20)))
+    _, fragments = _fragments(data)
+    assert fragments[0][0] == data.index(FRAGMENTS[0])
+
+
+@pytest.mark.parametrize("data", [
+    FTYP + MOOV + MDAT,
+    FTYP + MOOV + b"".join(FRAGMENTS),
+    FTYP + MOOV + FRAGMENTS[0] + sidx([(len(FRAGMENTS[1]), 1000, 0)]) + FRAGMENTS[1],
+    FTYP + sidx([(100, 1000, 0)]) + MOOV,
+    _fragmented(references=[(1000, 1000, 1)]),
+    _fragmented(references=[(10 ** 6, 1000, 0)]),
+    EBML + _segment([INFO, CUES, CLUSTER]),
+], ids=[
+    "progressive", "no-sidx", "sidx-after-first-fragment", "sidx-before-moov",
+    "nested-sidx", "fragments-past-the-end", "matroska",
+])
+def test_files_that_cannot_be_offered_as_hls(data):
+    assert _fragments(data) is None
@@ -0,0 +1,73 @@
+import asyncio
+
+from helper.hedging import Hedger
+from helper.sessions import MediaSessionPool
+
+DC = 2
+
+
+class StubSession:
+    """Answers every call with its own name after ``delay`` seconds."""
+
+    def __init__(self, name, delay):
+        self.name  = name
+        self.delay = delay
+
+    async def invoke(self, query):
+        await asyncio.sleep(self.delay)
+        return self.name
+
+    async def stop(self):
+        pass
+
+
+def _pool(*sessions):
+    pool = MediaSessionPool(DC, None, len(sessions))
+    for session in sessions:
+        pool.adopt(session)
+    return pool
+
+
+def _hedger(budget=0.1, samples=32):
+    hedger = Hedger(percentile=95, budget=budget, min_delay=0.005)
+    for _ in range(samples):
+        hedger._record(DC, 0.001)
+    return hedger
+
+
+def test_slow_call_is_hedged_to_another_session():
+    hedger = _hedger()
+
+    async def main():
+        pool = _pool(StubSession("slow", 1), StubSession("fast", 0))
+        return await hedger.invoke(pool, None, DC)
+
+    assert asyncio.run(main()) == "fast"
+    assert hedger.hedged == 1 and hedger.hedge_wins == 1
+
+
+def test_hedges_stay_within_the_token_budget():
+    hedger = _hedger(budget=0.1)
+
+    async def main():
+        pool = _pool(StubSession("a", 0.02), StubSession("b", 0.02))
+        for _ in range(10):
+            await hedger.invoke(pool, None, DC)
+
+    asyncio.run(main())
+    # One banked token, then one more earned by ten calls at 10 % each.
+    assert hedger.calls == 10
+    assert hedger.hedged == 2 and hedger.over_budget == 8
+
+
+def test_no_hedging_before_enough_samples():
+    hedger = _hedger(samples=31)
+
+    assert hedger.deadline(DC) is None
+
+    async def main():
+        pool = _pool(StubSession("slow", 0.02), StubSession("fast", 0))
+        return await hedger.invoke(pool, None, DC)
+
+    assert asyncio.run(main()) == "slow"
+    assert hedger.hedged == 0
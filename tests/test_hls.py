@@ -0,0 +1,91 @@
+import asyncio
+from types import SimpleNamespace
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from app import build_app
+from config import Config
+from helper.hls import group_fragments, hls_indexes, render_playlist
+
+URL   = "https://example.com/stream/abc"
+INIT  = (0, 1199)
+FRAGS = [(1200, 5000, 2.0), (6200, 4000, 2.0), (10200, 6000, 2.5), (16200, 3000, 1.0)]
+
+
+def test_fragments_are_grouped_up_to_the_target():
+    assert group_fragments(FRAGS, 4.0) == [(1200, 9000, 4.0), (10200, 9000, 3.5)]
+    assert group_fragments(FRAGS, 0.5) == FRAGS
+
+
+def test_playlist_uses_byte_ranges_of_the_stream_url():
+    lines = render_playlist((INIT, FRAGS), URL, 4.0).splitlines()
+    assert lines == [
+        "#EXTM3U",
+        "#EXT-X-VERSION:7",
+        "#EXT-X-TARGETDURATION:4",
+        "#EXT-X-MEDIA-SEQUENCE:0",
+        "#EXT-X-PLAYLIST-TYPE:VOD",
+        "#EXT-X-INDEPENDENT-SEGMENTS",
+        f'#EXT-X-MAP:URI="{URL}",BYTERANGE="1200@0"',
+        "#EXTINF:4.000,",
+        "#EXT-X-BYTERANGE:9000@1200",
+        URL,
+        "#EXTINF:3.500,",
+        "#EXT-X-BYTERANGE:9000@10200",
+        URL,
+        "#EXT-X-ENDLIST",
+    ]
+
+
+def test_target_duration_rounds_the_longest_segment_up():
+    playlist = render_playlist((INIT, [(1200, 100, 6.2), (1300, 100, 3.0)]), URL, 1.0)
+    assert "#EXT-X-TARGETDURATION:7" in playlist
+
+
+# ── /hls/{file_hash}/index.m3u8 ───────────────────────────────────────────────
+
+# A progressive MP4: ftyp, moov and a single mdat — no fragments to offer.
+PROGRESSIVE = (
+    (16).to_bytes(4, "big") + b"ftypisom" + bytes(4)
+    + (16).to_bytes(4, "big") + b"moov" + bytes(8)
+    + (1000).to_bytes(4, "big") + b"mdat" + bytes(992)
+)
+
+
+class StubDatabase:
+    async def get_file_by_hash(self, file_hash):
+        return {"file_id": file_hash, "file_size": len(PROGRESSIVE), "message_id": 1}
+
+
+async def _get(path):
+    app      = build_app(SimpleNamespace(name="bot", me=None, media_sessions={}), StubDatabase())
+    streamer = app["streaming_service"].streamer
+
+    async def get_file_properties(message_id):
+        return SimpleNamespace(media_id=1, dc_id=2)
+
+    async def read_range(file_id, offset, until, message_id, priority, flow):
+        return PROGRESSIVE[offset:until + 1]
+
+    streamer.get_file_properties = get_file_properties
+    streamer.read_range          = read_range
+    async with TestClient(TestServer(app)) as client:
+        # A fixed Host keeps the playlist URLs independent of the test port.
+        response = await client.get(path, headers={"Host": "example.com"})
+        return response.status, response.content_type, await response.text()
+
+
+def test_non_fragmented_file_is_unsupported():
+    status, _, _ = asyncio.run(_get("/hls/hls-progressive/index.m3u8"))
+    assert status == 415
+    # The negative answer is kept, so polling players don't re-read the file.
+    assert "hls-progressive" in hls_indexes and hls_indexes.get("hls-progressive") is None
+
+
+def test_playlist_route():
+    hls_indexes.put("hls-fragmented", (INIT, FRAGS))
+    status, content_type, text = asyncio.run(_get("/hls/hls-fragmented/index.m3u8"))
+    assert status == 200
+    assert content_type == "application/vnd.apple.mpegurl"
+    url = "http://example.com/stream/hls-fragmented"
+    assert text == render_playlist((INIT, FRAGS), url, Config.HLS_SEGMENT_DURATION)
@@ -0,0 +1,77 @@
+import asyncio
+import json
+
+from helper.materialize import FileMaterializer
+
+SIZE = 1000
+
+
+class StubService:
+    """Streams ``file_size`` bytes of ``fill`` in two chunks."""
+
+    async def iter_file(self, file_data):
+        data = bytes([file_data["fill"]]) * file_data["file_size"]
+        yield data[:SIZE // 2]
+        yield data[SIZE // 2:]
+
+
+def _file(name, fill=1):
+    return {"file_id": name, "file_size": SIZE, "message_id": 7, "fill": fill}
+
+
+def _materializer(root, max_bytes=SIZE):
+    materializer = FileMaterializer(str(root), max_bytes, threshold=1.0, half_life=3600)
+    materializer.attach(StubService())
+    return materializer
+
+
+async def _settle(materializer):
+    while materializer._tasks:
+        await asyncio.gather(*materializer._tasks.values())
+
+
+def test_popular_file_is_copied_and_served(tmp_path):
+    materializer = _materializer(tmp_path)
+
+    async def main():
+        await materializer.load()
+        assert materializer.touch(_file("a")) is None
+        await _settle(materializer)
+        return materializer.touch(_file("a"))
+
+    path = asyncio.run(main())
+    assert path == str(tmp_path / "a.file")
+    assert (tmp_path / "a.file").read_bytes() == bytes([1]) * SIZE
+    assert json.loads((tmp_path / "a.json").read_text())["size"] == SIZE
+
+
+def test_more_popular_newcomer_evicts_the_old_copy(tmp_path):
+    materializer = _materializer(tmp_path)
+
+    async def main():
+        await materializer.load()
+        materializer.touch(_file("a"))
+        await _settle(materializer)
+        for _ in range(3):
+            materializer.touch(_file("b", fill=2))
+        await _settle(materializer)
+
+    asyncio.run(main())
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["b.file", "b.json"]
+    assert materializer.stats()["evicted"] == 1 and materializer.stats()["files"] == 1
+
+
+def test_less_popular_newcomer_is_skipped(tmp_path):
+    materializer = _materializer(tmp_path)
+
+    async def main():
+        await materializer.load()
+        for _ in range(3):
+            materializer.touch(_file("a"))
+        await _settle(materializer)
+        materializer.touch(_file("b", fill=2))
+        await _settle(materializer)
+
+    asyncio.run(main())
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.file", "a.json"]
+    assert materializer.stats()["evicted"] == 0
@@ -0,0 +1,19 @@
+import pytest
+
+from helper.stream import CHUNK_SIZE, _part_span
+
+
+@pytest.mark.parametrize("from_bytes, until_bytes", [
+    (0, 0),
+    (0, CHUNK_SIZE - 1),
+    (0, CHUNK_SIZE),
+    (5, 17),
+    (CHUNK_SIZE - 1, CHUNK_SIZE),
+    (3 * CHUNK_SIZE + 12345, 7 * CHUNK_SIZE + 999),
+])
+def test_part_span_covers_range(from_bytes, until_bytes):
+    offset, first_cut, last_cut, count = _part_span(from_bytes, until_bytes)
+    assert offset % CHUNK_SIZE == 0
+    assert offset + first_cut == from_bytes
+    assert offset + (count - 1) * CHUNK_SIZE + last_cut - 1 == until_bytes
+    assert 0 < last_cut <= CHUNK_SIZE
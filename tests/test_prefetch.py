@@ -0,0 +1,60 @@
+import pytest
+
+from helper import prefetch
+from helper.prefetch import PrefetchController
+
+MB = 1024 * 1024
+
+
+def _controller():
+    return PrefetchController(2, 16, MB, "test")
+
+
+def test_starts_at_min_depth_until_both_rates_are_known():
+    controller = _controller()
+    assert controller.depth == 2
+    controller.record_write(10 * MB, 1.0)
+    assert controller.depth == 2
+
+
+def test_depth_covers_one_fetch_round_trip():
+    controller = _controller()
+    controller.record_write(8 * MB, 1.0)
+    controller.record_fetch(0.5)
+    # 8 MB/s for 0.5 s is 4 parts in flight, plus one for jitter.
+    assert controller.depth == 5
+
+
+@pytest.mark.parametrize("drain_rate, fetch_latency, depth", [
+    (100 * MB, 2.0,  16),  # fast client on a slow DC: capped at max_depth
+    (64 * 1024, 0.1, 2),   # slow client: never below min_depth
+])
+def test_depth_is_clamped(drain_rate, fetch_latency, depth):
+    controller = _controller()
+    controller.seed(drain_rate, fetch_latency)
+    assert controller.depth == depth
+
+
+def test_depth_follows_a_client_that_slows_down():
+    controller = _controller()
+    controller.record_fetch(0.5)
+    controller.record_write(16 * MB, 1.0)
+    deep = controller.depth
+    for _ in range(20):
+        controller.record_write(MB, 1.0)
+    assert deep == 9 and controller.depth == 2
+
+
+def test_instant_write_does_not_read_as_infinite_speed():
+    controller = _controller()
+    controller.record_fetch(0.5)
+    controller.record_write(MB, 0.0)
+    assert controller.drain_rate == pytest.approx(MB / 1e-3)
+    assert controller.depth == 16
+
+
+def test_active_streams_are_listed_while_open():
+    with _controller() as controller:
+        assert controller in prefetch._active
+        assert prefetch.active_stream_stats()[0]["stream"] == "test"
+    assert controller not in prefetch._active
@@ -0,0 +1,28 @@
+import pytest
+
+from helper.stream import CHUNK_SIZE, _ramp_parts
+
+
+def _valid_get_file(offset, limit):
+    # upload.getFile: limit a power of two from 4 KB to 1 MB, offset a multiple of it.
+    return limit in {1 << k for k in range(12, 21)} and offset % limit == 0
+
+
+@pytest.mark.parametrize("from_bytes", [0, 1, 4095, 65536 * 3 + 7, CHUNK_SIZE - 1, 2 * CHUNK_SIZE + 1])
+@pytest.mark.parametrize("first_limit", [4096, 65536, 524288])
+def test_ramp_parts_are_contiguous_valid_requests(from_bytes, first_limit):
+    until_bytes = from_bytes + 3 * CHUNK_SIZE
+    parts = _ramp_parts(from_bytes, until_bytes, first_limit)
+
+    assert parts[0][0] <= from_bytes < parts[0][0] + parts[0][1]
+    assert parts[-1][0] <= until_bytes < parts[-1][0] + parts[-1][1]
+    for (offset, limit), (next_offset, _) in zip(parts, parts[1:]):
+        assert offset + limit == next_offset
+    assert all(_valid_get_file(offset, limit) for offset, limit in parts)
+    # Once the ramp reaches a 1 MB boundary, parts are the regular cached ones.
+    full = [i for i, (_, limit) in enumerate(parts) if limit == CHUNK_SIZE]
+    assert full and all(parts[i][1] == CHUNK_SIZE for i in range(full[0], len(parts)))
+
+
+def test_ramp_starts_small():
+    assert _ramp_parts(0, 3 * CHUNK_SIZE, 65536)[:3] == [(0, 65536), (65536, 65536), (131072, 131072)]
@@ -0,0 +1,32 @@
+import pytest
+
+from config import Config
+from helper.stream import _parse_ranges
+
+SIZE = 10_000
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("",                    None),
+    ("items=0-10",          None),
+    ("bytes=",              None),
+    ("bytes=0-99",          [(0, 99)]),
+    ("bytes=100-",          [(100, SIZE - 1)]),
+    ("bytes=-500",          [(SIZE - 500, SIZE - 1)]),
+    ("bytes=-50000",        [(0, SIZE - 1)]),
+    ("bytes=9000-20000",    [(9000, SIZE - 1)]),
+    ("bytes=0-9, 20-29",    [(0, 9), (20, 29)]),
+    ("bytes=20-29,0-9",     [(0, 9), (20, 29)]),
+    ("bytes=0-9,10-19",     [(0, 19)]),
+    ("bytes=0-50,40-60",    [(0, 60)]),
+    ("bytes=20000-30000",   []),
+    ("bytes=50-10",         None),
+    ("bytes=abc-def",       None),
+])
+def test_parse_ranges(header, expected):
+    assert _parse_ranges(header, SIZE) == expected
+
+
+def test_parse_ranges_coalesces_past_max_ranges(monkeypatch):
+    monkeypatch.setattr(Config, "MAX_RANGES", 2)
+    assert _parse_ranges("bytes=0-1,10-11,20-21", SIZE) == [(0, 21)]
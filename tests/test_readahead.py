@@ -0,0 +1,122 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from config import Config
+from helper.readahead import ReadAheadRegistry
+
+PART = 1024 * 1024
+KEY  = "stream:abc:1.2.3.4"
+
+
+@pytest.fixture(autouse=True)
+def ttl(monkeypatch):
+    monkeypatch.setattr(Config, "READAHEAD_TTL", 10)
+
+
+async def _pending():
+    await asyncio.sleep(10)
+
+
+def _tasks(*parts):
+    return {(n * PART, PART): asyncio.create_task(_pending()) for n in parts}
+
+
+def test_follow_up_range_adopts_parked_parts():
+    async def main():
+        registry = ReadAheadRegistry()
+        tasks    = _tasks(3, 4, 5)
+        registry.park(KEY, tasks, SimpleNamespace(drain_rate=5e6, fetch_latency=0.2))
+        taken = registry.adopt(KEY, 3 * PART, PART)
+        return registry, tasks, taken
+
+    registry, tasks, taken = asyncio.run(main())
+    assert taken.tasks == tasks
+    assert (taken.drain_rate, taken.fetch_latency) == (5e6, 0.2)
+    assert registry.stats()["contexts"] == 0 and registry.adopted == 1
+
+
+@pytest.mark.parametrize("offset, adopted", [
+    (PART,      True),   # one part of slack before the window
+    (6 * PART,  True),   # right after the window
+    (7 * PART,  True),
+    (8 * PART,  False),  # a seek elsewhere in the file
+    (0,         False),
+])
+def test_adopt_only_continues_the_window(offset, adopted):
+    async def main():
+        registry = ReadAheadRegistry()
+        registry.park(KEY, _tasks(2, 3, 4, 5))
+        return registry.adopt(KEY, offset, PART)
+
+    assert (asyncio.run(main()) is not None) == adopted
+
+
+def test_other_routes_and_viewers_do_not_adopt():
+    async def main():
+        registry = ReadAheadRegistry()
+        registry.park(KEY, _tasks(0, 1))
+        return (
+            registry.adopt("dl:abc:1.2.3.4", 0, PART),
+            registry.adopt("stream:abc:5.6.7.8", 0, PART),
+            registry.adopt(None, 0, PART),
+        )
+
+    assert asyncio.run(main()) == (None, None, None)
+
+
+def test_parts_before_the_offset_stay_parked():
+    async def main():
+        registry = ReadAheadRegistry()
+        registry.park(KEY, _tasks(2, 3, 4))
+        taken = registry.adopt(KEY, 3 * PART, PART)
+        rest  = registry.adopt(KEY, 2 * PART, PART)
+        return taken, rest
+
+    taken, rest = asyncio.run(main())
+    assert sorted(taken.tasks) == [(3 * PART, PART), (4 * PART, PART)]
+    assert sorted(rest.tasks) == [(2 * PART, PART)]
+
+
+def test_unclaimed_parts_expire(monkeypatch):
+    monkeypatch.setattr(Config, "READAHEAD_TTL", 0.01)
+
+    async def main():
+        registry = ReadAheadRegistry()
+        tasks    = _tasks(0, 1)
+        registry.park(KEY, tasks)
+        await asyncio.sleep(0.05)
+        return registry, tasks
+
+    registry, tasks = asyncio.run(main())
+    assert all(task.cancelled() for task in tasks.values())
+    assert registry.expired == 1 and registry.stats()["contexts"] == 0
+
+
+def test_parking_without_a_key_cancels_the_parts():
+    async def main():
+        registry = ReadAheadRegistry()
+        tasks    = _tasks(0)
+        registry.park(None, tasks)
+        await asyncio.sleep(0)
+        return registry, tasks
+
+    registry, tasks = asyncio.run(main())
+    assert all(task.cancelled() for task in tasks.values())
+    assert registry.parked == 0
+
+
+def test_reparking_a_part_cancels_the_older_fetch():
+    async def main():
+        registry = ReadAheadRegistry()
+        first    = _tasks(0)
+        second   = _tasks(0)
+        registry.park(KEY, first)
+        registry.park(KEY, second)
+        await asyncio.sleep(0)
+        return first, registry.adopt(KEY, 0, PART).tasks, second
+
+    first, adopted, second = asyncio.run(main())
+    assert first[(0, PART)].cancelled()
+    assert adopted == second
@@ -0,0 +1,102 @@
+import asyncio
+
+from helper.scheduler import GetFileScheduler, Priority, SlotTicket
+
+DC = 2
+
+
+async def _queue_behind_busy_slot(scheduler, requests, while_queued=None):
+    """
+    Hold the only slot, queue ``requests`` ((label, priority, flow[, ticket]))
+    and return the order in which they are granted once it is released.
+    """
+    order = []
+
+    async def call(label, priority, flow, ticket=None):
+        async with scheduler.slot(DC, priority, flow, ticket=ticket):
+            order.append(label)
+
+    async with scheduler.slot(DC, Priority.PLAYBACK):
+        tasks = [asyncio.create_task(call(*request)) for request in requests]
+        await asyncio.sleep(0)
+        if while_queued:
+            while_queued()
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_priority_classes_are_served_in_order():
+    async def main():
+        scheduler = GetFileScheduler(1)
+        return await _queue_behind_busy_slot(scheduler, [
+            ("warmup",   Priority.WARMUP,   "w"),
+            ("bulk",     Priority.BULK,     "b"),
+            ("playback", Priority.PLAYBACK, "p"),
+            ("head",     Priority.HEAD,     "h"),
+        ])
+
+    assert asyncio.run(main()) == ["head", "playback", "bulk", "warmup"]
+
+
+def test_flows_share_a_class_fairly():
+    async def main():
+        scheduler = GetFileScheduler(1)
+        greedy    = [(f"a{i}", Priority.BULK, "a") for i in range(4)]
+        return await _queue_behind_busy_slot(scheduler, greedy + [("b0", Priority.BULK, "b")])
+
+    order = asyncio.run(main())
+    # A client with four calls queued doesn't make another wait behind all of them.
+    assert order.index("b0") <= 1
+
+
+def test_raised_ticket_jumps_the_queue():
+    async def main():
+        scheduler = GetFileScheduler(1)
+        ticket    = SlotTicket(Priority.WARMUP)
+        order     = await _queue_behind_busy_slot(
+            scheduler,
+            [
+                ("bulk0",  Priority.BULK,   "b"),
+                ("bulk1",  Priority.BULK,   "c"),
+                ("warmup", Priority.WARMUP, "w", ticket),
+            ],
+            while_queued=lambda: ticket.raise_to(Priority.HEAD),
+        )
+        return order, scheduler.stats()[DC]
+
+    order, stats = asyncio.run(main())
+    assert order == ["warmup", "bulk0", "bulk1"]
+    assert stats["granted"]["head"] == 1 and stats["granted"]["warmup"] == 0
+
+
+def test_ticket_priority_never_drops():
+    ticket = SlotTicket(Priority.PLAYBACK)
+    ticket.raise_to(Priority.WARMUP)
+    assert ticket.priority == Priority.PLAYBACK
+
+
+def test_pause_holds_back_new_calls():
+    async def main():
+        scheduler = GetFileScheduler(4)
+        scheduler.pause(DC, 0.1)
+        loop    = asyncio.get_running_loop()
+        started = loop.time()
+        async with scheduler.slot(DC, Priority.HEAD):
+            return loop.time() - started
+
+    assert asyncio.run(main()) >= 0.09
+
+
+def test_cancelled_waiter_does_not_leak_its_slot():
+    async def main():
+        scheduler = GetFileScheduler(1)
+        async with scheduler.slot(DC):
+            waiter = asyncio.create_task(scheduler.slot(DC).__aenter__())
+            await asyncio.sleep(0)
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+        async with scheduler.slot(DC):
+            return scheduler.stats()[DC]
+
+    stats = asyncio.run(main())
+    assert stats["active"] == 1 and stats["waiting"] == 0
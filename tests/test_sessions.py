@@ -0,0 +1,149 @@
+import asyncio
+from types import SimpleNamespace
+
+from pyrogram.errors import BadRequest
+
+from config import Config
+from helper.sessions import MediaSessionPool
+from helper.stream import ByteStreamer
+
+
+class StubSession:
+    def __init__(self, dc_id):
+        self.dc_id = dc_id
+
+    async def stop(self):
+        pass
+
+
+def _client():
+    return SimpleNamespace(name="test", media_sessions={}, media_sessions_lock=asyncio.Lock())
+
+
+def test_slow_dc_does_not_block_other_dcs(monkeypatch):
+    monkeypatch.setattr(Config, "MEDIA_SESSIONS_PER_DC", 1)
+    slow_dc_open = None
+
+    async def create_media_session(client, dc_id):
+        if dc_id == 4:
+            await slow_dc_open.wait()
+        return StubSession(dc_id)
+
+    async def main():
+        nonlocal slow_dc_open
+        slow_dc_open = asyncio.Event()
+        client   = _client()
+        streamer = ByteStreamer(client)
+        streamer.create_media_session = create_media_session
+
+        slow = asyncio.create_task(streamer.media_pool(client, 4))
+        await asyncio.sleep(0)
+        fast = await asyncio.wait_for(streamer.media_pool(client, 2), 1)
+        assert not slow.done()
+
+        slow_dc_open.set()
+        return client, fast, await slow
+
+    client, fast, slow = asyncio.run(main())
+    assert client.media_sessions == {2: fast, 4: slow}
+    assert fast.sessions[0].session.dc_id == 2 and slow.sessions[0].session.dc_id == 4
+
+
+def test_concurrent_first_viewers_share_one_pool(monkeypatch):
+    monkeypatch.setattr(Config, "MEDIA_SESSIONS_PER_DC", 1)
+    created = []
+
+    async def create_media_session(client, dc_id):
+        await asyncio.sleep(0.01)
+        created.append(dc_id)
+        return StubSession(dc_id)
+
+    async def main():
+        client   = _client()
+        streamer = ByteStreamer(client)
+        streamer.create_media_session = create_media_session
+        return await asyncio.gather(*(streamer.media_pool(client, 2) for _ in range(3)))
+
+    pools = asyncio.run(main())
+    assert created == [2]
+    assert all(pool is pools[0] and isinstance(pool, MediaSessionPool) for pool in pools)
+
+
+class FlakySession:
+    """Fails with a transport error whenever the next outcome is False."""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+
+    async def invoke(self, query):
+        if not self.outcomes.pop(0):
+            raise OSError("connection lost")
+        return "ok"
+
+    async def stop(self):
+        pass
+
+
+def _drive(outcomes):
+    """Run ``outcomes`` through one pooled session and return it."""
+    async def main():
+        pool = MediaSessionPool(2, None, 1)
+        pool.adopt(FlakySession(outcomes))
+        pooled = pool.sessions[0]
+        pooled.on_trip = lambda _: None  # keep the pool from rebuilding it
+        for _ in outcomes:
+            try:
+                await pooled.invoke(None)
+            except OSError:
+                pass
+        return pooled
+
+    return asyncio.run(main())
+
+
+def test_circuit_opens_after_consecutive_errors():
+    pooled = _drive([True, False, False, False])
+    assert pooled.circuit_open and pooled.trip_reason == "3 consecutive errors"
+
+
+def test_circuit_opens_on_error_rate():
+    # Never three failures in a row, but half of the last ten calls fail.
+    pooled = _drive([True, False] * 5)
+    assert pooled.circuit_open and pooled.trip_reason == "error rate 50%"
+
+
+def test_rpc_errors_do_not_count_against_a_session():
+    class RpcFailing(FlakySession):
+        async def invoke(self, query):
+            raise BadRequest()
+
+    async def main():
+        pool = MediaSessionPool(2, None, 1)
+        pool.adopt(RpcFailing([]))
+        for _ in range(5):
+            try:
+                await pool.invoke(None)
+            except BadRequest:
+                pass
+        return pool.sessions[0]
+
+    pooled = asyncio.run(main())
+    assert not pooled.circuit_open and pooled.errors == 5 and pooled.error_rate == 0
+
+
+def test_pick_skips_open_circuits():
+    async def main():
+        pool = MediaSessionPool(2, None, 3)
+        for n in range(3):
+            pool.adopt(StubSession(2))
+        tripped, spare, busy = pool.sessions
+        tripped.circuit_open = True
+        busy.in_flight       = 5
+        first = pool.pick()
+        # With every other session excluded or open, the open one is still used.
+        spare.circuit_open = busy.circuit_open = True
+        return first, pool.pick(exclude=busy), (tripped, spare)
+
+    first, last_resort, (tripped, spare) = asyncio.run(main())
+    assert first is spare
+    assert last_resort is tripped
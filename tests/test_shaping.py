@@ -0,0 +1,54 @@
+import pytest
+
+from helper import shaping
+from helper.shaping import TokenBucket
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(shaping.time, "monotonic", clock)
+    return clock
+
+
+def test_unlimited_never_waits(clock):
+    bucket = TokenBucket()
+    assert bucket.reserve(10 ** 9, 0) == 0.0
+
+
+def test_first_write_after_enabling_uses_the_burst(clock):
+    bucket = TokenBucket()
+    bucket.reserve(1000, 0)
+    assert bucket.reserve(1000, 1000) == 0.0
+    assert bucket.reserve(500, 1000) == pytest.approx(0.5)
+
+
+def test_debt_is_paid_off_over_time(clock):
+    bucket = TokenBucket(1000)
+    assert bucket.reserve(3000, 1000) == pytest.approx(2.0)
+    clock.now += 2.0
+    assert bucket.reserve(0, 1000) == 0.0
+    assert not bucket.idle()
+    clock.now += 1.0
+    assert bucket.idle()
+
+
+def test_burst_is_capped_at_one_second(clock):
+    bucket = TokenBucket(1000)
+    clock.now += 60
+    assert bucket.reserve(1000, 1000) == 0.0
+    assert bucket.reserve(1000, 1000) == pytest.approx(1.0)
+
+
+def test_lowering_the_rate_clamps_banked_tokens(clock):
+    bucket = TokenBucket(1000)
+    assert bucket.reserve(100, 100) == 0.0
+    assert bucket.reserve(100, 100) == pytest.approx(1.0)
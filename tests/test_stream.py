@@ -0,0 +1,137 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from pyrogram import raw
+
+from helper import stream
+from helper.cache import MemoryChunkCache
+from helper.scheduler import GetFileScheduler
+from helper.stream import CHUNK_SIZE, ByteStreamer, Priority
+
+DC   = 2
+DATA = bytes(range(256)) * (2 * CHUNK_SIZE // 256)
+
+
+@pytest.fixture(autouse=True)
+def caches(monkeypatch):
+    """A fresh memory cache and ticket map; the disk cache stays out of the way."""
+    monkeypatch.setattr(stream, "memory_cache", MemoryChunkCache(16 * CHUNK_SIZE))
+    monkeypatch.setattr(stream, "part_tickets", {})
+    monkeypatch.setattr(stream.disk_cache, "enabled", False)
+
+
+class StubSession:
+    """Answers GetFile from ``DATA`` and records the order of the calls."""
+
+    def __init__(self, calls):
+        self.calls = calls
+
+    async def invoke(self, query):
+        self.calls.append(("getfile", query.offset, query.limit))
+        return raw.types.upload.File(
+            type=raw.types.storage.FileUnknown(),
+            mtime=0,
+            bytes=DATA[query.offset:query.offset + query.limit],
+        )
+
+
+def _file_id(media_id=42):
+    return SimpleNamespace(media_id=media_id, dc_id=DC)
+
+
+def _streamer():
+    streamer = ByteStreamer(SimpleNamespace(name="test", media_sessions={}))
+    streamer.scheduler = GetFileScheduler(1)
+    return streamer
+
+
+def test_viewer_on_another_client_raises_a_warm_up_fetch():
+    calls = []
+
+    async def main():
+        warmer, viewer = _streamer(), _streamer()
+        session        = StubSession(calls)
+
+        async def bulk():
+            async with warmer.scheduler.slot(DC, Priority.BULK, "bulk"):
+                calls.append("bulk")
+
+        async with warmer.scheduler.slot(DC, Priority.PLAYBACK):
+            queued = asyncio.create_task(bulk())
+            warm   = asyncio.create_task(warmer.get_part(
+                _file_id(), session, None, 0, CHUNK_SIZE, priority=Priority.WARMUP, flow="warm",
+            ))
+            await asyncio.sleep(0)
+            # The viewer's client has its own scheduler and streamer, but the
+            # part is already in flight on the warm-up's client.
+            watched = asyncio.create_task(viewer.get_part(
+                _file_id(), session, None, 0, CHUNK_SIZE, priority=Priority.PLAYBACK, flow="viewer",
+            ))
+            await asyncio.sleep(0)
+        results = await asyncio.gather(warm, watched, queued)
+        return results, warmer.scheduler.stats()[DC], stream.part_tickets
+
+    (warm, watched, _), stats, tickets = asyncio.run(main())
+    assert bytes(warm) == bytes(watched) == DATA[:CHUNK_SIZE]
+    assert calls == [("getfile", 0, CHUNK_SIZE), "bulk"]
+    assert stats["granted"]["warmup"] == 0
+    assert tickets == {}
+
+
+def test_cached_part_is_not_fetched_again():
+    calls = []
+
+    async def main():
+        streamer = _streamer()
+        session  = StubSession(calls)
+        first    = await streamer.get_part(_file_id(), session, None, 0, CHUNK_SIZE)
+        second   = await streamer.get_part(_file_id(), session, None, 0, CHUNK_SIZE)
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert bytes(first) == bytes(second) == DATA[:CHUNK_SIZE]
+    assert len(calls) == 1
+
+
+def test_uncached_fetch_leaves_the_caches_alone():
+    calls = []
+
+    async def main():
+        streamer = _streamer()
+        session  = StubSession(calls)
+        copied   = await streamer.get_part(_file_id(), session, None, 0, CHUNK_SIZE, cache=False)
+        assert not stream.memory_cache.has((42, 0))
+
+        # A part that is already cached is still served from memory.
+        stream.memory_cache.put((42, 1), DATA[CHUNK_SIZE:])
+        cached = await streamer.get_part(_file_id(), session, None, CHUNK_SIZE, CHUNK_SIZE, cache=False)
+        return copied, cached
+
+    copied, cached = asyncio.run(main())
+    assert bytes(copied) == DATA[:CHUNK_SIZE] and bytes(cached) == DATA[CHUNK_SIZE:]
+    assert calls == [("getfile", 0, CHUNK_SIZE)]
+
+
+def test_missing_local_copy_falls_back(tmp_path):
+    async def main():
+        service = stream.StreamingService(SimpleNamespace(name="bot", media_sessions={}), None)
+        return await service._send_local(
+            None, 200, {}, str(tmp_path / "gone.file"), None, "127.0.0.1", "1", 0, 9,
+        )
+
+    assert asyncio.run(main()) is None
+
+
+def test_ramp_part_is_sliced_from_the_cached_part_without_a_copy():
+    calls = []
+    full  = DATA[:CHUNK_SIZE]
+    stream.memory_cache.put((42, 0), full)
+
+    async def main():
+        return await _streamer().get_part(_file_id(), StubSession(calls), None, 4096, 8192)
+
+    ramp = asyncio.run(main())
+    assert isinstance(ramp, memoryview) and ramp.obj is full
+    assert bytes(ramp) == DATA[4096:4096 + 8192]
+    assert calls == []
@@ -0,0 +1,61 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from config import Config
+from helper.warmup import keep_warm, resolve_warmup_dcs
+
+
+class StubPool:
+    def __init__(self):
+        self.sessions  = [object()]
+        self.size      = 1
+        self.refreshes = 0
+
+    async def wait_ready(self):
+        pass
+
+    async def refresh(self):
+        self.refreshes += 1
+
+
+class StubStreamer:
+    def __init__(self, name):
+        self.client = SimpleNamespace(name=name)
+        self.pools  = {}
+
+    async def media_pool(self, client, dc_id):
+        return self.pools.setdefault(dc_id, StubPool())
+
+
+@pytest.mark.parametrize("setting, expected", [
+    ("",          []),
+    ("none",      []),
+    ("4",         [4]),
+    ("5, 1,1 ,",  [1, 5]),
+    ("2,x,9,-1",  [2]),
+])
+def test_resolve_warmup_dcs(monkeypatch, setting, expected):
+    monkeypatch.setattr(Config, "WARMUP_DCS", setting)
+    assert asyncio.run(resolve_warmup_dcs(None)) == expected
+
+
+def test_keep_warm_opens_pools_then_refreshes_them():
+    streamers = [StubStreamer("bot"), StubStreamer("worker")]
+    service   = SimpleNamespace(streamers=streamers)
+
+    async def main():
+        task = asyncio.create_task(keep_warm(service, [2, 4], 0.05))
+        await asyncio.sleep(0.01)
+        opened    = {s.client.name: sorted(s.pools) for s in streamers}
+        refreshed = sum(pool.refreshes for s in streamers for pool in s.pools.values())
+        await asyncio.sleep(0.1)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return opened, refreshed
+
+    opened, refreshed = asyncio.run(main())
+    # Pools are opened straight away; the first refresh waits one interval.
+    assert opened == {"bot": [2, 4], "worker": [2, 4]} and refreshed == 0
+    assert all(pool.refreshes >= 1 for s in streamers for pool in s.pools.values())
@@ -0,0 +1,125 @@
+import asyncio
+import io
+import os
+import zipfile
+import zlib
+from datetime import datetime
+from types import SimpleNamespace
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from app import build_app
+from config import Config
+from helper import Cryptic
+from helper.zipstream import DESCRIPTOR_SIZE, ZipEntry, ZipLayout, unique_names
+
+MEMBERS = [
+    ("movie.mkv",   os.urandom(70_000)),
+    ("empty.txt",   b""),
+    ("notes ü.txt", b"hello zip\n" * 50),
+]
+
+
+def _layout():
+    entries = [
+        ZipEntry(name, len(data), datetime(2024, 5, 17, 13, 45, 30), zlib.crc32(data))
+        for name, data in MEMBERS
+    ]
+    return ZipLayout(entries)
+
+
+def _render(layout, from_bytes=0, until_bytes=None):
+    """Bytes ``from_bytes..until_bytes`` of the archive, built segment by segment."""
+    until_bytes = layout.size - 1 if until_bytes is None else until_bytes
+    out = bytearray()
+    for offset, length, kind, idx in layout.overlapping(from_bytes, until_bytes):
+        if kind == "data":
+            body = MEMBERS[idx][1]
+        else:
+            body = layout.render(kind, idx)
+        assert len(body) == length
+        lo = max(from_bytes - offset, 0)
+        hi = min(until_bytes - offset + 1, length)
+        out += body[lo:hi]
+    return bytes(out)
+
+
+def test_archive_matches_zipfile():
+    layout  = _layout()
+    archive = _render(layout)
+    assert len(archive) == layout.size
+
+    with zipfile.ZipFile(io.BytesIO(archive)) as zf:
+        assert zf.testzip() is None
+        assert zf.namelist() == [name for name, _ in MEMBERS]
+        for name, data in MEMBERS:
+            info = zf.getinfo(name)
+            assert info.compress_type == zipfile.ZIP_STORED
+            assert info.date_time == (2024, 5, 17, 13, 45, 30)
+            assert zf.read(name) == data
+
+
+def test_segments_tile_the_archive():
+    layout = _layout()
+    pos    = 0
+    for offset, length, _, _ in layout.segments:
+        assert offset == pos and length > 0
+        pos += length
+    assert pos == layout.size
+    # The empty member has no data segment but still a descriptor.
+    kinds = [kind for _, _, kind, idx in layout.segments if idx == 1]
+    assert kinds == ["header", "descriptor"]
+
+
+def test_ranges_render_slices_of_the_archive():
+    layout  = _layout()
+    archive = _render(layout)
+    for from_bytes, until_bytes in [(0, 9), (100, 70_500), (layout.directory_offset - 3, layout.size - 1)]:
+        assert _render(layout, from_bytes, until_bytes) == archive[from_bytes:until_bytes + 1]
+
+
+def test_unknown_crcs():
+    layout = ZipLayout([ZipEntry(name, len(data), None) for name, data in MEMBERS])
+    first_end = layout.data_end(0)
+
+    # Streaming through the member's data computes its CRC on the way.
+    assert layout.unknown_crcs(0, first_end + DESCRIPTOR_SIZE) == []
+    # A range starting past the data needs the CRC for the descriptor.
+    assert layout.unknown_crcs(first_end, first_end + DESCRIPTOR_SIZE - 1) == [0]
+    # The central directory needs every CRC; the empty member's is known.
+    assert layout.unknown_crcs(layout.directory_offset, layout.size - 1) == [0, 2]
+
+
+def test_etag_tracks_members():
+    keys = ["a", "b", "c"]
+    assert _layout().etag(keys) == _layout().etag(keys)
+    assert _layout().etag(keys) != _layout().etag(["a", "b", "x"])
+
+
+def test_unique_names():
+    assert unique_names(["a.txt", "A.txt", "dir/a.txt", " ", "a.txt"]) == [
+        "a.txt", "A (2).txt", "dir_a.txt", "file", "a (3).txt",
+    ]
+
+
+class StubDatabase:
+    def __init__(self, count):
+        self.count = count
+
+    async def get_user_files(self, user_id, limit=50):
+        return [{"file_id": str(n)} for n in range(min(self.count, limit))]
+
+
+def test_user_archive_over_the_cap_is_refused(monkeypatch):
+    monkeypatch.setattr(Config, "ZIP_MAX_FILES", 2)
+
+    async def main():
+        app = build_app(SimpleNamespace(name="bot", me=None, media_sessions={}), StubDatabase(3))
+        async with TestClient(TestServer(app)) as client:
+            response = await client.get(
+                "/zip", params={"user": "7", "sig": Cryptic.hash_user_files("7")},
+            )
+            return response.status, response.reason
+
+    status, reason = asyncio.run(main())
+    assert status == 400 and reason == "at most 2 files per archive"